@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Contagens de espécies ameaçadas por dimensão (UF, Classe, Divisão, tipo de UC...) e categoria de risco
+
+import numpy as np
+import pandas as pd
+
+import compacto
+import consultas
+
+NAO_INFORMADO = consultas.NAO_INFORMADO
+
+
+def contar_por_categoria(dados, coluna, categoria="Descrição", dividir=None): #tabela Total + uma coluna por categoria para cada valor de "coluna"
+    # Equivale aos laços das seções 5.1 a 5.4 (mesmo formato de totais_uf, totais_classe, totais_divisao e totais_tipo_uc),
+    # mas numa única passada sobre "dados": cada linha recebe o código do seu valor e da sua categoria e as contagens
+    # saem de um único np.bincount. Linhas sem valor em "coluna" são ignoradas e categorias vazias viram "Não Informado".
+    # Com "dividir" (por exemplo "/"), valores como "MG/RJ" contam uma vez para cada parte.
+    # As linhas e as colunas seguem a ordem de primeira aparição dos valores, como nos dicionários do caderno.
+    valores = dados[coluna]
+    categorias = dados[categoria].astype(object).where(dados[categoria].notna(), NAO_INFORMADO)
+    if dividir is not None:
+        partes = valores.str.split(dividir)
+        repeticoes = partes.str.len().fillna(1).astype("int64").to_numpy()
+        valores = partes.explode().str.strip()
+        categorias = pd.Series(np.repeat(categorias.to_numpy(), repeticoes), index=valores.index)
+    validos = valores.notna().to_numpy()
+    codigos, rotulos = pd.factorize(valores[validos])
+    cat_codigos, cat_rotulos = pd.factorize(categorias) #todas as categorias de "dados", mesmo as que só aparecem em linhas ignoradas
+    cat_codigos = cat_codigos[validos]
+
+    contagens = np.bincount(codigos * len(cat_rotulos) + cat_codigos, minlength=len(rotulos) * len(cat_rotulos))
+    totais = pd.DataFrame(contagens.reshape(len(rotulos), len(cat_rotulos)), index=pd.Index(rotulos, dtype=object), columns=pd.Index(cat_rotulos, dtype=object))
+    totais.insert(0, "Total", totais.sum(axis=1))
+    return reduzir_contagens(totais)
+
+
+# Modo fora da memória: as mesmas contagens feitas dentro do SQLite, que devolve só a tabela agregada.
+# As consultas (uma por dimensão) ficam em consultas.py, que não depende do pandas.
+DIMENSOES = consultas.DIMENSOES
+sql_contagem = consultas.sql_contagem
+
+
+def contar_por_categoria_sql(conn, dimensao, especies=False, **ancestrais): #mesmo resultado de contar_por_categoria, com o GROUP BY feito pelo SQLite
+    # Só chegam ao pandas as linhas (valor, categoria, contagem); min(risco.rowid) preserva a ordem de primeira aparição.
+    # Os níveis taxonômicos (consultas.NIVEIS) usam a tabela de fechamento de taxonomia.py, o que permite contar em
+    # qualquer nível e filtrar por qualquer ancestral: contar_por_categoria_sql(conn, "Família", ordem="Anura").
+    # Com "especies", conta espécies distintas em vez de linhas (ocorrências em UCs).
+    sqlstr, params = consultas.montar_contagem(dimensao, especies, **ancestrais)
+    grupos = pd.read_sql_query(sqlstr, conn, params=params)
+    linhas = grupos.groupby("valor", sort=False)["ordem"].min().sort_values().index
+    colunas = grupos.groupby("categoria", sort=False)["ordem"].min().sort_values().index
+    totais = grupos.pivot(index="valor", columns="categoria", values="n").reindex(index=linhas, columns=colunas).fillna(0).astype("int64")
+    totais.index = pd.Index(totais.index.tolist(), dtype=object)
+    totais.columns = pd.Index(totais.columns.tolist(), dtype=object)
+    totais.insert(0, "Total", totais.sum(axis=1))
+    return reduzir_contagens(totais)
+
+
+def reduzir_contagens(totais): #contagens no menor tipo inteiro em que cabe a maior delas (o Total de alguma linha)
+    if totais.empty:
+        return totais
+    return totais.astype(compacto.menor_inteiro(int(totais["Total"].max())))
+
+
+def consultar_em_blocos(conn, sqlstr, params=(), tamanho_bloco=50000, compactar=True): #gera DataFrames de no máximo tamanho_bloco linhas com fetchmany
+    # Com "compactar", cada bloco passa por compacto.compactar (textos repetitivos em "category", inteiros reduzidos).
+    cur = conn.cursor()
+    cur.execute(sqlstr, params)
+    colunas = [descricao[0] for descricao in cur.description]
+    while True:
+        linhas = cur.fetchmany(tamanho_bloco)
+        if not linhas:
+            break
+        bloco = pd.DataFrame.from_records(linhas, columns=colunas)
+        yield compacto.compactar(bloco) if compactar else bloco
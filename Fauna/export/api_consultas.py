@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# API de consultas à base fauna_db.sqlite para muitos usuários ao mesmo tempo (ex.: "Amphibia em CR em MG").
+# - As consultas são os modelos de consultas.py: para cada combinação de filtros o texto SQL é sempre o mesmo e só os
+#   valores mudam, então cada conexão prepara o comando uma vez e o reaproveita do seu cache de comandos.
+# - As conexões são somente leitura e ficam num pool: cada consulta pega uma conexão livre e a devolve ao terminar.
+#   A base é posta em modo WAL (gravado no próprio arquivo), em que leitores não bloqueiam nem são bloqueados por
+#   uma carga em andamento: cada um enxerga a última versão confirmada.
+# - Os resultados ficam num cache LRU, válido enquanto a versão da base não muda. A versão é o PRAGMA data_version
+#   de uma conexão sentinela (que muda a cada transação confirmada por outra conexão, de qualquer processo) e a
+#   identidade do arquivo (que muda quando a base é recriada ou substituída).
+#   python api_consultas.py --db fauna_db.sqlite --classe Amphibia --categoria CR --uf MG
+# Como consultar.py, só usa a biblioteca padrão.
+
+import os
+import sys
+import time
+import queue
+import argparse
+import threading
+import collections
+from contextlib import contextmanager
+import sqlite3 as db
+
+import busca
+import consultar
+import consultas
+
+CONEXOES = 4 #tamanho padrão do pool
+COMANDOS_POR_CONEXAO = 64 #comandos preparados guardados em cada conexão (cached_statements do sqlite3)
+RESULTADOS_EM_CACHE = 1024 #consultas distintas guardadas no cache LRU
+ESPERA_OCUPADA_MS = 5000 #quanto uma leitura espera por um bloqueio (só acontece durante checkpoints do WAL)
+
+
+def ativar_wal(caminho): #põe a base em modo WAL; o modo fica gravado no arquivo e vale para as próximas conexões
+    conn = db.connect(caminho)
+    try:
+        return conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def identidade(caminho): #muda quando o arquivo é apagado e recriado (nova carga completa) ou substituído por outro
+    estado = os.stat(caminho)
+    return estado.st_dev, estado.st_ino
+
+
+class ApiConsultas:
+    def __init__(self, caminho, conexoes=CONEXOES, resultados=RESULTADOS_EM_CACHE, wal=True):
+        if not os.path.exists(caminho): #conexões somente leitura não criam o arquivo, mas a de ativar_wal criaria
+            raise FileNotFoundError(caminho)
+        if wal:
+            ativar_wal(caminho)
+        self.caminho = caminho
+        self.conexoes = conexoes
+        self.resultados = resultados
+        self.livres = queue.LifoQueue() #a conexão usada por último é a que tem o cache mais quente
+        self.abertas = 0
+        self.trava = threading.Lock()
+        self.cache = collections.OrderedDict()
+        self.acertos = self.falhas = 0
+        self.sentinela = None
+        self.versao_atual = None
+        self.trocar_arquivo()
+
+    def conectar(self):
+        conn = consultar.conectar(self.caminho, check_same_thread=False, cached_statements=COMANDOS_POR_CONEXAO)
+        conn.execute("PRAGMA busy_timeout = " + str(ESPERA_OCUPADA_MS))
+        return conn
+
+    def trocar_arquivo(self): #(re)abre a sentinela e descarta o pool e o cache; chamada com a trava, ou no __init__
+        if self.sentinela is not None:
+            self.sentinela.close()
+        while not self.livres.empty():
+            conn = self.livres.get_nowait()[1]
+            if conn is not None:
+                conn.close()
+            self.abertas -= 1
+        self.identidade = identidade(self.caminho)
+        self.sentinela = self.conectar()
+        self.cache.clear()
+
+    def versao(self): #versão da base: identidade do arquivo e PRAGMA data_version da sentinela
+        with self.trava:
+            if identidade(self.caminho) != self.identidade:
+                self.trocar_arquivo()
+            versao = (self.identidade, self.sentinela.execute("PRAGMA data_version").fetchone()[0])
+            if versao != self.versao_atual: #a base mudou: nenhum resultado guardado vale mais
+                self.cache.clear()
+                self.versao_atual = versao
+            return versao
+
+    @contextmanager
+    def conexao(self): #empresta uma conexão do pool, abrindo uma nova enquanto houver menos de "conexoes"
+        # Uma conexão do arquivo anterior é fechada ao voltar e deixa no pool uma vaga, (None, None), para que quem
+        # espera em livres.get() acorde e abra uma conexão no arquivo novo.
+        try:
+            identidade_conn, conn = self.livres.get_nowait()
+        except queue.Empty:
+            with self.trava:
+                abrir = self.abertas < self.conexoes
+                if abrir:
+                    self.abertas += 1
+            identidade_conn, conn = (None, None) if abrir else self.livres.get()
+        if conn is None:
+            try:
+                identidade_conn, conn = self.identidade, self.conectar()
+            except Exception: #a vaga volta ao pool, senão os que esperam ficariam presos
+                self.livres.put((None, None))
+                raise
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction: #uma leitura interrompida não pode segurar o instantâneo antigo do WAL
+                conn.rollback()
+            if identidade_conn == self.identidade:
+                self.livres.put((identidade_conn, conn))
+            else: #conexão aberta no arquivo anterior: é fechada e dá lugar a uma nova
+                conn.close()
+                self.livres.put((None, None))
+
+    def executar(self, sqlstr, params): #(colunas, linhas) de uma consulta, do cache ou da base
+        chave = (sqlstr, params) #o texto já identifica o modelo (os filtros usados) e os parâmetros, os seus valores
+        versao = self.versao()
+        with self.trava:
+            if chave in self.cache:
+                self.cache.move_to_end(chave)
+                self.acertos += 1
+                return self.cache[chave]
+            self.falhas += 1
+        with self.conexao() as conn:
+            cur = conn.execute(sqlstr, params)
+            resultado = (tuple(descricao[0] for descricao in cur.description), tuple(cur.fetchall()))
+        with self.trava:
+            if self.versao_atual == versao: #não guarda um resultado lido de uma versão que já foi substituída
+                self.cache[chave] = resultado
+                while len(self.cache) > self.resultados:
+                    self.cache.popitem(last=False)
+        return resultado
+
+    def listar(self, limite=None, **filtros): #listagem da seção 3 com os filtros de consultas.FILTROS (classe, categoria, uf, busca)
+        return self.executar(*consultas.montar_consulta(limite=limite, **filtros))
+
+    def contar(self, **filtros): #número de linhas da listagem com os mesmos filtros
+        return self.executar(*consultas.montar_consulta(contar=True, **filtros))[1][0][0]
+
+    def sugerir(self, texto, limite=20): #nomes (tabela, id, nome) que casam com o texto, para completar o que o usuário digita
+        return self.executar(busca.SQL_SUGESTOES, (busca.expressao(texto), limite))
+
+    def contagem(self, dimensao, especies=False, **ancestrais): #linhas (valor, categoria, n, ordem) da contagem da seção 5 para uma de consultas.DIMENSOES
+        return self.executar(*consultas.montar_contagem(dimensao, especies, **ancestrais)) #ex.: contagem("Ordem", classe="Amphibia")
+
+    def estatisticas(self):
+        with self.trava:
+            return {"acertos": self.acertos, "falhas": self.falhas, "em_cache": len(self.cache), "conexoes": self.abertas}
+
+    def fechar(self):
+        with self.trava:
+            while not self.livres.empty():
+                conn = self.livres.get_nowait()[1]
+                if conn is not None:
+                    conn.close()
+            self.sentinela.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Responde aos filtros da seção 3 com conexões somente leitura em paralelo e cache de resultados")
+    parser.add_argument("--db", default="fauna_db.sqlite", help="arquivo da base SQLite")
+    for nome in consultas.FILTROS:
+        parser.add_argument("--" + nome, help="filtra por " + nome)
+    parser.add_argument("--limite", type=int, help="número máximo de linhas")
+    parser.add_argument("--threads", type=int, default=CONEXOES, help="consultas simultâneas (e tamanho do pool)")
+    parser.add_argument("--repeticoes", type=int, default=1, help="vezes que a consulta é repetida por cada thread, para medir o cache")
+    args = parser.parse_args()
+
+    filtros = {nome: getattr(args, nome) for nome in consultas.FILTROS}
+    try:
+        api = ApiConsultas(args.db, args.threads)
+    except (OSError, db.Error) as erro:
+        sys.exit("Erro ao abrir " + args.db + ": " + str(erro))
+
+    def repetir():
+        for _ in range(args.repeticoes):
+            api.listar(args.limite, **filtros)
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=repetir) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    segundos = time.perf_counter() - inicio
+    colunas, linhas = api.listar(args.limite, **filtros)
+    print("\t".join(colunas))
+    for linha in linhas[:20]:
+        print("\t".join("" if valor is None else str(valor) for valor in linha))
+    if len(linhas) > 20:
+        print("...", len(linhas) - 20, "linha(s) a mais")
+    print("%d consulta(s) em %.3f s (%.0f/s);" % (args.threads * args.repeticoes, segundos, args.threads * args.repeticoes / segundos), api.estatisticas(), file=sys.stderr)
+    api.fechar()
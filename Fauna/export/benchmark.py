@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Medição de desempenho das etapas do pipeline com planilhas sintéticas de 10 mil a 10 milhões de linhas.
+# As planilhas têm as mesmas 12 colunas da fonte original (fauna_fed.xlsx) e cardinalidades parecidas com as dela:
+# as 8 categorias de risco com a mesma proporção de espécies, uma categoria por espécie, taxonomia fixa
+# (8 divisões, 26 classes, 104 ordens, 286 famílias) e números de espécies e de UCs que crescem com a raiz do
+# número de linhas. Cerca de 4% das UCs ficam em mais de um estado ("MG/RJ") e algumas não têm sigla de tipo.
+# Além dos tempos, o relatório traz a memória (MB) de um lote da planilha, das chaves desse lote e de um bloco da
+# listagem da seção 3, como o pandas os lê ("bruto") e na representação compacta de compacto.py, e o tempo de uma
+# busca textual (busca.py) por prefixo do nome de uma espécie. A etapa "deduplicar" é a leitura dos nomes de UCs e
+# espécies e o mapa de fusões de deduplicacao.py, sem a carga.
+# O resultado é gravado em JSON (e em CSV) para que versões diferentes do código possam ser comparadas:
+#   python benchmark.py --linhas 10000 100000 --saida benchmarks
+#   python benchmark.py --linhas 10000 --comparar benchmarks/relatorio_anterior.json
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import subprocess
+import argparse
+import platform
+import importlib.util
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+
+import busca
+import carga
+import deduplicacao
+import unidades
+import pipeline
+import compacto
+import consultar
+import consultas
+import agregacao
+
+VERSAO_GERADOR = 1 #mude quando a planilha gerada para uma mesma semente mudar
+LINHAS_PADRAO = [10000, 100000, 1000000, 10000000]
+BLOCO = 1000000 #linhas geradas e gravadas por vez
+LIMITE_XLSX = 1048575 #linhas de dados que cabem numa planilha do Excel
+TOLERANCIA = 0.2 #etapas 20% mais lentas do que no relatório anterior são apontadas como regressão
+TEMPO_MINIMO = 0.1 #etapas mais rápidas do que isso (s) não são comparadas: a variação é só ruído
+REPETICOES_PARTIDA = 5 #a partida a frio é medida várias vezes e vale a menor, que é a menos afetada por ruído
+REPETICOES_BUSCA = 100 #buscas repetidas; vale a menor medida, como na partida
+PASTA = os.path.dirname(os.path.abspath(__file__))
+
+CABECALHO = ["Número identificador do táxon", "Divisão em: Invertebrados ou Vertebrados", "Número da Portaria vigente",
+             "Divisão em: Anfíbios, Aves...", "Classe segundo classificação taxonômica", "Ordem segundo classificação taxonômica",
+             "Família segundo classificação taxonômica", "Nome comum", "Táxon", "Categoria",
+             "Unidade de conservação de ocorrência da espécie", "UF"]
+DIVISOES = ["Anfíbios", "Aves", "Invertebrados Aquáticos", "Invertebrados Terrestres", "Mamíferos", "Peixes Continentais", "Peixes Marinhos", "Répteis"]
+CATEGORIAS = {"VU": 447, "EN": 407, "CR": 300, "CR(PEX)": 17, "EX": 5, "RE": 5, "CR(PEW)": 1, "EW": 1} #espécies por categoria na base original
+UFS = ["AC", "AL", "AM", "AP", "BA", "CE", "DF", "ES", "GO", "MA", "MG", "MS", "MT", "PA", "PB", "PE", "PI", "PR", "RJ", "RN", "RO", "RR", "RS", "SC", "SE", "SP", "TO"]
+N_CLASSES, N_ORDENS, N_FAMILIAS = 26, 104, 286
+
+
+def pesos(n, expoente=0.8): #distribuição de cauda longa: poucas espécies (ou UCs) aparecem em muitas linhas
+    p = 1.0 / np.arange(1, n + 1) ** expoente
+    return p / p.sum()
+
+
+def dimensoes(linhas, rng): #tabelas sintéticas de espécies e de UCs, com seus atributos
+    n_especies = max(50, int(1183 * (linhas / 5228) ** 0.5))
+    n_ucs = max(20, int(988 * (linhas / 5228) ** 0.5))
+
+    familia_ordem = np.sort(rng.integers(0, N_ORDENS, N_FAMILIAS))
+    ordem_classe = np.sort(rng.integers(0, N_CLASSES, N_ORDENS))
+    classe_divisao = np.sort(rng.integers(0, len(DIVISOES), N_CLASSES))
+    familia = rng.integers(0, N_FAMILIAS, n_especies)
+    classe = ordem_classe[familia_ordem[familia]]
+    divisao = classe_divisao[classe]
+    categoria = rng.choice(len(CATEGORIAS), n_especies, p=np.array(list(CATEGORIAS.values())) / sum(CATEGORIAS.values()))
+    especies = pd.DataFrame({
+        CABECALHO[1]: np.where(np.char.startswith(np.array(DIVISOES)[divisao].astype(str), "Invertebrados"), "Invertebrados", "Vertebrados"),
+        CABECALHO[3]: np.array(DIVISOES, dtype=object)[divisao],
+        CABECALHO[4]: ["Classe " + str(i) for i in classe],
+        CABECALHO[5]: ["Ordem " + str(i) for i in familia_ordem[familia]],
+        CABECALHO[6]: ["Familia " + str(i) for i in familia],
+        CABECALHO[8]: ["Genero" + str(f) + " especie" + str(i) for i, f in enumerate(familia)],
+        CABECALHO[9]: np.array(list(CATEGORIAS), dtype=object)[categoria],
+    })
+
+    siglas = np.array([sigla for sigla, nome in unidades.TIPOS_UC] + ["*", "PDS"], dtype=object) #as duas últimas não são reconhecidas
+    tipo = rng.choice(len(siglas), n_ucs, p=pesos(len(siglas), 1.0))
+    estado = rng.choice(len(UFS), n_ucs, p=pesos(len(UFS), 0.6))
+    vizinho = (estado + rng.integers(1, len(UFS), n_ucs)) % len(UFS)
+    varios = rng.random(n_ucs) < 0.04
+    ucs = pd.DataFrame({
+        CABECALHO[10]: [" " + sigla + " Unidade " + str(i) for i, sigla in enumerate(siglas[tipo])], #a fonte original tem um espaço no início
+        CABECALHO[11]: np.where(varios, np.char.add(np.char.add(np.array(UFS)[estado], "/"), np.array(UFS)[vizinho]), np.array(UFS)[estado]).astype(object),
+    })
+    return especies, ucs
+
+
+def gerar_planilha(linhas, destino, semente=0): #grava uma planilha sintética com "linhas" linhas (.csv, ou .xlsx até LIMITE_XLSX)
+    rng = np.random.default_rng(semente)
+    especies, ucs = dimensoes(linhas, rng)
+    p_especies, p_ucs = pesos(len(especies)), pesos(len(ucs))
+    xlsx = destino.lower().endswith(".xlsx")
+    if xlsx and linhas > LIMITE_XLSX:
+        raise ValueError("planilhas .xlsx têm no máximo " + str(LIMITE_XLSX) + " linhas de dados; use .csv")
+    blocos = list()
+    for inicio in range(0, linhas, BLOCO):
+        n = min(BLOCO, linhas - inicio)
+        bloco = especies.iloc[rng.choice(len(especies), n, p=p_especies)].reset_index(drop=True)
+        bloco = pd.concat([bloco, ucs.iloc[rng.choice(len(ucs), n, p=p_ucs)].reset_index(drop=True)], axis=1)
+        bloco[CABECALHO[0]] = np.arange(inicio, inicio + n)
+        bloco[CABECALHO[2]] = "444/2014"
+        bloco[CABECALHO[7]] = "x"
+        bloco = bloco[CABECALHO]
+        if xlsx:
+            blocos.append(bloco)
+        else:
+            bloco.to_csv(destino, mode="w" if inicio == 0 else "a", header=inicio == 0, index=False)
+    if xlsx:
+        pd.concat(blocos).to_excel(destino, index=False)
+    return destino
+
+
+def planilha(pasta, linhas, semente=0, formato="csv"): #reaproveita a planilha gerada numa execução anterior com os mesmos parâmetros
+    destino = os.path.join(pasta, "fauna_sintetica_%d_s%d_v%d.%s" % (linhas, semente, VERSAO_GERADOR, formato))
+    if not os.path.exists(destino):
+        inicio = time.perf_counter()
+        gerar_planilha(linhas, destino + ".tmp." + formato, semente)
+        os.replace(destino + ".tmp." + formato, destino)
+        print("Planilha sintética de", linhas, "linhas gerada em %.1f s" % (time.perf_counter() - inicio))
+    return destino
+
+
+def medir(src, pasta, tamanho_lote=carga.TAMANHO_LOTE): #tempo (s) de cada etapa para uma planilha, numa base nova
+    base = os.path.join(pasta, "benchmark.sqlite")
+    if os.path.exists(base):
+        os.remove(base)
+    args = SimpleNamespace(src=src, db=base, saida=os.path.join(pasta, "saida"), lote=tamanho_lote, incremental=False, fonte="instantaneo")
+    manifesto = os.path.join(args.saida, pipeline.PASTA_GRAFICOS, pipeline.MANIFESTO_GRAFICOS)
+    if os.path.exists(manifesto): #sem o manifesto, renderizar desenha todos os gráficos, em vez de pular os da medição anterior
+        os.remove(manifesto)
+    tempos = dict()
+    inicio = time.perf_counter()
+    deduplicacao.fusoes(deduplicacao.contar_nomes(src, tamanho_lote))
+    tempos["deduplicar"] = time.perf_counter() - inicio
+    conn = sqlite3.connect(base)
+    try:
+        fases = dict()
+        inicio = time.perf_counter()
+        linhas = carga.carregar_em_lotes(conn, src, tamanho_lote, tempos=fases)
+        tempos["ingerir"] = time.perf_counter() - inicio
+        tempos.update(("ingerir." + fase, segundos) for fase, segundos in fases.items())
+        etapas = ["normalizar", "enriquecer", "classificar", "agregar", "renderizar"]
+        if importlib.util.find_spec("pyarrow"): #a etapa exportar só é medida onde o pyarrow está instalado
+            etapas.append("exportar")
+        for nome in etapas:
+            inicio = time.perf_counter()
+            pipeline.ETAPAS[nome](conn, args)
+            tempos[nome] = time.perf_counter() - inicio
+    finally:
+        conn.close()
+    tempos.update(medir_partida(base))
+    tempos.update(medir_memoria(src, base, tamanho_lote))
+    tempos.update(medir_busca(base))
+    tempos["base_mb"] = os.path.getsize(base) / 1e6
+    os.remove(base)
+    return linhas, tempos
+
+
+def medir_partida(base, repeticoes=REPETICOES_PARTIDA): #tempo (s) de um processo Python novo até a resposta, sem nada em memória
+    comandos = {
+        "partida.consultar": [sys.executable, os.path.join(PASTA, "consultar.py"), "--db", base, "--uf", "MG", "--contar"],
+        "partida.pipeline": [sys.executable, os.path.join(PASTA, "pipeline.py"), "--help"],
+    }
+    tempos = dict()
+    for nome, comando in comandos.items():
+        medidas = list()
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            subprocess.run(comando, check=True, stdout=subprocess.DEVNULL)
+            medidas.append(time.perf_counter() - inicio)
+        tempos[nome] = min(medidas)
+    return tempos
+
+
+def medir_memoria(src, base, tamanho_lote=carga.TAMANHO_LOTE): #MB do primeiro lote, das suas chaves e do primeiro bloco da listagem, brutos e compactos
+    memoria = dict()
+    bruto = next(carga.ler_em_lotes(src, tamanho_lote, compactar=False))
+    lote = compacto.compactar(bruto)
+    memoria["memoria.lote_bruto_mb"] = compacto.memoria_mb(bruto)
+    memoria["memoria.lote_mb"] = compacto.memoria_mb(lote)
+    codigos = carga.criar_chaves(lote)[2]
+    memoria["memoria.chaves_bruto_mb"] = compacto.memoria_mb(codigos.astype("int64"))
+    memoria["memoria.chaves_mb"] = compacto.memoria_mb(codigos)
+    conn = sqlite3.connect(base)
+    try:
+        sqlstr, params = consultas.montar_consulta()
+        memoria["memoria.dados_bruto_mb"] = compacto.memoria_mb(next(agregacao.consultar_em_blocos(conn, sqlstr, params, tamanho_lote, compactar=False)))
+        memoria["memoria.dados_mb"] = compacto.memoria_mb(next(agregacao.consultar_em_blocos(conn, sqlstr, params, tamanho_lote)))
+    finally:
+        conn.close()
+    return memoria
+
+
+def medir_busca(base, repeticoes=REPETICOES_BUSCA): #tempo (s) de busca.sugerir e de busca.riscos para o começo do nome de uma espécie
+    conn = consultar.conectar(base)
+    try:
+        nome = conn.execute("SELECT nome FROM especie WHERE id = (SELECT max(id) / 2 FROM especie)").fetchone()[0]
+        texto = nome[:max(len(nome) - 2, 3)] #prefixo que casa com poucas espécies, como o que um usuário digitaria
+        tempos = dict()
+        for etapa, funcao in (("busca.sugerir", busca.sugerir), ("busca.riscos", busca.riscos)):
+            medidas = list()
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                funcao(conn, texto)
+                medidas.append(time.perf_counter() - inicio)
+            tempos[etapa] = min(medidas)
+    finally:
+        conn.close()
+    return tempos
+
+
+def ambiente():
+    return {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+            "sqlite": sqlite3.sqlite_version, "plataforma": platform.platform(), "processador": platform.processor() or platform.machine(),
+            "data": time.strftime("%Y-%m-%dT%H:%M:%S"), "versao_gerador": VERSAO_GERADOR}
+
+
+def comparar(anterior, atual, tolerancia=TOLERANCIA): #etapas mais lentas do que no relatório anterior, para o mesmo número de linhas
+    antes = {(r["linhas"], r["etapa"]): r["segundos"] for r in anterior["resultados"]}
+    regressoes = list()
+    for r in atual["resultados"]:
+        base = antes.get((r["linhas"], r["etapa"]))
+        curta = base is not None and base < TEMPO_MINIMO and not r["etapa"].startswith(("partida.", "busca.")) #já são a menor de várias medidas
+        if base and not curta and r["segundos"] > base * (1 + tolerancia):
+            regressoes.append({"linhas": r["linhas"], "etapa": r["etapa"], "antes": base, "agora": r["segundos"], "razao": r["segundos"] / base})
+    return regressoes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede o tempo de cada etapa do pipeline com planilhas sintéticas de vários tamanhos")
+    parser.add_argument("--linhas", type=int, nargs="+", default=LINHAS_PADRAO, help="tamanhos das planilhas sintéticas")
+    parser.add_argument("--saida", default="benchmarks", help="pasta das planilhas geradas e dos relatórios")
+    parser.add_argument("--semente", type=int, default=0, help="semente do gerador aleatório")
+    parser.add_argument("--formato", choices=["csv", "xlsx"], default="csv", help="formato das planilhas geradas")
+    parser.add_argument("--lote", type=int, default=carga.TAMANHO_LOTE, help="número de linhas lidas e gravadas por vez")
+    parser.add_argument("--comparar", help="relatório JSON anterior; sai com código 1 se alguma etapa ficou mais lenta")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA, help="aumento relativo de tempo aceito antes de apontar regressão")
+    args = parser.parse_args()
+
+    os.makedirs(args.saida, exist_ok=True)
+    relatorio = {"ambiente": ambiente(), "resultados": list()}
+    for n in args.linhas:
+        src = planilha(args.saida, n, args.semente, args.formato)
+        linhas, tempos = medir(src, args.saida, args.lote)
+        for etapa, segundos in tempos.items():
+            if etapa.endswith("_mb"): #tamanhos (base e memória), que não entram na comparação de tempos
+                relatorio["resultados"].append({"linhas": linhas, "etapa": etapa, "segundos": None, "linhas_por_s": None, "valor": round(segundos, 2)})
+            else:
+                relatorio["resultados"].append({"linhas": linhas, "etapa": etapa, "segundos": round(segundos, 4),
+                                                "linhas_por_s": round(linhas / segundos) if segundos > 0 and not etapa.startswith(("partida.", "busca.")) else None})
+        print(n, "linhas:", ", ".join("%s %.2f s" % (etapa, segundos) for etapa, segundos in tempos.items() if not etapa.endswith("_mb") and not etapa.startswith("busca.")))
+        print(n, "linhas, busca textual:", ", ".join("%s %.3f ms" % (etapa, tempos[etapa] * 1000) for etapa in ("busca.sugerir", "busca.riscos")))
+        print(n, "linhas, memória (MB, bruto -> compacto):", ", ".join("%s %.1f -> %.1f" % (parte, tempos["memoria." + parte + "_bruto_mb"], tempos["memoria." + parte + "_mb"])
+                                                                      for parte in ("lote", "chaves", "dados")))
+
+    nome = "relatorio_" + time.strftime("%Y%m%d_%H%M%S")
+    with open(os.path.join(args.saida, nome + ".json"), "w", encoding="utf-8") as arquivo:
+        json.dump(relatorio, arquivo, indent=1, ensure_ascii=False)
+    pd.DataFrame(relatorio["resultados"]).to_csv(os.path.join(args.saida, nome + ".csv"), index=False)
+    print("Relatório gravado em", os.path.join(args.saida, nome + ".json"))
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            regressoes = comparar(json.load(arquivo), relatorio, args.tolerancia)
+        for r in regressoes:
+            print("Regressão: %s com %d linhas passou de %.2f s para %.2f s (%.0f%% mais lenta)" % (r["etapa"], r["linhas"], r["antes"], r["agora"], (r["razao"] - 1) * 100))
+        if regressoes:
+            sys.exit(1)
+        print("Nenhuma etapa ficou mais lenta do que o relatório anterior")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Teste de carga do serviço de servidor.py: várias conexões simultâneas (keep-alive) repetem uma mistura de
+# requisições (filtros da seção 3, contagens e tabelas de totais) durante alguns segundos e, ao final, são
+# mostradas a vazão (requisições/s) e as latências (p50, p90, p99 e máxima), no total e por rota.
+#   python benchmark_http.py --db fauna_db.sqlite                   sobe um servidor local só para o teste
+#   python benchmark_http.py --url http://127.0.0.1:8000 --etag     usa um servidor já no ar, revalidando com ETag
+# Só usa a biblioteca padrão.
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+from urllib.parse import urlsplit
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+CONEXOES = 32
+DURACAO = 10.0 #segundos
+
+ROTAS = [ #mistura de requisições, sorteadas com os pesos indicados
+    ("/consulta?classe=Amphibia&categoria=CR&uf=MG", 4),
+    ("/consulta?uf=MG&limite=50", 3),
+    ("/consulta?classe=Aves&limite=100", 2),
+    ("/consulta?busca=serra%20do%20mar&limite=20", 2),
+    ("/sugestoes?busca=bra&limite=10", 2),
+    ("/contar?uf=RJ", 3),
+    ("/contar?classe=Amphibia&categoria=EN", 2),
+    ("/totais/totais_uf", 2),
+    ("/totais/totais_classe", 1),
+    ("/totais/totais_divisao", 1),
+    ("/totais/totais_tipo_uc", 1),
+    ("/totais/idh_uf", 1),
+]
+
+
+def percentil(valores, p): #valores já ordenados
+    if not valores:
+        return float("nan")
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+async def requisitar(leitor, escritor, host, caminho, etag=None): #(status, corpo, etag) de um GET numa conexão aberta
+    cabecalhos = ["GET " + caminho + " HTTP/1.1", "Host: " + host]
+    if etag:
+        cabecalhos.append("If-None-Match: " + etag)
+    escritor.write(("\r\n".join(cabecalhos) + "\r\n\r\n").encode("latin-1"))
+    await escritor.drain()
+    status = int((await leitor.readline()).split()[1])
+    resposta = dict()
+    while True:
+        linha = await leitor.readline()
+        if linha in (b"\r\n", b"\n", b""):
+            break
+        nome, _, valor = linha.decode("latin-1").partition(":")
+        resposta[nome.strip().lower()] = valor.strip()
+    corpo = await leitor.readexactly(int(resposta.get("content-length", 0)))
+    return status, corpo, resposta.get("etag")
+
+
+async def cliente(url, fim, usar_etag, medidas, semente): #uma conexão que repete requisições até o fim do teste
+    partes = urlsplit(url)
+    leitor, escritor = await asyncio.open_connection(partes.hostname, partes.port or 80)
+    sorteio = random.Random(semente)
+    caminhos = [caminho for caminho, peso in ROTAS for _ in range(peso)]
+    etags = dict()
+    try:
+        while time.perf_counter() < fim:
+            caminho = sorteio.choice(caminhos)
+            inicio = time.perf_counter()
+            status, corpo, etag = await requisitar(leitor, escritor, partes.netloc, caminho, etags.get(caminho) if usar_etag else None)
+            medidas.append((caminho, status, time.perf_counter() - inicio))
+            if etag:
+                etags[caminho] = etag
+    finally:
+        escritor.close()
+
+
+async def medir(url, conexoes=CONEXOES, duracao=DURACAO, usar_etag=False):
+    medidas = list()
+    inicio = time.perf_counter()
+    await asyncio.gather(*[cliente(url, inicio + duracao, usar_etag, medidas, semente) for semente in range(conexoes)])
+    return medidas, time.perf_counter() - inicio
+
+
+def resumir(medidas, segundos): #vazão e latências (ms), no total e por rota
+    def resumo(latencias):
+        latencias = sorted(latencias)
+        return {"requisicoes": len(latencias), "por_s": round(len(latencias) / segundos, 1),
+                **{nome: round(percentil(latencias, p) * 1000, 2) for nome, p in (("p50_ms", 50), ("p90_ms", 90), ("p99_ms", 99), ("max_ms", 100))}}
+    estados = dict()
+    for _, status, _ in medidas:
+        estados[str(status)] = estados.get(str(status), 0) + 1
+    rotas = {caminho: resumo([s for c, _, s in medidas if c == caminho]) for caminho, _ in ROTAS}
+    return {"total": resumo([s for _, _, s in medidas]), "status": estados, "rotas": rotas, "segundos": round(segundos, 2)}
+
+
+def subir_servidor(base, conexoes=None): #sobe servidor.py numa porta livre; retorna (processo, url)
+    comando = [sys.executable, os.path.join(PASTA, "servidor.py"), "--db", base, "--porta", "0"]
+    if conexoes:
+        comando += ["--conexoes", str(conexoes)]
+    processo = subprocess.Popen(comando, stdout=subprocess.PIPE, text=True)
+    linha = processo.stdout.readline()
+    if not linha.startswith("Servindo em "):
+        processo.kill()
+        sys.exit("O servidor não subiu: " + linha)
+    return processo, linha.split()[-1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede vazão e latência (p99) do serviço HTTP de servidor.py")
+    grupo = parser.add_mutually_exclusive_group(required=True)
+    grupo.add_argument("--url", help="endereço de um servidor já no ar (ex.: http://127.0.0.1:8000)")
+    grupo.add_argument("--db", help="base SQLite: sobe um servidor local só para o teste")
+    parser.add_argument("--conexoes", type=int, default=CONEXOES, help="conexões (clientes) simultâneas")
+    parser.add_argument("--duracao", type=float, default=DURACAO, help="duração do teste, em segundos")
+    parser.add_argument("--etag", action="store_true", help="reenvia o último ETag de cada rota (If-None-Match), como um navegador")
+    parser.add_argument("--threads-servidor", type=int, help="com --db, threads de leitura do servidor (padrão: as de servidor.py)")
+    parser.add_argument("--saida", help="grava o resultado neste arquivo JSON")
+    args = parser.parse_args()
+
+    processo = None
+    url = args.url
+    if args.db:
+        processo, url = subir_servidor(args.db, args.threads_servidor)
+    try:
+        asyncio.run(medir(url, 1, 0.5)) #aquecimento: abre as conexões da base e preenche os caches
+        medidas, segundos = asyncio.run(medir(url, args.conexoes, args.duracao, args.etag))
+    finally:
+        if processo is not None:
+            processo.terminate()
+            processo.wait()
+
+    resultado = resumir(medidas, segundos)
+    total = resultado["total"]
+    print("%d requisições em %.1f s com %d conexões: %.0f req/s; latência p50 %.2f ms, p90 %.2f ms, p99 %.2f ms, máx %.2f ms"
+          % (total["requisicoes"], segundos, args.conexoes, total["por_s"], total["p50_ms"], total["p90_ms"], total["p99_ms"], total["max_ms"]))
+    print("Status:", ", ".join("%s: %d" % item for item in sorted(resultado["status"].items())))
+    for caminho, rota in resultado["rotas"].items():
+        print("  %-48s %6d req  p50 %7.2f ms  p99 %7.2f ms" % (caminho, rota["requisicoes"], rota["p50_ms"], rota["p99_ms"]))
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=1)
+        print("Resultado gravado em", args.saida)
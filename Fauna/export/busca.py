@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Busca textual (FTS5 do SQLite) nos nomes de espécies, divisões, classes, ordens, famílias, UCs e estados.
+# A tabela busca_nomes tem uma linha por nome, com a tabela e o id de onde ele veio. O tokenizador ignora maiúsculas e
+# acentos ("acao" encontra "Ação") e os índices de prefixo respondem a buscas pelo começo das palavras ("serr" encontra
+# "Serra"). Os nomes encontrados levam às linhas de "risco" pelos índices das chaves (esquema.INDICES), sem ler a
+# tabela fato inteira. Todos os termos buscados devem aparecer no mesmo nome; para combinar dimensões, use a busca
+# junto com os filtros de consultas.FILTROS (ex.: busca="Brachycephalus" e uf="SP").
+# A carga (carga.py) cria o índice e o refaz quando entram nomes novos; referencia.py refaz as linhas dos estados.
+#   python busca.py --db fauna_db.sqlite serra do mar
+# Como consultas.py, só usa a biblioteca padrão.
+
+import re
+import sys
+import argparse
+import sqlite3 as db
+
+TABELA = "busca_nomes"
+DDL = ("CREATE VIRTUAL TABLE IF NOT EXISTS " + TABELA + " USING fts5(nome, tabela UNINDEXED, ref UNINDEXED, "
+       "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')")
+
+NOMES = { #tabela -> expressão do texto indexado; o estado é buscado pela sigla e pelo nome por extenso (seção 4.1)
+    "especie": "nome",
+    "divisao": "nome",
+    "classe": "nome",
+    "ordem": "nome",
+    "familia": "nome",
+    "UC": "nome",
+    "UF": "nome || coalesce(' ' || nome_ext, '')",
+}
+
+SQL_SUGESTOES = "SELECT tabela, ref AS id, nome FROM busca_nomes WHERE busca_nomes MATCH ? ORDER BY rank LIMIT ?" #nomes, do mais relevante ao menos
+
+# Linhas de "risco" cujos nomes casam com a expressão (o único parâmetro): as espécies vêm direto ou pelos índices
+# de divisão, classe, ordem e família; as UCs vêm direto ou, para os estados, pela tabela ponte UC_UF.
+SQL_RISCOS = """WITH achados (tabela, ref) AS MATERIALIZED (SELECT tabela, ref FROM busca_nomes WHERE busca_nomes MATCH ?),
+       especies (id) AS (SELECT ref FROM achados WHERE tabela = 'especie'
+                  UNION SELECT id FROM especie WHERE divisao_id IN (SELECT ref FROM achados WHERE tabela = 'divisao')
+                  UNION SELECT id FROM especie WHERE classe_id IN (SELECT ref FROM achados WHERE tabela = 'classe')
+                  UNION SELECT id FROM especie WHERE ordem_id IN (SELECT ref FROM achados WHERE tabela = 'ordem')
+                  UNION SELECT id FROM especie WHERE familia_id IN (SELECT ref FROM achados WHERE tabela = 'familia')),
+       ucs (id) AS (SELECT ref FROM achados WHERE tabela = 'UC'
+              UNION SELECT UC_id FROM UC_UF WHERE UF_id IN (SELECT ref FROM achados WHERE tabela = 'UF'))
+SELECT rowid FROM risco WHERE especie_id IN (SELECT id FROM especies)
+UNION SELECT rowid FROM risco WHERE UC_id IN (SELECT id FROM ucs)"""
+
+
+def expressao(texto): #converte o texto digitado numa consulta FTS5: cada palavra vira um prefixo entre aspas
+    # Ex.: 'Serra do "Mar' -> '"Serra"* "do"* "Mar"*'. Sem nenhuma palavra, a expressão não encontra nada.
+    palavras = re.findall(r"\w+", texto or "")
+    return " ".join('"' + palavra + '"*' for palavra in palavras) if palavras else '""'
+
+
+def indexar(conn, tabelas=None): #(re)cria as linhas do índice das tabelas indicadas (todas, se None); retorna o número de nomes
+    # Sem "tabelas", o índice é apagado e recriado do zero; com elas, só as linhas dessas tabelas são refeitas.
+    # Sem o índice na base, ele é criado completo. Tabelas e colunas que ainda não existem (ex.: UF.nome_ext antes de referencia.py) são ignoradas.
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (TABELA,)).fetchone():
+        tabelas = None #índice ainda não existe: é criado com todas as tabelas
+    colunas = dict()
+    for tabela in NOMES:
+        colunas[tabela] = [linha[1] for linha in conn.execute("PRAGMA table_info(" + tabela + ")")]
+    with conn:
+        if tabelas is None:
+            conn.execute("DROP TABLE IF EXISTS " + TABELA)
+        conn.execute(DDL)
+        for tabela in NOMES if tabelas is None else tabelas:
+            if not colunas[tabela]:
+                continue
+            texto = "nome" if tabela == "UF" and "nome_ext" not in colunas[tabela] else NOMES[tabela]
+            if tabelas is not None:
+                conn.execute("DELETE FROM " + TABELA + " WHERE tabela = ?", (tabela,))
+            conn.execute("INSERT INTO " + TABELA + " (nome, tabela, ref) SELECT " + texto + ", ?, id FROM " + tabela +
+                         " WHERE nome IS NOT NULL", (tabela,))
+        conn.execute("INSERT INTO " + TABELA + " (" + TABELA + ") VALUES ('optimize')") #junta os segmentos do índice: buscas mais rápidas
+    return conn.execute("SELECT count(*) FROM " + TABELA).fetchone()[0]
+
+
+def sugerir(conn, texto, limite=20): #[(tabela, id, nome)] dos nomes que casam com o texto, do mais ao menos relevante
+    return conn.execute(SQL_SUGESTOES, (expressao(texto), limite)).fetchall()
+
+
+def riscos(conn, texto): #rowids das linhas de "risco" ligadas aos nomes que casam com o texto
+    return [rowid for (rowid,) in conn.execute(SQL_RISCOS, (expressao(texto),))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Busca nomes de espécies, táxons, UCs e estados, sem diferenciar acentos, pelo começo das palavras")
+    parser.add_argument("texto", nargs="+", help="palavras buscadas")
+    parser.add_argument("--db", default="fauna_db.sqlite", help="arquivo da base SQLite")
+    parser.add_argument("--limite", type=int, default=20, help="número máximo de nomes mostrados")
+    parser.add_argument("--indexar", action="store_true", help="recria o índice antes da busca (bases carregadas antes dele)")
+    args = parser.parse_args()
+
+    texto = " ".join(args.texto)
+    try:
+        import consultar
+        conn = db.connect(args.db) if args.indexar else consultar.conectar(args.db)
+        if args.indexar:
+            print(indexar(conn), "nome(s) indexado(s)")
+        for tabela, ref, nome in sugerir(conn, texto, args.limite):
+            print(tabela + "\t" + str(ref) + "\t" + nome)
+        print(len(riscos(conn, texto)), "linha(s) de risco ligada(s) a esses nomes")
+    except db.Error as erro:
+        sys.exit("Erro ao buscar em " + args.db + ": " + str(erro))
+    conn.close()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Cache em disco dos resultados das etapas de pipeline.py, endereçado pelo conteúdo das entradas de cada etapa.
+# Cada entrada é uma pasta <cache_dir>/<impressão>/ com cópias dos arquivos produzidos pela etapa (a base SQLite
+# ou os CSV e PNG da pasta de saída). A impressão é o sha256 de tudo o que determina o resultado: o código dos
+# módulos usados, a versão do esquema, os arquivos de entrada e a impressão da etapa anterior.
+# O tamanho total do cache é limitado: quando passa do limite, as entradas usadas há mais tempo são apagadas.
+
+import os
+import shutil
+import hashlib
+import sqlite3 as db
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = "cache_etapas"
+TAMANHO_MAXIMO = 1 << 30 #1 GiB
+
+
+def impressao(*partes): #sha256 de uma sequência de textos (ou bytes), separados para que ("ab", "c") != ("a", "bc")
+    sha = hashlib.sha256()
+    for parte in partes:
+        dado = parte if isinstance(parte, bytes) else str(parte).encode("utf-8")
+        sha.update(str(len(dado)).encode("ascii") + b":" + dado)
+    return sha.hexdigest()
+
+
+def impressao_codigo(*modulos): #impressão do código-fonte dos módulos indicados (arquivos .py ao lado deste)
+    return impressao(*[open(os.path.join(PASTA, modulo + ".py"), "rb").read() for modulo in modulos])
+
+
+def tamanho(caminho):
+    return sum(os.path.getsize(os.path.join(raiz, arquivo)) for raiz, _, arquivos in os.walk(caminho) for arquivo in arquivos)
+
+
+def buscar(cache_dir, chave): #pasta da entrada, ou None; uma entrada encontrada passa a ser a mais recente para o despejo
+    entrada = os.path.join(cache_dir, chave)
+    if not os.path.isdir(entrada):
+        return None
+    os.utime(entrada)
+    return entrada
+
+
+def guardar_base(cache_dir, chave, conn, tamanho_maximo=TAMANHO_MAXIMO): #cópia consistente da base aberta em conn (API de backup do SQLite)
+    temporaria = os.path.join(cache_dir, chave + ".tmp")
+    os.makedirs(temporaria, exist_ok=True)
+    destino = db.connect(os.path.join(temporaria, "base.sqlite"))
+    with destino:
+        conn.backup(destino)
+    destino.close()
+    return publicar(cache_dir, chave, temporaria, tamanho_maximo)
+
+
+def guardar_arquivos(cache_dir, chave, arquivos, tamanho_maximo=TAMANHO_MAXIMO, pasta=None): #cópia dos arquivos indicados
+    # Com "pasta", cada arquivo mantém o caminho relativo a ela (subpastas como fato/UF=MG/); sem, só o nome.
+    temporaria = os.path.join(cache_dir, chave + ".tmp")
+    os.makedirs(temporaria, exist_ok=True)
+    for arquivo in arquivos:
+        destino = os.path.join(temporaria, os.path.relpath(arquivo, pasta) if pasta else os.path.basename(arquivo))
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        shutil.copy2(arquivo, destino)
+    return publicar(cache_dir, chave, temporaria, tamanho_maximo)
+
+
+def publicar(cache_dir, chave, temporaria, tamanho_maximo): #torna a entrada visível de uma vez (rename) e aplica o limite de tamanho
+    if tamanho(temporaria) > tamanho_maximo: #maior do que o cache inteiro: não vale a pena guardar
+        shutil.rmtree(temporaria)
+        return None
+    entrada = os.path.join(cache_dir, chave)
+    shutil.rmtree(entrada, ignore_errors=True)
+    os.replace(temporaria, entrada)
+    despejar(cache_dir, tamanho_maximo, manter=chave)
+    return entrada
+
+
+def restaurar_base(entrada, conn): #sobrescreve a base aberta em conn com a cópia guardada na entrada
+    origem = db.connect(os.path.join(entrada, "base.sqlite"))
+    origem.backup(conn)
+    origem.close()
+
+
+def restaurar_arquivos(entrada, pasta): #copia os arquivos da entrada (e de suas subpastas) para a pasta; retorna seus caminhos
+    destinos = list()
+    for raiz, subpastas, arquivos in os.walk(entrada):
+        subpastas.sort()
+        destino = os.path.normpath(os.path.join(pasta, os.path.relpath(raiz, entrada)))
+        os.makedirs(destino, exist_ok=True)
+        for arquivo in sorted(arquivos):
+            destinos.append(shutil.copy2(os.path.join(raiz, arquivo), os.path.join(destino, arquivo)))
+    return destinos
+
+
+def despejar(cache_dir, tamanho_maximo=TAMANHO_MAXIMO, manter=None): #apaga as entradas usadas há mais tempo até o cache caber no limite
+    entradas = [os.path.join(cache_dir, nome) for nome in os.listdir(cache_dir) if not nome.endswith(".tmp")]
+    entradas = sorted(((os.path.getmtime(entrada), tamanho(entrada), entrada) for entrada in entradas if os.path.isdir(entrada)))
+    total = sum(bytes_ for _, bytes_, _ in entradas)
+    apagadas = 0
+    for _, bytes_, entrada in entradas:
+        if total <= tamanho_maximo:
+            break
+        if os.path.basename(entrada) == manter:
+            continue
+        shutil.rmtree(entrada, ignore_errors=True)
+        total -= bytes_
+        apagadas += 1
+    if apagadas:
+        print(apagadas, "entrada(s) antiga(s) removida(s) do cache (%.1f MB em uso)" % (total / 1e6))
+    return apagadas
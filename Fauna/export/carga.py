@@ -0,0 +1,386 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Carga da planilha de fauna ameaçada na base SQLite em lotes de linhas de tamanho fixo.
+# Diferente do caderno, que lê a planilha inteira com pd.read_excel e mantém o DataFrame "data" na memória,
+# aqui cada lote é lido, recebe suas chaves e é gravado na base antes do próximo ser carregado,
+# de modo que o uso de memória não cresce com o tamanho da fonte.
+
+import os
+import json
+import time
+import hashlib
+import argparse
+from contextlib import contextmanager
+import sqlite3 as db
+import numpy as np
+import pandas as pd
+
+import busca
+import edicoes
+import esquema
+import unidades
+import integridade
+import taxonomia
+import compacto
+
+COLUNAS_CP = list(range(3, 7)) + list(range(8, 12)) #posições das colunas de divisão até família e de espécies até Unidades Federais
+TAMANHO_LOTE = 50000
+PRAGMAS_DE_CARGA = {"journal_mode": "MEMORY", "synchronous": "OFF"}
+
+
+def ler_em_lotes(src, tamanho_lote=TAMANHO_LOTE, compactar=True, fusoes=None): #gera DataFrames com no máximo tamanho_lote linhas da planilha (xlsx, csv, tsv ou txt)
+    # Com "compactar", as colunas de texto repetitivo de cada lote chegam como "category" e os inteiros no menor tipo
+    # (compacto.py); compactar=False devolve os lotes como o pandas os lê, para comparação.
+    # Com "fusoes" ({tabela: {variante: canônica}}, de deduplicacao.ler_mapa), os lotes já chegam com as grafias
+    # canônicas, antes de criar_chaves e de hash_linhas.
+    for lote in ler_lotes_brutos(src, tamanho_lote):
+        if fusoes:
+            lote = aplicar_fusoes(lote, fusoes)
+        yield compacto.compactar(lote) if compactar else lote
+
+
+def aplicar_fusoes(lote, fusoes): #troca as grafias variantes pelas canônicas nas colunas das tabelas do mapa
+    for tabela, mapa in fusoes.items():
+        nome = lote.columns[COLUNAS_CP[esquema.TITULOS.index(tabela)]]
+        codigos, valores = pd.factorize(lote[nome]) #o mapa é consultado uma vez por valor distinto, e não por linha
+        trocados = np.array([mapa.get(valor, valor) for valor in valores.tolist()] + [np.nan], dtype=object)
+        lote[nome] = trocados[codigos] #o código -1 das células vazias pega o np.nan do fim
+    return lote
+
+
+def ler_lotes_brutos(src, tamanho_lote):
+    extensao = os.path.splitext(src)[1].lower()
+    if extensao in (".csv", ".tsv", ".txt"):
+        sep = "\t" if extensao == ".tsv" else ","
+        if extensao == ".txt": #os .txt exportados pelos sistemas de origem costumam ser separados por tabulação
+            with open(src, encoding="utf-8", errors="replace") as arquivo:
+                sep = "\t" if "\t" in arquivo.readline() else "," #o cabeçalho tem vírgulas dentro dos títulos, então a tabulação decide
+        for lote in pd.read_csv(src, sep=sep, chunksize=tamanho_lote):
+            yield lote
+        return
+    if extensao not in (".xlsx", ".xlsm"): #formatos antigos (.xls) não podem ser lidos linha a linha
+        data = pd.read_excel(src)
+        for inicio in range(0, len(data), tamanho_lote):
+            yield data.iloc[inicio:inicio + tamanho_lote].reset_index(drop=True)
+        return
+
+    from openpyxl import load_workbook
+    planilha = load_workbook(src, read_only=True, data_only=True) #modo read_only lê as linhas sob demanda, sem carregar o arquivo todo
+    try:
+        linhas = planilha.worksheets[0].iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return
+        lote = list()
+        for linha in linhas:
+            lote.append(linha)
+            if len(lote) == tamanho_lote:
+                yield pd.DataFrame(lote, columns=cabecalho)
+                lote = list()
+        if lote:
+            yield pd.DataFrame(lote, columns=cabecalho)
+    finally:
+        planilha.close()
+
+
+def criar_chaves(fonte, tabelas=None): #versão vetorizada de criar_CP para todas as colunas de uma vez
+    # As chaves seguem a ordem de primeira aparição de cada valor (como em criar_CP), são determinísticas e, quando
+    # "tabelas" já traz os valores de lotes anteriores, os valores conhecidos mantêm suas chaves.
+    # Retorna as tabelas de dimensão atualizadas (um pd.Index por tabela, em que a posição do valor é a sua chave),
+    # os pares (id, nome) inéditos de cada tabela e as colunas da fonte já convertidas em chaves, cada uma no menor
+    # tipo inteiro em que cabem as chaves da sua tabela.
+    if tabelas is None:
+        tabelas = [pd.Index([], dtype=object) for titulo in esquema.TITULOS]
+    novos = list()
+    codigos = dict()
+    for i, pos in enumerate(COLUNAS_CP):
+        coluna = fonte[fonte.columns[pos]]
+        codes, valores = pd.factorize(coluna, use_na_sentinel=False) #células vazias formam um único valor, como em criar_CP
+        valores = pd.Index(valores, dtype=object) #colunas "category" devolvem um CategoricalIndex; as tabelas guardam os próprios valores
+        conhecidos = tabelas[i]
+        chaves = conhecidos.get_indexer(valores) #-1 para valores que ainda não têm chave
+        ineditos = chaves == -1
+        chaves[ineditos] = np.arange(len(conhecidos), len(conhecidos) + ineditos.sum())
+        tabelas[i] = conhecidos.append(valores[ineditos])
+        novos.append((chaves[ineditos], valores[ineditos]))
+        codigos[coluna.name] = chaves[codes].astype(compacto.menor_inteiro(len(tabelas[i])))
+    return tabelas, novos, pd.DataFrame(codigos, index=fonte.index)
+
+
+def inserir_dimensoes(cur, novos): #um executemany por tabela no lugar de um INSERT por nome
+    for titulo, (ids, nomes) in zip(esquema.TITULOS, novos):
+        cur.executemany("INSERT OR IGNORE INTO " + titulo + " (id, nome) VALUES (?, ?)", zip(ids.tolist(), nomes.tolist()))
+
+
+@contextmanager
+def pragmas_de_carga(conn): #journal em memória e sem fsync durante a carga; os valores anteriores são restaurados ao final
+    # Uma base em modo WAL (servida por api_consultas.py) continua em WAL: sair dele exige que nenhum leitor esteja
+    # conectado, e no WAL os leitores seguem vendo a versão anterior até a carga ser confirmada.
+    if conn.in_transaction:
+        conn.commit()
+    anteriores = dict()
+    for pragma, valor in PRAGMAS_DE_CARGA.items():
+        atual = conn.execute("PRAGMA " + pragma).fetchone()[0]
+        if pragma == "journal_mode" and atual == "wal":
+            continue
+        anteriores[pragma] = atual
+        conn.execute("PRAGMA " + pragma + " = " + valor)
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.commit()
+        for pragma, valor in anteriores.items():
+            conn.execute("PRAGMA " + pragma + " = " + str(valor))
+
+
+def povoar_em_massa(conn, lote, hashes=None): #popula risco e atualiza especie, familia, ordem e UC em poucas operações, numa única transação
+    # As linhas do lote (já convertidas em chaves) vão para uma tabela temporária com um único executemany; a partir dela
+    # um INSERT ... SELECT preenche "risco" e um UPDATE ... FROM por tabela aplica as chaves estrangeiras. Quando a mesma
+    # espécie, família, ordem ou UC aparece mais de uma vez, vale a última linha, como no laço do caderno.
+    # "hashes" traz o hash de conteúdo de cada linha da fonte (ver hash_linhas), gravado em risco.linha_hash para a carga
+    # incremental. Retorna o número de linhas por segundo.
+    inicio = time.perf_counter()
+    cols = [lote.columns[pos] for pos in COLUNAS_CP]
+    linhas = lote[cols].to_numpy().tolist()
+    if hashes is None:
+        hashes = [None] * len(linhas)
+    cur = conn.cursor()
+    cur.execute("""CREATE TEMP TABLE IF NOT EXISTS carga_tmp (divisao_id INTEGER, classe_id INTEGER, ordem_id INTEGER,
+                   familia_id INTEGER, especie_id INTEGER, categoria_id INTEGER, UC_id INTEGER, UF_id INTEGER, linha_hash INTEGER)""")
+    with conn:
+        cur.execute("DELETE FROM carga_tmp")
+        cur.executemany("INSERT INTO carga_tmp VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [linha + [h] for linha, h in zip(linhas, hashes)])
+        cur.execute("""INSERT INTO risco (especie_id, categoria_id, UC_id, linha_hash) SELECT especie_id, categoria_id, UC_id, linha_hash FROM carga_tmp ORDER BY rowid""")
+        cur.execute("""UPDATE especie SET divisao_id = u.divisao_id, classe_id = u.classe_id, ordem_id = u.ordem_id, familia_id = u.familia_id
+                       FROM (SELECT * FROM carga_tmp WHERE rowid IN (SELECT max(rowid) FROM carga_tmp GROUP BY especie_id)) AS u
+                       WHERE especie.id = u.especie_id""")
+        cur.execute("""UPDATE familia SET ordem_id = u.ordem_id
+                       FROM (SELECT * FROM carga_tmp WHERE rowid IN (SELECT max(rowid) FROM carga_tmp GROUP BY familia_id)) AS u
+                       WHERE familia.id = u.familia_id""")
+        cur.execute("""UPDATE ordem SET classe_id = u.classe_id
+                       FROM (SELECT * FROM carga_tmp WHERE rowid IN (SELECT max(rowid) FROM carga_tmp GROUP BY ordem_id)) AS u
+                       WHERE ordem.id = u.ordem_id""")
+        cur.execute("""UPDATE UC SET UF_id = u.UF_id
+                       FROM (SELECT * FROM carga_tmp WHERE rowid IN (SELECT max(rowid) FROM carga_tmp GROUP BY UC_id)) AS u
+                       WHERE UC.id = u.UC_id""")
+        cur.execute("DELETE FROM carga_tmp")
+    return len(lote) / max(time.perf_counter() - inicio, 1e-9)
+
+
+def povoar_linha_a_linha(conn, lote, hashes=None): #o laço original do caderno (cinco comandos por linha), mantido para comparação
+    inicio = time.perf_counter()
+    cur = conn.cursor()
+    cols = [lote.columns[pos] for pos in COLUNAS_CP]
+    if hashes is None:
+        hashes = [None] * len(lote)
+    for (divisao_id, classe_id, ordem_id, familia_id, especie_id, categoria_id, UC_id, UF_id), linha_hash in zip(lote[cols].to_numpy().tolist(), hashes):
+        cur.execute("""INSERT INTO risco (especie_id, categoria_id, UC_id, linha_hash) VALUES (?, ?, ?, ?)""", (especie_id, categoria_id, UC_id, linha_hash, ))
+        cur.execute("""UPDATE especie SET divisao_id = ?, classe_id = ?, ordem_id = ?, familia_id= ? WHERE id = ? """, (divisao_id, classe_id, ordem_id, familia_id, especie_id,))
+        cur.execute("""UPDATE familia SET ordem_id = ? WHERE id = ? """, (ordem_id, familia_id, ))
+        cur.execute("""UPDATE ordem SET classe_id = ? WHERE id = ? """, (classe_id, ordem_id, ))
+        cur.execute("""UPDATE UC SET UF_id = ? WHERE id = ?""", (UF_id, UC_id, ))
+    conn.commit()
+    return len(lote) / max(time.perf_counter() - inicio, 1e-9)
+
+
+def carregar_em_lotes(conn, src, tamanho_lote=TAMANHO_LOTE, povoar=povoar_em_massa, tempos=None, fusoes=None): #recria a base e a popula lote a lote; retorna o número de linhas carregadas
+    # Se "tempos" for um dicionário, acumula nele os segundos gastos em cada fase: leitura, chaves, integridade,
+    # povoamento e indices. A fase integridade confere as hierarquias da fonte (integridade.py) e grava os conflitos.
+    # "fusoes" é o mapa de grafias de deduplicacao.py, aplicado a cada lote antes das chaves (veja ler_em_lotes).
+    tempos = dict() if tempos is None else tempos
+    for fase in ("leitura", "chaves", "integridade", "povoamento", "indices"):
+        tempos.setdefault(fase, 0.0)
+    cur = conn.cursor()
+    esquema.criar_esquema(cur)
+    tabelas = None
+    pares = list()
+    total = 0
+    inicio = marca = time.perf_counter()
+    with pragmas_de_carga(conn):
+        for lote in ler_em_lotes(src, tamanho_lote, fusoes=fusoes):
+            tempos["leitura"] += time.perf_counter() - marca
+            marca = time.perf_counter()
+            hashes = hash_linhas(lote)
+            tabelas, novos, codigos = criar_chaves(lote, tabelas)
+            lote[codigos.columns] = codigos
+            tempos["chaves"] += time.perf_counter() - marca
+            marca = time.perf_counter()
+            pares.append(integridade.pares_do_lote(codigos, total))
+            tempos["integridade"] += time.perf_counter() - marca
+            marca = time.perf_counter()
+            with conn:
+                inserir_dimensoes(cur, novos)
+            taxa = povoar(conn, lote, hashes)
+            total += len(lote)
+            print("Lote gravado:", total, "linhas carregadas até agora (%.0f linhas/s)" % taxa)
+            tempos["povoamento"] += time.perf_counter() - marca
+            marca = time.perf_counter()
+        integridade.gravar(conn, integridade.conflitos(pares))
+        tempos["integridade"] += time.perf_counter() - marca
+        marca = time.perf_counter()
+        unidades.criar_ponte_uc_uf(conn)
+        taxonomia.criar_taxonomia(conn)
+        impressao = impressao_fonte(src)
+        gravar_meta(conn, dict(impressao, fusoes_sha256=impressao_fusoes(fusoes)))
+        edicoes.registrar(conn, 1, src, impressao["fonte_sha256"], total, 0) #a base recriada começa pela edição 1
+        tempos["povoamento"] += time.perf_counter() - marca
+    marca = time.perf_counter()
+    esquema.criar_indices(conn)
+    print(busca.indexar(conn), "nome(s) no índice de busca")
+    tempos["indices"] += time.perf_counter() - marca
+    print("Carga concluída: %.0f linhas/s no total" % (total / max(time.perf_counter() - inicio, 1e-9)))
+    return total
+
+
+def carregar_incremental(conn, src, tamanho_lote=TAMANHO_LOTE, fusoes=None): #aplica à base apenas as linhas novas, alteradas ou removidas da fonte
+    # Cada linha da fonte é identificada pelo hash do seu conteúdo. As linhas cujo hash já está em risco.linha_hash são
+    # ignoradas; as demais recebem chaves a partir das tabelas já existentes (as chaves antigas não mudam) e são gravadas
+    # com povoar_em_massa; as linhas da base que não aparecem mais na fonte são apagadas de "risco". Uma linha alterada
+    # conta como a remoção de uma linha e a inserção de outra com a mesma espécie e UC. As linhas das tabelas de
+    # dimensão nunca são apagadas, para que um valor que volte à fonte recupere a mesma chave.
+    # Se alguma linha entrou ou saiu, a carga vira uma nova edição, com essas linhas gravadas em risco_delta (edicoes.py).
+    # As linhas novas passam pela conferência de integridade.py, entre si e contra os valores já gravados; a tabela
+    # "conflito" passa a ter os conflitos desta carga.
+    # Com "fusoes" (deduplicacao.py), as linhas são comparadas já com as grafias canônicas: trocar o mapa faz as linhas
+    # afetadas saírem com a grafia antiga e voltarem com a nova.
+    # Se o arquivo de origem e o mapa são os mesmos da última carga, nada é lido. Retorna (novas, alteradas, removidas).
+    cur = conn.cursor()
+    existentes = [nome for (nome,) in cur.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    colunas_risco = [linha[1] for linha in cur.execute("PRAGMA table_info(risco)")]
+    if "carga_meta" not in existentes or "linha_hash" not in colunas_risco: #base inexistente ou criada sem hashes de linha
+        print("Base sem hashes de linha: fazendo a carga completa")
+        return carregar_em_lotes(conn, src, tamanho_lote, fusoes=fusoes), 0, 0
+
+    meta = dict(cur.execute("SELECT chave, valor FROM carga_meta"))
+    impressao = dict(impressao_fonte(src, meta), fusoes_sha256=impressao_fusoes(fusoes))
+    if impressao["fonte_sha256"] == meta.get("fonte_sha256") and impressao["fusoes_sha256"] == meta.get("fusoes_sha256", impressao_fusoes(None)):
+        gravar_meta(conn, impressao)
+        print("Fonte e mapa de fusões inalterados desde a última carga")
+        return 0, 0, 0
+
+    edicao = edicoes.proxima(conn) #as linhas inseridas e removidas ficam em risco_delta, com o número desta edição
+    armazenados = pd.Series(dict(cur.execute("SELECT linha_hash, count(*) FROM risco GROUP BY linha_hash")), dtype="int64")
+    vistos = pd.Series(dtype="int64")
+    tabelas = [ler_dimensao(conn, titulo) for titulo in esquema.TITULOS]
+    chaves_novas = list()
+    pares = [integridade.pares_da_base(conn)]
+    com_nomes_novos = set() #tabelas de dimensão que ganharam linhas, cujos nomes entram no índice de busca
+    novas = 0
+    with pragmas_de_carga(conn):
+        for lote in ler_em_lotes(src, tamanho_lote, fusoes=fusoes):
+            hashes = pd.Series(hash_linhas(lote), dtype="int64")
+            ocorrencia = hashes.map(vistos).fillna(0) + hashes.groupby(hashes).cumcount() #quantas vezes o mesmo conteúdo já apareceu na fonte
+            ineditas = (ocorrencia >= hashes.map(armazenados).fillna(0)).to_numpy()
+            contagem = hashes.value_counts()
+            vistos = contagem if vistos.empty else vistos.add(contagem, fill_value=0).astype("int64")
+            if not ineditas.any():
+                continue
+            lote = lote[ineditas].reset_index(drop=True)
+            tabelas, novos, codigos = criar_chaves(lote, tabelas)
+            lote[codigos.columns] = codigos
+            pares.append(integridade.pares_do_lote(codigos, novas))
+            with conn:
+                inserir_dimensoes(cur, novos)
+                edicoes.gravar_insercoes(cur, edicao, codigos.iloc[:, [4, 5, 6]].to_numpy().tolist(), hashes[ineditas].tolist())
+            com_nomes_novos.update(titulo for titulo, (ids, _) in zip(esquema.TITULOS, novos) if len(ids))
+            povoar_em_massa(conn, lote, hashes[ineditas].tolist())
+            chaves_novas.append(codigos.iloc[:, [4, 6]].to_numpy()) #espécie e UC de cada linha nova
+            novas += len(lote)
+
+        sobra = armazenados.sub(vistos, fill_value=0)
+        sobra = sobra[sobra > 0].astype("int64") #ocorrências da base que não estão mais na fonte
+        removidas = pd.DataFrame(columns=["especie_id", "UC_id"])
+        with conn:
+            if len(sobra):
+                cur.execute("CREATE TEMP TABLE IF NOT EXISTS remocao_tmp (linha_hash INTEGER PRIMARY KEY, quantas INTEGER)")
+                cur.execute("DELETE FROM remocao_tmp")
+                cur.executemany("INSERT INTO remocao_tmp VALUES (?, ?)", zip(sobra.index.tolist(), sobra.tolist()))
+                alvo = """SELECT r.id FROM (SELECT rowid AS id, linha_hash, row_number() OVER (PARTITION BY linha_hash ORDER BY rowid DESC) AS n
+                                            FROM risco WHERE linha_hash IN (SELECT linha_hash FROM remocao_tmp)) AS r
+                          JOIN remocao_tmp AS t ON r.linha_hash = t.linha_hash WHERE r.n <= t.quantas""" #as últimas ocorrências de cada hash
+                removidas = pd.read_sql_query("SELECT especie_id, UC_id FROM risco WHERE rowid IN (" + alvo + ")", conn)
+                edicoes.gravar_remocoes(cur, edicao, alvo)
+                cur.execute("DELETE FROM risco WHERE rowid IN (" + alvo + ")")
+        if novas:
+            integridade.gravar(conn, integridade.conflitos(pares))
+            unidades.criar_ponte_uc_uf(conn)
+            taxonomia.criar_taxonomia(conn)
+        gravar_meta(conn, impressao)
+        if novas or len(removidas):
+            edicoes.registrar(conn, edicao, src, impressao["fonte_sha256"], novas, len(removidas))
+    esquema.criar_indices(conn)
+    busca.indexar(conn, [tabela for tabela in busca.NOMES if tabela in com_nomes_novos]) #também cria o índice numa base anterior a ele
+
+    inseridas = pd.DataFrame(np.concatenate(chaves_novas) if chaves_novas else np.empty((0, 2), dtype="int64"), columns=["especie_id", "UC_id"])
+    pares = pd.concat([inseridas.value_counts(), removidas.value_counts()], axis=1).fillna(0)
+    alteradas = int(pares.min(axis=1).sum()) #pares espécie/UC que saíram e voltaram com outro conteúdo
+    print(novas - alteradas, "linha(s) nova(s),", alteradas, "alterada(s) e", len(removidas) - alteradas, "removida(s)")
+    return novas - alteradas, alteradas, len(removidas) - alteradas
+
+
+def hash_linhas(lote): #hash de conteúdo (int64) de cada linha, independente do tipo com que cada coluna foi lida
+    # O pandas escolhe o tipo de cada coluna lote a lote: uma coluna de inteiros com uma célula vazia vem como float
+    # naquele lote. Os floats inteiros viram int antes do texto, para que a mesma linha dê "1" em qualquer lote, e não "1.0".
+    colunas = dict()
+    for nome in lote.columns:
+        coluna = lote[nome]
+        valores = coluna.astype(object).where(coluna.notna(), None)
+        if pd.api.types.is_float_dtype(coluna.dtype):
+            inteiros = coluna.notna() & (coluna % 1 == 0)
+            valores = valores.where(~inteiros, coluna[inteiros].astype("int64").astype(object))
+        colunas[nome] = valores.astype(str)
+    texto = pd.DataFrame(colunas, index=lote.index)
+    return pd.util.hash_pandas_object(texto, index=False).to_numpy().view(np.int64).tolist()
+
+
+def ler_dimensao(conn, titulo): #valores de uma tabela de dimensão na ordem das chaves, no formato usado por criar_chaves
+    nomes = [nome for (nome,) in conn.execute("SELECT nome FROM " + titulo + " ORDER BY id")]
+    return pd.Index([np.nan if nome is None else nome for nome in nomes], dtype=object)
+
+
+def impressao_fonte(src, meta=None): #tamanho, data de modificação e sha256 do arquivo de origem
+    estado = os.stat(src)
+    impressao = {"fonte_tamanho": str(estado.st_size), "fonte_mtime": str(estado.st_mtime_ns)}
+    if meta and meta.get("fonte_sha256") and all(meta.get(chave) == valor for chave, valor in impressao.items()):
+        impressao["fonte_sha256"] = meta["fonte_sha256"] #mesmo tamanho e data de modificação: não relê o arquivo
+        return impressao
+    sha = hashlib.sha256()
+    with open(src, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(1 << 20), b""):
+            sha.update(bloco)
+    impressao["fonte_sha256"] = sha.hexdigest()
+    return impressao
+
+
+def impressao_fusoes(fusoes): #sha256 do mapa de fusões (o mesmo para None e para um mapa vazio), guardado em carga_meta
+    return hashlib.sha256(json.dumps(fusoes or dict(), sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def gravar_meta(conn, valores):
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO carga_meta (chave, valor) VALUES (?, ?)", valores.items())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carrega a planilha de fauna ameaçada na base SQLite em lotes de linhas")
+    parser.add_argument("src", nargs="?", default="fauna_fed.xlsx", help="planilha de origem (.xlsx, .csv, .tsv, ou .txt separado por tabulação ou vírgula)")
+    parser.add_argument("--db", default="fauna_db.sqlite", help="arquivo da base SQLite")
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE, help="número de linhas lidas e gravadas por vez")
+    parser.add_argument("--linha-a-linha", action="store_true", help="usa o laço original de cinco comandos por linha, para comparação")
+    parser.add_argument("--incremental", action="store_true", help="aplica apenas as linhas novas, alteradas ou removidas desde a última carga")
+    parser.add_argument("--fusoes", metavar="CSV", help="mapa de grafias de UCs e espécies (deduplicacao.py), aplicado antes de criar as chaves")
+    args = parser.parse_args()
+
+    fusoes = None
+    if args.fusoes:
+        import deduplicacao
+        fusoes = deduplicacao.ler_mapa(args.fusoes)
+    conn = db.connect(args.db)
+    if args.incremental:
+        carregar_incremental(conn, args.src, args.lote, fusoes)
+    else:
+        total = carregar_em_lotes(conn, args.src, args.lote, povoar_linha_a_linha if args.linha_a_linha else povoar_em_massa, fusoes=fusoes)
+        print("Tabelas populadas:", total, "linhas")
+    conn.close()
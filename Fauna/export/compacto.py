@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Representação compacta dos DataFrames de trabalho (lotes da planilha, chaves, resultados de consultas e totais).
+# Colunas de texto com muitos valores repetidos (espécie, categoria, UC, UF...) viram "category", em que cada valor
+# é guardado uma só vez e as linhas guardam só um código; colunas inteiras usam o menor tipo em que os valores cabem.
+# Com isso os adaptadores de np.int32/np.int64 para o sqlite3 deixam de ser necessários: os valores passam ao
+# SQLite por .tolist(), que já os converte em int do Python.
+
+import numpy as np
+import pandas as pd
+
+PROPORCAO_CATEGORIA = 0.5 #colunas de texto com menos valores distintos do que esta fração das linhas viram "category"
+
+
+def menor_inteiro(maximo, minimo=0): #menor tipo inteiro com sinal do numpy em que cabem os valores entre minimo e maximo
+    for tipo in (np.int8, np.int16, np.int32):
+        info = np.iinfo(tipo)
+        if info.min <= minimo and maximo <= info.max:
+            return tipo
+    return np.int64
+
+
+def compactar(df, proporcao=PROPORCAO_CATEGORIA): #cópia de df com as colunas de texto repetitivo em "category" e os inteiros reduzidos
+    colunas = dict()
+    for nome in df.columns:
+        coluna = df[nome]
+        if isinstance(coluna.dtype, pd.CategoricalDtype):
+            colunas[nome] = coluna
+        elif pd.api.types.is_integer_dtype(coluna.dtype) and len(coluna):
+            colunas[nome] = coluna.astype(menor_inteiro(coluna.max(), coluna.min()))
+        elif pd.api.types.is_object_dtype(coluna.dtype) or pd.api.types.is_string_dtype(coluna.dtype):
+            codigos, valores = pd.factorize(coluna) #uma só passada: os mesmos códigos servem para montar a coluna "category"
+            if len(valores) < proporcao * len(coluna):
+                valores = pd.Index(valores.to_numpy()) #deixa o pandas inferir o tipo das categorias (textos em "str", como em astype)
+                coluna = pd.Series(pd.Categorical.from_codes(codigos, valores), index=df.index, name=nome)
+            colunas[nome] = coluna
+        else:
+            colunas[nome] = coluna
+    return pd.DataFrame(colunas, index=df.index)
+
+
+def memoria_mb(df): #memória ocupada pelo DataFrame, contando o conteúdo dos textos
+    return df.memory_usage(deep=True).sum() / 1e6
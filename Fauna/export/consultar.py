@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Consultas avulsas à base fauna_db.sqlite com os filtros da seção 3 (classe, categoria e estado), usando apenas
+# sqlite3 e consultas.py: nada de pandas, numpy ou matplotlib, para que a resposta saia logo após a partida do Python.
+#   python consultar.py --classe Amphibia --categoria CR --limite 10
+#   python consultar.py --uf MG --contar
+# As linhas saem separadas por tabulação, com cabeçalho. benchmark.py mede o tempo de partida deste script.
+
+import sys
+import time
+import argparse
+import pathlib
+import sqlite3 as db
+
+import consultas
+
+
+def conectar(caminho, **opcoes): #somente leitura: uma base inexistente é um erro, e não um arquivo vazio criado por engano
+    # A URI sai de pathlib, que escapa "?", "#" e "%" do caminho; as opções vão para sqlite3.connect.
+    return db.connect(pathlib.Path(caminho).resolve().as_uri() + "?mode=ro", uri=True, **opcoes)
+
+
+def consultar(conn, contar=False, limite=None, **filtros): #(colunas, linhas) da listagem da seção 3, ou só o número de linhas
+    sqlstr, params = consultas.montar_consulta(limite=limite, contar=contar, **filtros)
+    cur = conn.execute(sqlstr, params)
+    return [descricao[0] for descricao in cur.description], cur.fetchall()
+
+
+if __name__ == "__main__":
+    inicio = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Lista (ou conta) as espécies ameaçadas com os filtros da seção 3, só com sqlite3")
+    parser.add_argument("--db", default="fauna_db.sqlite", help="arquivo da base SQLite")
+    for nome in consultas.FILTROS:
+        parser.add_argument("--" + nome, help="filtra por " + nome)
+    parser.add_argument("--limite", type=int, help="número máximo de linhas")
+    parser.add_argument("--contar", action="store_true", help="mostra só o número de linhas")
+    parser.add_argument("--tempo", action="store_true", help="mostra em stderr o tempo gasto depois da partida do Python")
+    args = parser.parse_args()
+
+    try:
+        conn = conectar(args.db)
+        colunas, linhas = consultar(conn, args.contar, args.limite, **{nome: getattr(args, nome) for nome in consultas.FILTROS})
+    except db.Error as erro:
+        sys.exit("Erro ao consultar " + args.db + ": " + str(erro))
+    saida = sys.stdout
+    saida.write("\t".join(colunas) + "\n")
+    for linha in linhas:
+        saida.write("\t".join("" if valor is None else str(valor) for valor in linha) + "\n")
+    conn.close()
+    if args.tempo:
+        print("%.1f ms" % ((time.perf_counter() - inicio) * 1000), file=sys.stderr)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Consultas da análise (filtros da seção 3 e contagens da seção 5) na forma de modelos com parâmetros.
+# Só depende da biblioteca padrão, para que consultar.py e api_consultas.py respondam aos filtros sem carregar pandas.
+
+import busca
+import taxonomia
+
+COLUNAS = """especie.nome as "Espécie", divisao.nome as "Divisão", classe.nome as "Classe", ordem.nome as "Ordem", familia.nome as "Família",
+       categoria.nome as "Risco de Extinção", UC.nome as "Unidade de Conservação", UF.nome as "Estado(s)" """
+
+JUNCOES = """FROM   risco JOIN especie ON risco.especie_id = especie.id JOIN categoria ON risco.categoria_id = categoria.id
+       JOIN UC ON risco.UC_id = UC.id JOIN divisao ON especie.divisao_id = divisao.id JOIN classe ON especie.classe_id = classe.id
+       JOIN ordem ON especie.ordem_id = ordem.id JOIN familia ON especie.familia_id = familia.id JOIN UF ON UC.UF_id = UF.id"""
+
+# Filtros da seção 3. O filtro por estado usa a tabela ponte UC_UF; os de divisão, ordem e família, a tabela de
+# fechamento de taxonomia.py; e "busca", o índice textual de busca.py.
+FILTROS = {
+    "classe": "classe.nome = ?",
+    "divisao": "risco.especie_id IN (" + taxonomia.descendentes("divisao") + ")",
+    "ordem": "risco.especie_id IN (" + taxonomia.descendentes("ordem") + ")",
+    "familia": "risco.especie_id IN (" + taxonomia.descendentes("familia") + ")",
+    "categoria": "categoria.nome = ?",
+    "uf": "UC.id IN (SELECT UC_UF.UC_id FROM UC_UF JOIN UF AS estado ON UC_UF.UF_id = estado.id WHERE estado.nome = ?)",
+    "busca": "risco.rowid IN (" + busca.SQL_RISCOS + ")",
+}
+PREPARAR = {"busca": busca.expressao} #filtros cujo valor é convertido antes de virar parâmetro
+
+
+def modelo(filtros=(), limite=False, contar=False): #texto SQL da listagem da seção 3 com os filtros indicados (só os nomes)
+    # Os mesmos filtros dão sempre o mesmo texto (na ordem de FILTROS), para que o sqlite3 reaproveite o comando já
+    # preparado no cache de cada conexão. Com "contar", devolve só o número de linhas.
+    condicoes = [FILTROS[nome] for nome in FILTROS if nome in filtros]
+    sqlstr = "SELECT " + COLUNAS + "\n" + JUNCOES
+    if condicoes:
+        sqlstr += "\nWHERE  " + " AND ".join(condicoes)
+    if limite:
+        sqlstr += "\nLIMIT ?"
+    if contar:
+        sqlstr = "SELECT count(*) AS n FROM (" + sqlstr + ")"
+    return sqlstr
+
+
+def montar_consulta(limite=None, contar=False, **filtros): #devolve (sql, parâmetros) da listagem da seção 3 com os filtros pedidos
+    # Ex.: montar_consulta(classe="Amphibia", categoria="CR", uf="MG", limite=10) ou montar_consulta(busca="serra do mar")
+    desconhecidos = [nome for nome in filtros if nome not in FILTROS]
+    if desconhecidos:
+        raise KeyError("filtro(s) desconhecido(s): " + ", ".join(desconhecidos))
+    nomes = [nome for nome in FILTROS if filtros.get(nome) is not None]
+    params = [PREPARAR[nome](filtros[nome]) if nome in PREPARAR else filtros[nome] for nome in nomes]
+    if limite is not None:
+        params.append(limite)
+    return modelo(nomes, limite is not None, contar), tuple(params)
+
+
+# Contagens da seção 5 (agregacao.contar_por_categoria_sql): para cada dimensão, a expressão do valor e as junções a
+# partir de "risco" (UF passa pela tabela ponte UC_UF e os níveis taxonômicos, pela tabela de fechamento).
+NAO_INFORMADO = "Não Informado"
+NIVEIS = {"Divisão": "divisao", "Classe": "classe", "Ordem": "ordem", "Família": "familia", "Espécie": "especie"} #rótulo -> tabela de cada nível
+DIMENSOES = {
+    "UF": ("UF.nome", "JOIN UC_UF ON risco.UC_id = UC_UF.UC_id JOIN UF ON UC_UF.UF_id = UF.id"),
+    **{rotulo: (tabela + ".nome", taxonomia.juncao(tabela)) for rotulo, tabela in NIVEIS.items()},
+    "Tipo de UC": ("tipo_UC.nome", "JOIN UC ON risco.UC_id = UC.id JOIN tipo_UC ON UC.tipo_id = tipo_UC.id"),
+}
+
+
+def sql_contagem(dimensao, ancestrais=(), especies=False): #contagem por valor e categoria; o primeiro parâmetro é o rótulo das categorias vazias
+    # "ancestrais" são níveis de taxonomia.NIVEIS (ex.: ["classe"]): só entram as espécies descendentes dos táxons
+    # cujos nomes vêm, nessa ordem, nos parâmetros seguintes. Com "especies", conta espécies distintas em vez de linhas.
+    valor, juncoes = DIMENSOES[dimensao]
+    condicoes = [valor + " IS NOT NULL"] + ["risco.especie_id IN (" + taxonomia.descendentes(nivel) + ")" for nivel in ancestrais]
+    return ("SELECT " + valor + " AS valor, coalesce(categoria.descricao, ?) AS categoria, " +
+            ("count(DISTINCT risco.especie_id)" if especies else "count(*)") + " AS n, min(risco.rowid) AS ordem "
+            "FROM risco JOIN categoria ON risco.categoria_id = categoria.id " + juncoes +
+            " WHERE " + " AND ".join(condicoes) + " GROUP BY 1, 2")
+
+
+def montar_contagem(dimensao, especies=False, **ancestrais): #devolve (sql, parâmetros) da contagem de uma dimensão, com filtros por táxon
+    # Ex.: montar_contagem("Ordem", classe="Amphibia") conta, por ordem e categoria, as linhas dos anfíbios.
+    desconhecidos = [nivel for nivel in ancestrais if nivel not in taxonomia.NIVEIS]
+    if desconhecidos:
+        raise KeyError("nível(is) desconhecido(s): " + ", ".join(desconhecidos) + " (válidos: " + ", ".join(taxonomia.NIVEIS) + ")")
+    niveis = [nivel for nivel in taxonomia.NIVEIS if ancestrais.get(nivel) is not None]
+    return sql_contagem(dimensao, niveis, especies), (NAO_INFORMADO,) + tuple(ancestrais[nivel] for nivel in niveis)
+
+
+VARREDURAS = ("contagem Tipo de UC",) #consultas de consultas_da_analise que leem uma tabela grande inteira de propósito (o total de cada tipo passa por todas as UCs)
+
+
+def consultas_da_analise(): #as consultas que o projeto executa, no formato nome -> (sql, parâmetros) usado por esquema.verificar_planos
+    consultas = {
+        "listagem": montar_consulta(limite=10),
+        "classe": montar_consulta(classe="Amphibia", limite=10),
+        "classe_categoria": montar_consulta(classe="Amphibia", categoria="CR", limite=10),
+        "classe_uf": montar_consulta(classe="Amphibia", uf="MG"),
+        "uf": montar_consulta(uf="MG"),
+        "categoria": montar_consulta(categoria="CR"),
+        "busca": montar_consulta(busca="Brachycephalus", limite=10),
+        "busca_uf": montar_consulta(busca="Serra do Mar", uf="SP"),
+        "ordem": montar_consulta(ordem="Anura", limite=10),
+        "familia_uf": montar_consulta(familia="Brachycephalidae", uf="SP"),
+    }
+    for dimensao in DIMENSOES:
+        consultas["contagem " + dimensao] = montar_contagem(dimensao)
+    consultas["contagem Ordem em Amphibia"] = montar_contagem("Ordem", classe="Amphibia")
+    consultas["contagem Família em Anura, espécies"] = montar_contagem("Família", especies=True, ordem="Anura")
+    return consultas
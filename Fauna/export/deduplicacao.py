@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Grafias diferentes do mesmo nome de UC ou de espécie na planilha de origem. Como criar_CP (e carga.criar_chaves)
+# dá uma chave a cada texto distinto, "PE Serra do Mar" e "PE da Serra do Mar", ou "ESEC do Pau Brasil" e
+# "ESEC do Pau-Brasil", viram duas UCs e dividem as contagens. Aqui os nomes de cada tabela são agrupados em duas
+# passadas, sem comparar todos os pares (impossível com dezenas de milhares de nomes):
+#   1. cada nome é normalizado (sem acentos, maiúsculas, pontuação, espaços sobrando e "da", "do", "de"...), e nomes
+#      com a mesma forma normalizada são a mesma UC ou espécie;
+#   2. as palavras distintas dos nomes são distribuídas em blocos por um índice invertido, cuja chave é a palavra sem
+#      uma das letras (ou a própria palavra); só os pares de cada bloco são conferidos, e os que estão a uma letra de
+#      distância (troca, falta, sobra ou inversão de duas letras vizinhas) são palavras vizinhas. Dois nomes se juntam
+#      quando têm as demais palavras iguais, na mesma ordem, e palavras vizinhas na posição restante.
+# Palavras com menos de TAMANHO_MINIMO letras ou com algarismos só se juntam pela forma normalizada: "FLONA Amanã" e
+# "FLONA Amapá", ou "FLONA Itaituba I" e "II", são unidades diferentes. Em cada grupo, a grafia com mais linhas na
+# fonte (ou a que aparece primeiro, no empate) é a canônica.
+# O resultado é um mapa de fusões (tabela, variante, canônica) em CSV, para ser revisto e passado à carga, que troca
+# as variantes pelas canônicas antes de criar as chaves (carga.py --fusoes, pipeline.py --fusoes):
+#   python deduplicacao.py fauna_fed.xlsx --saida fusoes.csv
+#   python pipeline.py --fusoes fusoes.csv
+
+import re
+import sys
+import argparse
+import unicodedata
+from difflib import SequenceMatcher
+import numpy as np
+import pandas as pd
+
+import esquema
+import carga
+
+TABELAS = ("UC", "especie") #tabelas de dimensão cujos nomes são agrupados
+PALAVRAS_VAZIAS = {"a", "o", "as", "os", "da", "de", "do", "das", "dos", "e"} #ignoradas na comparação
+TAMANHO_MINIMO = 6 #palavras mais curtas só se juntam pela forma normalizada
+COLUNAS_MAPA = ["tabela", "variante", "canonica", "linhas", "similaridade"]
+
+
+def normalizar(nome): #forma do nome usada na comparação: "PE da Serra do Mar " -> "pe serra mar"
+    texto = unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore").decode("ascii").lower()
+    return " ".join(palavra for palavra in re.findall(r"[a-z0-9]+", texto) if palavra not in PALAVRAS_VAZIAS)
+
+
+def variantes(palavra): #a própria palavra e as que saem dela sem uma letra; duas palavras a até uma letra de distância têm uma em comum
+    return {palavra} | {palavra[:i] + palavra[i + 1:] for i in range(len(palavra))}
+
+
+def uma_letra(a, b): #True se b sai de a trocando, tirando ou pondo uma letra, ou invertendo duas letras vizinhas
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1:]
+    return a[i + 1:] == b[i + 1:] or (a[i + 2:] == b[i + 2:] and a[i:i + 2] == b[i:i + 2][::-1])
+
+
+def contar_nomes(src, tamanho_lote=carga.TAMANHO_LOTE): #{tabela: {grafia: linhas}} das tabelas de TABELAS, na ordem em que as grafias aparecem na fonte
+    contagens = {tabela: dict() for tabela in TABELAS}
+    for lote in carga.ler_em_lotes(src, tamanho_lote):
+        for tabela in TABELAS:
+            codigos, valores = pd.factorize(lote.iloc[:, carga.COLUNAS_CP[esquema.TITULOS.index(tabela)]]) #células vazias ficam de fora
+            contagem = contagens[tabela]
+            for valor, linhas in zip(valores.tolist(), np.bincount(codigos[codigos >= 0], minlength=len(valores)).tolist()):
+                contagem[valor] = contagem.get(valor, 0) + linhas
+    return contagens
+
+
+def grupos(nomes): #rótulo do grupo de cada nome da lista, depois das duas passadas; retorna também a forma normalizada de cada um
+    formas = [normalizar(nome) for nome in nomes]
+    distintas = list(dict.fromkeys(forma for forma in formas if forma)) #nomes sem letras nem algarismos ("-") não se juntam
+    pai = list(range(len(distintas)))
+
+    def raiz(i):
+        while pai[i] != i:
+            pai[i] = pai[pai[i]]
+            i = pai[i]
+        return i
+
+    # Blocos do vocabulário: cada palavra entra no bloco de cada uma das suas variantes, e só os pares de um mesmo
+    # bloco são conferidos por uma_letra.
+    palavras = [forma.split() for forma in distintas]
+    vocabulario = {palavra for lista in palavras for palavra in lista if len(palavra) >= TAMANHO_MINIMO and palavra.isalpha()}
+    blocos = dict()
+    for palavra in sorted(vocabulario):
+        for variante in variantes(palavra):
+            blocos.setdefault(variante, list()).append(palavra)
+    vizinhas = dict() #palavra -> palavras a uma letra de distância
+    for membros in blocos.values():
+        for posicao, a in enumerate(membros):
+            for b in membros[posicao + 1:]:
+                if uma_letra(a, b):
+                    vizinhas.setdefault(a, set()).add(b)
+                    vizinhas.setdefault(b, set()).add(a)
+    # Dois nomes se juntam quando diferem numa só posição, por palavras vizinhas: só os nomes com alguma palavra que
+    # tem vizinhas são procurados, pelo resto do nome, num dicionário.
+    posicoes = dict()
+    procurados = list()
+    for k, lista in enumerate(palavras):
+        for i, palavra in enumerate(lista):
+            if palavra in vizinhas:
+                resto = (i, " ".join(lista[:i]), " ".join(lista[i + 1:]))
+                posicoes[resto + (palavra,)] = k
+                procurados.append((k, resto, palavra))
+    for k, resto, palavra in procurados:
+        for vizinha in vizinhas[palavra]:
+            outro = posicoes.get(resto + (vizinha,))
+            if outro is not None and raiz(k) != raiz(outro):
+                pai[raiz(k)] = raiz(outro)
+    indice = {forma: k for k, forma in enumerate(distintas)}
+    return [raiz(indice[forma]) if forma else -1 - n for n, forma in enumerate(formas)], formas
+
+
+def fusoes(contagens): #mapa de fusões (DataFrame com COLUNAS_MAPA), só com as grafias que mudam
+    partes = list()
+    for tabela, contagem in contagens.items():
+        nomes = list(contagem)
+        rotulos, formas = grupos(nomes)
+        tabela_nomes = pd.DataFrame({"variante": nomes, "linhas": list(contagem.values()), "grupo": rotulos, "forma": formas})
+        canonicas = tabela_nomes.loc[tabela_nomes.groupby("grupo", sort=False)["linhas"].idxmax()].set_index("grupo") #idxmax fica com a primeira no empate
+        tabela_nomes["canonica"] = tabela_nomes["grupo"].map(canonicas["variante"])
+        tabela_nomes = tabela_nomes[tabela_nomes["variante"] != tabela_nomes["canonica"]].copy()
+        tabela_nomes["similaridade"] = [round(SequenceMatcher(None, forma, canonica).ratio(), 3)
+                                        for forma, canonica in zip(tabela_nomes["forma"], tabela_nomes["grupo"].map(canonicas["forma"]))]
+        tabela_nomes["tabela"] = tabela
+        partes.append(tabela_nomes[COLUNAS_MAPA])
+        print(tabela + ":", len(nomes), "grafia(s) em", len(nomes) - len(tabela_nomes), "nome(s);", len(tabela_nomes), "variante(s) fundida(s)")
+    return pd.concat(partes, ignore_index=True).sort_values(["tabela", "canonica", "variante"]).reset_index(drop=True)
+
+
+def ler_mapa(caminho): #{tabela: {variante: canônica}} de um mapa gravado em CSV, no formato usado por carga.ler_em_lotes
+    mapa = pd.read_csv(caminho, dtype=str, keep_default_na=False) #preserva os espaços e nomes como "NA"
+    return {tabela: dict(zip(linhas["variante"], linhas["canonica"])) for tabela, linhas in mapa.groupby("tabela", sort=False)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Encontra grafias diferentes do mesmo nome de UC ou de espécie e grava o mapa de fusões usado pela carga")
+    parser.add_argument("src", nargs="?", default="fauna_fed.xlsx", help="planilha de origem (.xlsx, .csv, .tsv, ou .txt separado por tabulação ou vírgula)")
+    parser.add_argument("--saida", default="fusoes.csv", help="arquivo CSV do mapa de fusões")
+    parser.add_argument("--lote", type=int, default=carga.TAMANHO_LOTE, help="número de linhas lidas por vez")
+    args = parser.parse_args()
+
+    try:
+        mapa = fusoes(contar_nomes(args.src, args.lote))
+    except OSError as erro:
+        sys.exit("Erro ao ler " + args.src + ": " + str(erro))
+    if len(mapa):
+        print(mapa.to_string(index=False))
+    mapa.to_csv(args.saida, index=False)
+    print("Mapa de fusões gravado em", args.saida)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Edições sucessivas da planilha de origem na mesma base, guardadas como diferenças.
+# A tabela "risco" tem sempre a edição mais recente. Cada carga incremental (carga.carregar_incremental) que muda
+# alguma coisa vira uma nova edição, e só as linhas que entraram (sinal 1) ou saíram (sinal -1) de "risco" nela são
+# gravadas em risco_delta. A carga completa (carga.carregar_em_lotes) recria a base e começa pela edição 1, sem
+# diferenças. O estado de uma edição antiga é o atual desfeito das diferenças das edições seguintes. As comparações
+# entre duas edições só leem, pelos índices, as espécies que aparecem nas diferenças entre elas, sem comparar as
+# tabelas inteiras.
+#   python edicoes.py --db fauna_db.sqlite --carregar fauna_2025.xlsx    carrega uma nova edição
+#   python edicoes.py --db fauna_db.sqlite                               lista as edições
+#   python edicoes.py --db fauna_db.sqlite --categorias 1 2              espécies que mudaram de categoria da edição 1 para a 2
+#   python edicoes.py --db fauna_db.sqlite --ocorrencias 1               ocorrências em UCs novas ou removidas desde a edição 1
+
+import os
+import sys
+import time
+import argparse
+import sqlite3 as db
+import pandas as pd
+
+DDL = """
+CREATE TABLE IF NOT EXISTS edicao (
+    id  INTEGER NOT NULL PRIMARY KEY,
+    fonte   TEXT,
+    fonte_sha256    TEXT,
+    carregada_em    TEXT,
+    linhas  INTEGER,
+    inseridas   INTEGER,
+    removidas   INTEGER
+);
+CREATE TABLE IF NOT EXISTS risco_delta (
+    edicao  INTEGER NOT NULL REFERENCES edicao (id),
+    sinal   INTEGER NOT NULL,
+    especie_id INTEGER REFERENCES especie (id),
+    categoria_id INTEGER REFERENCES categoria (id),
+    UC_id INTEGER REFERENCES UC (id),
+    linha_hash INTEGER
+);
+CREATE INDEX IF NOT EXISTS risco_delta_edicao ON risco_delta (edicao, especie_id);
+CREATE INDEX IF NOT EXISTS risco_delta_especie ON risco_delta (especie_id, edicao, categoria_id, UC_id, sinal);
+"""
+
+# Contagem de cada (espécie, categoria, UC) nas edições :de e :para, só para as espécies com diferenças entre elas:
+# a contagem atual (índice risco_especie) menos a soma dos sinais das edições posteriores (índice risco_delta_especie).
+SQL_CONTAGENS = """WITH tocadas (id) AS (SELECT DISTINCT especie_id FROM risco_delta WHERE edicao > :de AND edicao <= :para)
+SELECT especie_id, categoria_id, UC_id, sum(antes) AS antes, sum(depois) AS depois
+FROM   (SELECT especie_id, categoria_id, UC_id, count(*) AS antes, count(*) AS depois FROM risco
+        WHERE especie_id IN (SELECT id FROM tocadas) GROUP BY 1, 2, 3
+        UNION ALL
+        SELECT especie_id, categoria_id, UC_id, -sum(sinal), -coalesce(sum(sinal) FILTER (WHERE edicao > :para), 0) FROM risco_delta
+        WHERE especie_id IN (SELECT id FROM tocadas) AND edicao > :de GROUP BY 1, 2, 3)
+GROUP BY 1, 2, 3"""
+
+
+def preparar(conn): #cria as tabelas das edições numa base que ainda não as tem; a base atual vira a edição 1
+    with conn:
+        conn.executescript(DDL)
+        if conn.execute("SELECT count(*) FROM edicao").fetchone()[0] == 0:
+            meta = dict(conn.execute("SELECT chave, valor FROM carga_meta"))
+            linhas = conn.execute("SELECT count(*) FROM risco").fetchone()[0]
+            conn.execute("INSERT INTO edicao VALUES (1, NULL, ?, ?, ?, ?, 0)", (meta.get("fonte_sha256"), time.strftime("%Y-%m-%dT%H:%M:%S"), linhas, linhas))
+
+
+def proxima(conn): #número da edição que a próxima carga incremental vai gravar
+    preparar(conn)
+    return conn.execute("SELECT max(id) + 1 FROM edicao").fetchone()[0]
+
+
+def registrar(conn, edicao, src, fonte_sha256, inseridas, removidas): #grava a linha da edição, depois que as suas diferenças foram gravadas
+    conn.executescript(DDL) #a carga completa chega aqui com as tabelas recém-apagadas por esquema.DDL
+    linhas = conn.execute("SELECT count(*) FROM risco").fetchone()[0]
+    with conn:
+        conn.execute("INSERT INTO edicao VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (edicao, os.path.basename(src), fonte_sha256, time.strftime("%Y-%m-%dT%H:%M:%S"), linhas, inseridas, removidas))
+    print("Edição", edicao, "registrada:", inseridas, "linha(s) inserida(s) e", removidas, "removida(s)")
+
+
+def gravar_insercoes(cur, edicao, chaves, hashes): #linhas inseridas numa edição; "chaves" tem (especie_id, categoria_id, UC_id) em cada linha
+    cur.executemany("INSERT INTO risco_delta VALUES (?, 1, ?, ?, ?, ?)",
+                    ((edicao, especie, categoria, uc, linha_hash) for (especie, categoria, uc), linha_hash in zip(chaves, hashes)))
+
+
+def gravar_remocoes(cur, edicao, alvo): #linhas de "risco" cujos rowids vêm da subconsulta "alvo", antes de serem apagadas
+    cur.execute("INSERT INTO risco_delta SELECT ?, -1, especie_id, categoria_id, UC_id, linha_hash FROM risco WHERE rowid IN (" + alvo + ")", (edicao,))
+
+
+def listar(conn): #edições da base, da mais antiga à mais recente
+    return pd.read_sql_query("SELECT * FROM edicao ORDER BY id", conn).set_index("id")
+
+
+def intervalo(conn, de, para): #valida o par de edições; "para" None é a mais recente
+    ultima = conn.execute("SELECT max(id) FROM edicao").fetchone()[0]
+    para = ultima if para is None else para
+    if not (1 <= de <= para <= ultima):
+        raise ValueError("edições inválidas: %s a %s (a base tem as edições 1 a %s)" % (de, para, ultima))
+    return {"de": de, "para": para}
+
+
+def contagens(conn, de, para=None): #(espécie, categoria, UC, antes, depois) das espécies com diferenças entre as edições
+    return pd.read_sql_query(SQL_CONTAGENS, conn, params=intervalo(conn, de, para))
+
+
+def nomes(conn, tabela, ids): #{id: nome} de uma tabela de dimensão, só para os ids pedidos
+    ids = sorted(set(int(i) for i in ids if pd.notna(i)))
+    if not ids:
+        return dict()
+    return dict(conn.execute("SELECT id, nome FROM " + tabela + " WHERE id IN (SELECT value FROM json_each(?))", (str(ids),)))
+
+
+def mudancas_de_categoria(conn, de, para=None): #espécies presentes nas duas edições cujas categorias mudaram ("VU" -> "EN")
+    linhas = contagens(conn, de, para)
+    rotulos = nomes(conn, "categoria", linhas["categoria_id"])
+    categorias = dict()
+    for coluna in ("antes", "depois"):
+        presentes = linhas[linhas[coluna] > 0]
+        categorias[coluna] = presentes.groupby("especie_id")["categoria_id"].agg(lambda ids: "/".join(sorted(str(rotulos.get(i)) for i in set(ids))))
+    mudancas = pd.concat([categorias["antes"].rename("Antes"), categorias["depois"].rename("Depois")], axis=1, join="inner")
+    mudancas = mudancas[mudancas["Antes"] != mudancas["Depois"]]
+    mudancas.index = pd.Index(mudancas.index.map(nomes(conn, "especie", mudancas.index)), name="Espécie")
+    return mudancas.sort_index()
+
+
+def mudancas_de_ocorrencia(conn, de, para=None): #ocorrências de espécies em UCs que surgiram ou sumiram entre as edições
+    # Uma linha que só mudou de categoria (mesma espécie e UC) não conta. "Variação" é o número de linhas a mais
+    # (positivo, ocorrência nova) ou a menos (negativo, removida) da espécie na UC.
+    linhas = contagens(conn, de, para)
+    linhas = linhas.groupby(["especie_id", "UC_id"], as_index=False, dropna=False)[["antes", "depois"]].sum()
+    linhas = linhas[(linhas["antes"] > 0) != (linhas["depois"] > 0)]
+    return pd.DataFrame({"Espécie": linhas["especie_id"].map(nomes(conn, "especie", linhas["especie_id"])),
+                         "Unidade de Conservação": linhas["UC_id"].map(nomes(conn, "UC", linhas["UC_id"])),
+                         "Mudança": (linhas["depois"] > 0).map({True: "nova", False: "removida"}),
+                         "Variação": linhas["depois"] - linhas["antes"]}).sort_values(["Espécie", "Unidade de Conservação"]).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carrega e compara edições sucessivas da planilha de fauna ameaçada")
+    parser.add_argument("--db", default="fauna_db.sqlite", help="arquivo da base SQLite")
+    parser.add_argument("--carregar", metavar="PLANILHA", help="aplica esta planilha como uma nova edição (carga incremental)")
+    parser.add_argument("--categorias", type=int, nargs="+", metavar="EDICAO", help="mudanças de categoria da edição DE para PARA (padrão: a mais recente)")
+    parser.add_argument("--ocorrencias", type=int, nargs="+", metavar="EDICAO", help="ocorrências em UCs novas ou removidas da edição DE para PARA")
+    args = parser.parse_args()
+
+    conn = db.connect(args.db)
+    try:
+        if args.carregar:
+            import carga
+            carga.carregar_incremental(conn, args.carregar)
+        if args.categorias:
+            print(mudancas_de_categoria(conn, *args.categorias[:2]).to_string())
+        elif args.ocorrencias:
+            print(mudancas_de_ocorrencia(conn, *args.ocorrencias[:2]).to_string())
+        else:
+            preparar(conn)
+            print(listar(conn).to_string())
+    except (ValueError, db.Error) as erro:
+        sys.exit("Erro: " + str(erro))
+    finally:
+        conn.close()
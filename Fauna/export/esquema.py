@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Esquema da base de dados fauna_db.sqlite (tabela fato "risco" e tabelas de chaves primárias)
+
+import sqlite3 as db
+
+VERSAO_ESQUEMA = 5 #aumente quando o DDL, os índices ou as colunas adicionadas depois da carga mudarem (invalida o cache de pipeline.py)
+TITULOS = ["divisao", "classe", "ordem", "familia", "especie", "categoria", "UC", "UF"] #na mesma ordem das colunas em carga.COLUNAS_CP
+
+DDL = """
+DROP TABLE IF EXISTS risco;
+DROP TABLE IF EXISTS UC_UF;
+DROP TABLE IF EXISTS especie;
+DROP TABLE IF EXISTS categoria;
+DROP TABLE IF EXISTS familia;
+DROP TABLE IF EXISTS ordem;
+DROP TABLE IF EXISTS classe;
+DROP TABLE IF EXISTS divisao;
+DROP TABLE IF EXISTS UC;
+DROP TABLE IF EXISTS UF;
+DROP TABLE IF EXISTS carga_meta;
+DROP TABLE IF EXISTS risco_delta;
+DROP TABLE IF EXISTS edicao;
+DROP TABLE IF EXISTS conflito;
+
+CREATE TABLE risco (
+    especie_id INTEGER REFERENCES especie (id),
+    categoria_id INTEGER REFERENCES categoria (id),
+    UC_id INTEGER REFERENCES UC (id),
+    linha_hash INTEGER
+);
+CREATE INDEX risco_linha_hash ON risco (linha_hash);
+
+CREATE TABLE carga_meta (
+    chave   TEXT NOT NULL PRIMARY KEY,
+    valor   TEXT
+);
+
+CREATE TABLE especie (
+    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
+    nome    TEXT UNIQUE,    
+    divisao_id INTEGER REFERENCES divisao (id),
+    classe_id INTEGER REFERENCES classe (id),
+    familia_id INTEGER REFERENCES familia (id),
+    ordem_id INTEGER REFERENCES ordem (id)
+);
+
+CREATE TABLE categoria (
+    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
+    nome    TEXT UNIQUE
+);
+
+CREATE TABLE divisao (
+    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
+    nome    TEXT UNIQUE
+);
+
+CREATE TABLE classe (
+    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
+    nome    TEXT UNIQUE
+);
+
+CREATE TABLE ordem (
+    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
+    nome    TEXT UNIQUE,
+    classe_id INTEGER REFERENCES classe (id)
+);
+CREATE TABLE familia (
+    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
+    nome    TEXT UNIQUE,
+    ordem_id INTEGER REFERENCES ordem (id)
+);
+CREATE TABLE UC (
+    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
+    nome    TEXT UNIQUE,
+    UF_id INTEGER REFERENCES UF (id)
+);
+CREATE TABLE UF (
+    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
+    nome    TEXT UNIQUE
+);
+CREATE TABLE UC_UF (
+    UC_id   INTEGER NOT NULL REFERENCES UC (id),
+    UF_id   INTEGER NOT NULL REFERENCES UF (id),
+    PRIMARY KEY (UC_id, UF_id)
+) WITHOUT ROWID;
+CREATE INDEX UC_UF_UF ON UC_UF (UF_id, UC_id);
+"""
+
+
+def criar_esquema(cur): #apaga e recria todas as tabelas da base
+    cur.executescript(DDL)
+
+
+# Descrições das siglas de risco de extinção, do Livro Vermelho (P.33, Vol. 1) (seção 4.2 do caderno)
+DESCRICOES_CATEGORIA = {
+    "VU": "Vulnerável",
+    "CR": "Criticamente em Perigo",
+    "EN": "Em Perigo",
+    "CR(PEX)": "Provavelmente Extinta",
+    "RE": "Regionalmente Extinta",
+    "EX": "Extinta",
+    "CR(PEW)": "Provavelmente Extinta na Natureza",
+    "EW": "Extinta na Natureza",
+}
+
+
+def descrever_categorias(conn): #cria a coluna categoria.descricao, se ainda não existir, e a preenche a partir de DESCRICOES_CATEGORIA
+    if "descricao" not in [linha[1] for linha in conn.execute("PRAGMA table_info(categoria)")]:
+        conn.execute("ALTER TABLE categoria ADD descricao TEXT")
+    with conn:
+        conn.executemany("UPDATE categoria SET descricao = ? WHERE nome = ?", [(descricao, nome) for nome, descricao in DESCRICOES_CATEGORIA.items()])
+    print("Coluna descricao preenchida na tabela categoria")
+
+
+# Índices para as junções das seções 3 e 5, criados depois da carga (é mais rápido do que mantê-los durante os INSERTs).
+# Os três índices de "risco" são de cobertura: cada junção a partir de espécie, UC ou categoria encontra as outras duas
+# chaves no próprio índice, sem voltar à tabela.
+INDICES = {
+    "risco_especie": ("risco", "especie_id, categoria_id, UC_id"),
+    "risco_UC": ("risco", "UC_id, categoria_id, especie_id"),
+    "risco_categoria": ("risco", "categoria_id, especie_id, UC_id"),
+    "especie_classe": ("especie", "classe_id, divisao_id"),
+    "especie_divisao": ("especie", "divisao_id, classe_id"),
+    "especie_ordem": ("especie", "ordem_id"),
+    "especie_familia": ("especie", "familia_id"),
+    "UC_UF_id": ("UC", "UF_id"),
+    "UC_tipo_id": ("UC", "tipo_id"),
+    "taxonomia_descendente": ("taxonomia", "nivel, id, ancestral_nivel, ancestral_id"), #ancestrais de cada táxon (taxonomia.py)
+}
+
+TABELAS_GRANDES = ("risco", "especie", "UC", "UC_UF", "taxonomia", "risco_delta") #tabelas que nunca devem ser lidas inteiras sem índice
+
+
+def criar_indices(conn): #cria os índices que ainda não existem (cujas colunas já existem) e atualiza as estatísticas com ANALYZE
+    colunas = dict()
+    for indice, (tabela, cols) in INDICES.items():
+        if tabela not in colunas:
+            colunas[tabela] = [linha[1] for linha in conn.execute("PRAGMA table_info(" + tabela + ")")]
+        if all(col.strip() in colunas[tabela] for col in cols.split(",")):
+            conn.execute("CREATE INDEX IF NOT EXISTS " + indice + " ON " + tabela + " (" + cols + ")")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def verificar_chaves(conn): #lista as chaves estrangeiras que apontam para linhas inexistentes (PRAGMA foreign_key_check)
+    return conn.execute("PRAGMA foreign_key_check").fetchall()
+
+
+def verificar_planos(conn, consultas, varreduras=()): #garante, via EXPLAIN QUERY PLAN, que nenhuma consulta lê uma tabela grande inteira
+    # "consultas" é um dicionário nome -> (sql, parâmetros). Levanta AssertionError com os passos problemáticos.
+    # Um SCAN de tabela grande é uma leitura completa mesmo quando percorre um índice ("SCAN risco USING COVERING
+    # INDEX ..."); só as consultas nomeadas em "varreduras", que agregam a tabela inteira de propósito, podem fazê-lo.
+    # Consultas que dependem de tabelas ou colunas que a base ainda não tem (ex.: tipo_UC antes do enriquecimento da
+    # seção 4) são puladas com um aviso. Retorna o número de consultas verificadas.
+    problemas = list()
+    verificadas = 0
+    for nome, (sqlstr, params) in consultas.items():
+        try:
+            plano = conn.execute("EXPLAIN QUERY PLAN " + sqlstr, params).fetchall()
+        except db.OperationalError as erro:
+            print("Consulta \"" + nome + "\" não verificada:", erro)
+            continue
+        verificadas += 1
+        for linha in plano:
+            passo = linha[-1]
+            leitura_completa = passo.startswith("SCAN ") and passo.split()[1] in TABELAS_GRANDES and nome not in varreduras
+            if leitura_completa or "AUTOMATIC" in passo: #índices automáticos são recriados a cada execução da consulta
+                problemas.append(nome + ": " + passo)
+    assert not problemas, "Consultas com leitura completa de tabela:\n" + "\n".join(problemas)
+    return verificadas
+
+
+if __name__ == "__main__":
+    import sys
+    import consultas
+
+    conn = db.connect(sys.argv[1] if len(sys.argv) > 1 else "fauna_db.sqlite")
+    criar_indices(conn)
+    orfas = verificar_chaves(conn)
+    print(len(orfas), "chave(s) estrangeira(s) sem correspondência")
+    print(verificar_planos(conn, consultas.consultas_da_analise(), consultas.VARREDURAS), "consultas verificadas: todas usam índices")
+    conn.close()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Exportação colunar da base fauna_db.sqlite (Parquet ou Arrow IPC), para quem hoje refaz as junções da seção 5.
+# Gravamos, dentro da pasta de destino:
+#   dimensoes/<tabela>.parquet    cada tabela de dimensão (divisao ... UF, tipo_UC e a ponte UC_UF), inteira
+#   fato/UF=<sigla>/parte-0.parquet
+#                                 uma linha por linha de "risco", já com espécie, taxonomia, categoria, UC e tipo de UC
+#                                 por extenso, particionada por estado (UCs de "MG/RJ" aparecem em MG e em RJ, como
+#                                 nas contagens por UF; linhas sem estado ficam em UF=__HIVE_DEFAULT_PARTITION__)
+# As colunas de texto do fato são dicionários (category no pandas, dictionary no Arrow) com todos os valores da
+# dimensão, iguais em todas as partições, e as chaves usam o menor tipo inteiro (compacto.py). Com o formato "arrow"
+# os arquivos podem ser mapeados em memória; ler_fato mostra como ler só algumas colunas e alguns estados:
+#   python exportacao.py --db fauna_db.sqlite --destino colunar --formato arrow
+# pyarrow é necessário só para este módulo.
+
+import os
+import glob
+import shutil
+import argparse
+import sqlite3 as db
+import numpy as np
+import pandas as pd
+
+import agregacao
+import compacto
+
+FORMATOS = {"parquet": ".parquet", "arrow": ".arrow"}
+PARTICAO_NULA = "__HIVE_DEFAULT_PARTITION__" #nome usado pelo Hive (e reconhecido pelo pyarrow) para a partição sem valor
+TAMANHO_BLOCO = 50000 #linhas de "risco" lidas por vez e linhas por grupo (row group / record batch) de cada partição
+DIMENSOES = ["divisao", "classe", "ordem", "familia", "especie", "categoria", "UC", "UF", "tipo_UC", "UC_UF"]
+
+SQL_FATO = """SELECT risco.rowid AS risco_id, risco.especie_id, risco.categoria_id, risco.UC_id, UC_UF.UF_id
+              FROM risco LEFT JOIN UC_UF ON risco.UC_id = UC_UF.UC_id ORDER BY risco.rowid"""
+
+
+def tabelas_existentes(conn):
+    return set(nome for (nome,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'"))
+
+
+def ler_tabela(conn, tabela):
+    return pd.read_sql_query("SELECT * FROM " + tabela, conn)
+
+
+def por_id(tabela, coluna): #Series id -> valor da coluna, para traduzir chaves estrangeiras com map
+    return tabela.set_index("id")[coluna]
+
+
+def colunas_do_fato(tabelas): #coluna do fato -> (tabela cuja chave está em "risco", valor dessa coluna para cada linha da tabela)
+    especie, uc = tabelas["especie"], tabelas["UC"]
+    colunas = {"especie": ("especie", especie["nome"])}
+    for nivel in ("divisao", "classe", "ordem", "familia"):
+        colunas[nivel] = ("especie", especie[nivel + "_id"].map(por_id(tabelas[nivel], "nome")))
+    colunas["categoria"] = ("categoria", tabelas["categoria"]["nome"])
+    if "descricao" in tabelas["categoria"]: #colunas criadas pelas etapas normalizar e classificar, quando já rodaram
+        colunas["categoria_descricao"] = ("categoria", tabelas["categoria"]["descricao"])
+    colunas["UC"] = ("UC", uc["nome"])
+    if "tipo_id" in uc and "tipo_UC" in tabelas:
+        colunas["tipo_UC"] = ("UC", uc["tipo_id"].map(por_id(tabelas["tipo_UC"], "sigla")))
+    return colunas
+
+
+def dicionarios(tabelas): #para cada coluna do fato: (ids da tabela de origem, código de cada linha dela, categorias)
+    # Os códigos ganham um -1 no final: uma chave ausente da tabela (posição -1 em get_indexer) vira valor nulo.
+    resultado = dict()
+    for coluna, (origem, valores) in colunas_do_fato(tabelas).items():
+        codigos, categorias = pd.factorize(valores)
+        resultado[coluna] = (origem, pd.Index(tabelas[origem]["id"]), np.append(codigos, -1), pd.Index(categorias.to_numpy()))
+    return resultado
+
+
+def tipos_das_chaves(conn): #menor tipo inteiro de cada coluna de chave do fato, pelo maior valor em toda a base
+    # O tipo é o mesmo em todos os blocos e partições, para que o esquema dos arquivos não mude de um grupo para outro.
+    tipos = dict()
+    for coluna, expressao in (("risco_id", "rowid"), ("especie_id", "especie_id"), ("categoria_id", "categoria_id"), ("UC_id", "UC_id")):
+        maximo = conn.execute("SELECT max(" + expressao + ") FROM risco").fetchone()[0] #cada max() usa um índice
+        tipos[coluna] = compacto.menor_inteiro(maximo or 0)
+    return tipos
+
+
+def montar_fato(bloco, dicionarios, tipos): #DataFrame compacto do fato a partir de um bloco de chaves lido com SQL_FATO
+    fato = pd.DataFrame(index=bloco.index)
+    fato["risco_id"] = bloco["risco_id"].astype(tipos["risco_id"])
+    posicoes = dict()
+    for coluna, (origem, ids, codigos, categorias) in dicionarios.items():
+        if origem not in posicoes:
+            posicoes[origem] = ids.get_indexer(bloco[origem + "_id"])
+            fato[origem + "_id"] = bloco[origem + "_id"].astype(tipos[origem + "_id"])
+        fato[coluna] = pd.Categorical.from_codes(codigos[posicoes[origem]], categorias)
+    return fato
+
+
+def gravar_dimensoes(conn, pasta, formato="parquet"): #uma tabela por arquivo; retorna os caminhos gravados
+    import pyarrow as pa
+    os.makedirs(pasta, exist_ok=True)
+    existentes = tabelas_existentes(conn)
+    arquivos = list()
+    for tabela in DIMENSOES:
+        if tabela not in existentes:
+            continue
+        arquivos.append(os.path.join(pasta, tabela + FORMATOS[formato]))
+        gravar_tabela(pa.Table.from_pandas(ler_tabela(conn, tabela), preserve_index=False), arquivos[-1], formato)
+    return arquivos
+
+
+def gravar_tabela(tabela, caminho, formato):
+    escritor = abrir_escritor(caminho, tabela.schema, formato)
+    escritor.write_table(tabela)
+    escritor.close()
+
+
+def abrir_escritor(caminho, esquema, formato): #ParquetWriter ou arquivo Arrow IPC (mapeável em memória), ambos com write_table
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if formato == "arrow":
+        return pa.ipc.new_file(caminho, esquema)
+    return pq.ParquetWriter(caminho, esquema)
+
+
+def gravar_fato(conn, pasta, formato="parquet", tamanho_bloco=TAMANHO_BLOCO): #fato particionado por UF; retorna os caminhos gravados
+    # As linhas de cada estado se acumulam até formar um grupo de tamanho_bloco linhas, para que estados pequenos
+    # não fiquem divididos em muitos grupos minúsculos.
+    import pyarrow as pa
+    tabelas = {tabela: ler_tabela(conn, tabela) for tabela in ("divisao", "classe", "ordem", "familia", "especie", "categoria", "UC", "UF")}
+    if "tipo_UC" in tabelas_existentes(conn):
+        tabelas["tipo_UC"] = ler_tabela(conn, "tipo_UC")
+    dics = dicionarios(tabelas)
+    tipos = tipos_das_chaves(conn)
+    siglas = por_id(tabelas["UF"], "nome")
+    escritores, pendentes, caminhos = dict(), dict(), dict()
+
+    def descarregar(uf):
+        tabela = pa.concat_tables(pendentes.pop(uf))
+        if uf not in escritores:
+            os.makedirs(os.path.dirname(caminhos[uf]), exist_ok=True)
+            escritores[uf] = abrir_escritor(caminhos[uf], tabela.schema, formato)
+        escritores[uf].write_table(tabela)
+
+    try:
+        for bloco in agregacao.consultar_em_blocos(conn, SQL_FATO, tamanho_bloco=tamanho_bloco, compactar=False):
+            codigos, ufs = pd.factorize(bloco["UF_id"].map(siglas).fillna(PARTICAO_NULA)) #UF_id nulo (LEFT JOIN) ou sem linha em UF
+            ordem = np.argsort(codigos, kind="stable") #um só Table por bloco, ordenado por estado e fatiado sem cópia
+            tabela = pa.Table.from_pandas(montar_fato(bloco, dics, tipos), preserve_index=False).take(ordem)
+            limites = np.searchsorted(codigos[ordem], np.arange(len(ufs) + 1))
+            for i, uf in enumerate(ufs):
+                caminhos.setdefault(uf, os.path.join(pasta, "UF=" + uf, "parte-0" + FORMATOS[formato]))
+                pendentes.setdefault(uf, list()).append(tabela.slice(limites[i], limites[i + 1] - limites[i]))
+                if sum(len(tabela) for tabela in pendentes[uf]) >= tamanho_bloco:
+                    descarregar(uf)
+        for uf in list(pendentes):
+            descarregar(uf)
+    finally:
+        for escritor in escritores.values():
+            escritor.close()
+    return [caminhos[uf] for uf in sorted(caminhos)]
+
+
+def exportar(conn, destino, formato="parquet", tamanho_bloco=TAMANHO_BLOCO): #grava dimensões e fato em destino; retorna os caminhos
+    # Tudo é gravado numa pasta temporária que só então substitui a anterior: estados que sumiram da base não
+    # deixam partições antigas para trás e quem lê nunca encontra uma exportação pela metade.
+    if formato not in FORMATOS:
+        raise ValueError("formato desconhecido: " + str(formato) + " (disponíveis: " + ", ".join(FORMATOS) + ")")
+    temporaria = destino.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(temporaria, ignore_errors=True)
+    dimensoes = gravar_dimensoes(conn, os.path.join(temporaria, "dimensoes"), formato)
+    fato = gravar_fato(conn, os.path.join(temporaria, "fato"), formato, tamanho_bloco)
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporaria, destino)
+    print(len(dimensoes), "tabela(s) de dimensão e", len(fato), "partição(ões) do fato gravadas em", destino)
+    return [os.path.join(destino, os.path.relpath(arquivo, temporaria)) for arquivo in dimensoes + fato]
+
+
+def formato_exportado(destino): #formato de uma exportação já gravada, pela extensão das partes do fato
+    for formato, extensao in FORMATOS.items():
+        if glob.glob(os.path.join(glob.escape(destino), "fato", "UF=*", "parte-0" + extensao)):
+            return formato
+    raise ValueError("nenhuma parte do fato em " + destino + " (formatos: " + ", ".join(FORMATOS) + ")")
+
+
+def ler_fato(destino, colunas=None, ufs=None, formato=None): #lê do fato só as colunas e os estados pedidos, como DataFrame
+    # Ex.: ler_fato("colunar", ["especie", "categoria"], ["MG", "RJ"]). Os estados filtram pelas pastas, sem abrir as
+    # demais partições; no formato "arrow" os arquivos são mapeados em memória. Sem "formato", vale o da exportação.
+    formato = formato or formato_exportado(destino)
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+    particoes = ds.HivePartitioning.discover(infer_dictionary=True)
+    dados = ds.dataset(os.path.join(destino, "fato"), format="ipc" if formato == "arrow" else "parquet",
+                       partitioning=particoes, filesystem=fs.LocalFileSystem(use_mmap=True))
+    filtro = ds.field("UF").isin(ufs) if ufs is not None else None
+    return dados.to_table(columns=colunas, filter=filtro).to_pandas()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta as dimensões e o fato (já com as junções) da base SQLite em Parquet ou Arrow")
+    parser.add_argument("--db", default="fauna_db.sqlite", help="arquivo da base SQLite")
+    parser.add_argument("--destino", default="colunar", help="pasta onde os arquivos são gravados (substituída por inteiro)")
+    parser.add_argument("--formato", choices=list(FORMATOS), default="parquet", help="parquet (compacto) ou arrow (mapeável em memória)")
+    parser.add_argument("--lote", type=int, default=TAMANHO_BLOCO, help="linhas lidas por vez e linhas por grupo de cada partição")
+    args = parser.parse_args()
+
+    conn = db.connect(args.db)
+    exportar(conn, args.destino, args.formato, args.lote)
+    conn.close()
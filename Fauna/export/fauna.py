@@ -46,11 +46,11 @@
 # <a name="etapa1"></a>
 # ## 2. Criando a Base de Dados
 # #### Carregando dependencias, fonte de dados e dataframe do Pandas
+# Nota: para rodar estas etapas sem interação (sem input(), sem as extensões do Jupyter e sem exibir DataFrames), use o script **pipeline.py**, que grava as tabelas de totais e os gráficos numa pasta de saída: `python pipeline.py --src fauna_fed.xlsx --db fauna_db.sqlite --saida saida`
 
 # In[1]:
 
 
-import numpy as np
 import pandas as pd
 import sqlite3 as db
 from IPython.display import display #para visualizar dados
@@ -67,22 +67,12 @@ display(data)
 # In[2]:
 
 
-def criar_CP (fonte, nome_coluna, lista): #onde fonte é um dataframe Pandas e lista é uma variável onde serão armazenados os dicionários criados
-    kp = dict()
-    chave = 0
-    for item in fonte[nome_coluna]:
-        if item in kp:
-            continue
-        kp[item] = chave
-        chave += 1 
-    lista.append(kp)
-    print("Chaves criadas para elementos da coluna: " + nome_coluna)
-
-tabelas = list()
-for col in data.columns[3:7]: # tabelas CP de divisão até família
-    criar_CP(data, col, tabelas)
-for col in data.columns[8:12]: # tabelas CP de espécies até Unidades Federais
-    criar_CP(data, col, tabelas)
+import carga
+
+hashes = carga.hash_linhas(data) #hash do conteúdo de cada linha, usado pela carga incremental (carga.py --incremental)
+tabelas, novos, codigos = carga.criar_chaves(data) #chaves de divisão até família e de espécies até Unidades Federais, numa só passada
+for col in codigos.columns:
+    print("Chaves criadas para elementos da coluna: " + col)
     
 #obs: Poderíamos ter atingido um resultado semelhante utilizando o méotodo pd.core.frame.DataFrame.unique para cada uma das 
 #     colunas, que retorna uma lista dos elementos únicos em uma coluna. A partir disso, poderíamos pedir para que o SQL 
@@ -95,84 +85,18 @@ for col in data.columns[8:12]: # tabelas CP de espécies até Unidades Federais
 # In[3]:
 
 
-db.register_adapter(np.int32, int)  #Necessário para que o SQLite aceite ints com mais de 8 bits, 
-db.register_adapter(np.int64, int)  #como é o caso das ints geradas pelo pandas
-
+#Não é preciso registrar adaptadores de np.int32/np.int64 no SQLite: as chaves (guardadas no menor tipo inteiro,
+#ver compacto.py) chegam aos comandos como ints do Python, convertidas com .tolist()
+import esquema
 conn = db.connect("fauna_db.sqlite")
 cur = conn.cursor()
 
-cur.executescript("""
-DROP TABLE IF EXISTS especie;
-DROP TABLE IF EXISTS categoria;
-DROP TABLE IF EXISTS divisao;
-DROP TABLE IF EXISTS classe;
-DROP TABLE IF EXISTS ordem;
-DROP TABLE IF EXISTS familia;
-DROP TABLE IF EXISTS UC;
-DROP TABLE IF EXISTS UF;
-DROP TABLE IF EXISTS risco;
-
-CREATE TABLE risco (
-    especie_id INTEGER,
-    categoria_id INTEGER,
-    UC_id INTEGER
-);
-
-CREATE TABLE especie (
-    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
-    nome    TEXT UNIQUE,    
-    divisao_id INTEGER,
-    classe_id INTEGER,
-    familia_id INTEGER,
-    ordem_id INTEGER
-);
-
-CREATE TABLE categoria (
-    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
-    nome    TEXT UNIQUE
-);
-
-CREATE TABLE divisao (
-    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
-    nome    TEXT UNIQUE
-);
-
-CREATE TABLE classe (
-    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
-    nome    TEXT UNIQUE
-);
-
-CREATE TABLE ordem (
-    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
-    nome    TEXT UNIQUE,
-    classe_id INTEGER
-);
-CREATE TABLE familia (
-    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
-    nome    TEXT UNIQUE,
-    ordem_id INTEGER
-);
-CREATE TABLE UC (
-    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
-    nome    TEXT UNIQUE,
-    UF_id INTEGER
-);
-CREATE TABLE UF (
-    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
-    nome    TEXT UNIQUE
-);
-
-                 """)
-
-titulos = ["divisao", "classe", "ordem", "familia", "especie", "categoria", "UC", "UF"]
-i = 0
-for tabela in tabelas:
-    for nome in tabela:
-        cur.execute("INSERT OR IGNORE INTO " +titulos[i] + " (id, nome) VALUES (?, ?)", (tabela[nome], nome, ))
-    conn.commit()
-    print("Chaves primárias inseridas na tabela \"" + titulos[i] + "\" do banco de dados")
-    i += 1
-    
+esquema.criar_esquema(cur)
+
+carga.inserir_dimensoes(cur, novos) #um executemany por tabela
+conn.commit()
+for titulo in esquema.TITULOS:
+    print("Chaves primárias inseridas na tabela \"" + titulo + "\" do banco de dados")
 
 
 # <a name="diagrama1"></a>
@@ -186,14 +110,9 @@ for tabela in tabelas:
 # In[4]:
 
 
-headers = list()
-for col in data.columns[3:7]:
-    headers.append(col)
-for col in data.columns[8:12]:
-    headers.append(col)
-for i in range (len(tabelas)):  
-    print ("Mapendo chaves estrangeiras na coluna:", headers[i])
-    data[headers[i]] = data[headers[i]].map(tabelas[i]) #substitui todos os valores por suas respectivas chaves no dataset com base no dicionário presente em tabelas
+for col in codigos.columns:
+    print ("Mapendo chaves estrangeiras na coluna:", col)
+data[codigos.columns] = codigos #substitui todos os valores por suas respectivas chaves, já calculadas por carga.criar_chaves
 display(data)
 
 
@@ -202,23 +121,25 @@ display(data)
 # In[5]:
 
 
-for i in range(len(data)):
-    divisao_id = data[data.columns[3]][i]
-    classe_id = data[data.columns[4]][i]
-    ordem_id = data[data.columns[5]][i]
-    familia_id = data[data.columns[6]][i]    
-    especie_id = data[data.columns[8]][i]
-    categoria_id = data[data.columns[9]][i]
-    UC_id = data[data.columns[10]][i]
-    UF_id = data[data.columns[11]][i]        
-    cur.execute("""INSERT INTO risco (especie_id, categoria_id, UC_id) VALUES (?, ?, ?)""", (especie_id, categoria_id, UC_id, ))    
-    cur.execute("""UPDATE especie SET divisao_id = ?, classe_id = ?, ordem_id = ?, familia_id= ? WHERE id = ? """, (divisao_id, classe_id, ordem_id, familia_id, especie_id,))
-    cur.execute("""UPDATE familia SET ordem_id = ? WHERE id = ? """, (ordem_id, familia_id, ))
-    cur.execute("""UPDATE ordem SET classe_id = ? WHERE id = ? """, (classe_id, ordem_id, ))  
-    cur.execute("""UPDATE UC SET UF_id = ? WHERE id = ?""", (UF_id, UC_id, ))
-conn.commit()
+with carga.pragmas_de_carga(conn): #journal em memória e synchronous OFF apenas durante a carga
+    taxa = carga.povoar_em_massa(conn, data, hashes) #um INSERT ... SELECT e quatro UPDATE ... FROM no lugar de cinco comandos por linha
+impressao = carga.impressao_fonte(src)
+carga.gravar_meta(conn, impressao)
+print("%.0f linhas/s" % taxa)
 print("Tabelas populadas")
 
+import edicoes
+edicoes.registrar(conn, 1, src, impressao["fonte_sha256"], len(data), 0) #edição 1; as seguintes vêm de cargas incrementais (edicoes.py --carregar)
+
+import integridade
+integridade.gravar(conn, integridade.conflitos([integridade.pares_do_lote(codigos)])) #espécies em duas famílias, UCs em duas UFs... (vale a última linha)
+
+import unidades
+unidades.criar_ponte_uc_uf(conn) #tabela UC_UF: uma linha para cada estado de cada UC (MG/RJ vira MG e RJ)
+
+import taxonomia
+taxonomia.criar_taxonomia(conn) #tabela de fechamento: cada táxon ligado a todos os seus ancestrais (divisão, classe, ordem, família)
+
 
 # <a name="etapa2"></a>
 # ## 3. Visualizando e filtrando dados com SQL
@@ -285,14 +206,24 @@ get_ipython().run_cell_magic('sql', '', '\nSELECT especie.nome as "Espécie", di
 # Para evitar este problema, podemos adicionar como argumento na cláusula **WHERE**:
 # >UF.nome like "%MG%"
 # 
-# Em REGEX, _**%**_ significa "qualquer string". _**like**_ indica ao SQL que usaremos uma REGEX. Desta maneira, a expressão acima significa "qualquer string seguida por MG seguida por qualquer string". Em outras palavras, basta que a string "MG" esteja contida na string armazenada no banco de dados para que o filtro seja ativado. Vejamos:
+# Em REGEX, _**%**_ significa "qualquer string". _**like**_ indica ao SQL que usaremos uma REGEX. Desta maneira, a expressão acima significa "qualquer string seguida por MG seguida por qualquer string". Em outras palavras, basta que a string "MG" esteja contida na string armazenada no banco de dados para que o filtro seja ativado.
+# 
+# O problema é que um filtro com _**like**_ e _**%**_ no início não pode usar índices e obriga o SQLite a ler a tabela inteira. Por isso a carga cria a tabela **UC_UF**, que liga cada UC a cada uma das siglas de estado em que ela está (uma UC de "MG/RJ" aparece uma vez com MG e outra com RJ). O filtro por estado volta a ser uma igualdade:
+# >estado.nome = "MG"
+# 
+# Vejamos:
 
 # In[11]:
 
 
-get_ipython().run_cell_magic('sql', '', '\nSELECT especie.nome as "Espécie", divisao.nome as "Divisão", classe.nome as "Classe", ordem.nome as "Ordem", familia.nome as "Família", \n       categoria.nome as "Risco de Extinção", UC.nome as "Unidade de Conservação", UF.nome as "Estado(s)"  \nFROM   risco JOIN especie JOIN divisao JOIN classe JOIN ordem JOIN familia JOIN categoria JOIN UC JOIN UF\nWHERE  risco.especie_id = especie.id AND risco.categoria_id = categoria.id AND risco.UC_id = UC.id AND especie.divisao_id = divisao.id\n       AND especie.familia_id = familia.id AND especie.classe_id = classe.id AND especie.ordem_id = ordem.id AND UC.UF_id = UF.id \n       AND classe.id = 0 AND UF.nome like "%MG%"')
+get_ipython().run_cell_magic('sql', '', '\nSELECT especie.nome as "Espécie", divisao.nome as "Divisão", classe.nome as "Classe", ordem.nome as "Ordem", familia.nome as "Família", \n       categoria.nome as "Risco de Extinção", UC.nome as "Unidade de Conservação", UF.nome as "Estado(s)"  \nFROM   risco JOIN especie JOIN divisao JOIN classe JOIN ordem JOIN familia JOIN categoria JOIN UC JOIN UF\nWHERE  risco.especie_id = especie.id AND risco.categoria_id = categoria.id AND risco.UC_id = UC.id AND especie.divisao_id = divisao.id\n       AND especie.familia_id = familia.id AND especie.classe_id = classe.id AND especie.ordem_id = ordem.id AND UC.UF_id = UF.id \n       AND classe.id = 0 AND UC.id IN (SELECT UC_UF.UC_id FROM UC_UF JOIN UF AS estado ON UC_UF.UF_id = estado.id WHERE estado.nome = "MG")')
 
 
+# Fora do caderno, os mesmos filtros estão no módulo **consultas** como modelos com parâmetros (o texto SQL é fixo e só os valores mudam). O módulo **api_consultas** os responde para muitos usuários ao mesmo tempo, com conexões somente leitura em modo WAL e um cache dos resultados que é descartado quando a base muda:
+#
+#     api = api_consultas.ApiConsultas("fauna_db.sqlite")
+#     colunas, linhas = api.listar(classe="Amphibia", categoria="CR", uf="MG")
+
 # <a name="etapa3"></a>
 # ## 4. Refinando Dados
 # 
@@ -301,14 +232,15 @@ get_ipython().run_cell_magic('sql', '', '\nSELECT especie.nome as "Espécie", di
 # <a name="e3.1"></a>
 # ### 4.1 Importando novos dados da Internet
 # Antes de fazer análises, vamos garantir que todas as Unidades Federais possuem uma chave primária na tabela UF. Importaremos uma [tabela da Wikipedia](https://pt.wikipedia.org/wiki/Unidades_federativas_do_Brasil) que contém todas as siglas dos Estados utilizando o método _read_html_ do framework Pandas e indicando o filtro "Abreviação" para limitar os resultados
+# 
+# A leitura fica no módulo **referencia**: por padrão usamos a cópia da tabela que acompanha o código (fonte "instantaneo"), que funciona sem acesso à internet. Com a fonte "wikipedia", a página é consultada e guardada num cache em disco, reaproveitado nas próximas execuções; se a consulta falhar, voltamos ao cache ou à cópia.
 
 # In[12]:
 
 
-wikitables = pd.read_html("https://pt.wikipedia.org/wiki/Unidades_federativas_do_Brasil", match = "Abreviação") # Retorna uma LISTA de dataframes Pandas
-print(len(wikitables), "tabela(s) econtrada(s)")
-wikitable = wikitables[0]
-print("Tabela carregada na memória como", str(type(wikitable)))
+import referencia
+wikitable = referencia.carregar_indicadores("instantaneo") # ou "wikipedia", para atualizar a partir da página
+print(len(wikitable), "UF(s) encontrada(s)")
 display(wikitable)
 
 
@@ -318,50 +250,16 @@ display(wikitable)
 # In[13]:
 
 
-cur.executescript("""
-ALTER TABLE UF ADD nome_ext TEXT;
-ALTER TABLE UF ADD idh FLOAT;
-ALTER TABLE UF ADD alfabetizacao FLOAT;
-""")
-print("Colunas adicionadas na tabela UF")
+adicionadas = referencia.adicionar_colunas_uf(conn)
+print("Colunas adicionadas na tabela UF:", adicionadas)
 
 
-# Em seguida, vamos transportar os dados do dataframe pandas para Tuples do Python, que serão utlizadas para inserir os dados em nossa base de dados:
+# Em seguida, vamos gravar essas informações na tabela UF. Um único comando INSERT ... ON CONFLICT (um _upsert_) adiciona as siglas que ainda não estão na nossa base de dados e atualiza as que já estão:
 
 # In[14]:
 
 
-newinfo = list()
-for i in range (len(wikitable)):
-    sigla = wikitable["Abreviação"][i]
-    nome_ext = wikitable["Unidade federativa"][i]
-    idh = wikitable["IDH (2010)"][i]
-    alfab = (wikitable["Alfabetização (2016)"][i]).replace(",", ".")
-    info = (sigla, nome_ext, idh, alfab)
-    newinfo.append(info)   
-print ("Extraídas as seguintes informações da tabela:\n", newinfo)
-
-
-# Agora, podemos iterar pela lista de tuples (**newinfo**) para verificar quais siglas já estão na nossa base de dados, e adicionar aquelas que não estiverem:
-
-# In[15]:
-
-
-for i in range(len(newinfo)):
-    cur.execute("""SELECT nome FROM UF WHERE nome = ? """, (newinfo[i][0], ))
-    check = cur.fetchone()[0]
-    sigla = newinfo[i][0]
-    nome_ext = newinfo[i][1]
-    idh = float(newinfo[i][2])/1000
-    alfab = float(newinfo[i][3][:-1])    
-    if check is None:        
-        cur.execute("""INSERT INTO UF (nome, nome_ext, idh, alfabetizacao) VALUES (?, ?, ?, ?)""", (sigla, nome_ext, idh, alfab, ))
-        print("Sigla \"" + newinfo[i][0] + "\" não estava presente e foi adicionada à base junto com as demais informações")       
-    else:
-        cur.execute("""UPDATE UF SET nome_ext = ?, idh = ?, alfabetizacao = ? WHERE nome = ?""", (nome_ext, idh, alfab, sigla,))
-        print(sigla, nome_ext, idh, alfab, end = " | ")
-print("\n")        
-conn.commit()
+inseridas, atualizadas = referencia.mesclar_em_uf(conn, wikitable)
 
 
 # <a name="e3.2"></a>
@@ -380,18 +278,7 @@ conn.commit()
 # In[16]:
 
 
-cur.executescript("""
-ALTER TABLE categoria ADD descricao TEXT;
-UPDATE categoria SET descricao = "Vulnerável" WHERE nome = "VU";
-UPDATE categoria SET descricao = "Criticamente em Perigo" WHERE nome = "CR";
-UPDATE categoria SET descricao = "Em Perigo" where nome = "EN";
-UPDATE categoria SET descricao = "Provavelmente Extinta" WHERE nome = "CR(PEX)";
-UPDATE categoria SET descricao = "Regionalmente Extinta" WHERE nome = "RE";
-UPDATE categoria SET descricao = "Extinta" WHERE nome = "EX";
-UPDATE categoria SET descricao = "Provavelmente Extinta na Natureza" WHERE nome = "CR(PEW)";
-UPDATE categoria SET descricao = "Extinta na Natureza" WHERE nome = "EW";
-""")
-print("Coluna adicionada na tabela UC com valores atualizados")
+esquema.descrever_categorias(conn) #ALTER TABLE categoria ADD descricao e um UPDATE por sigla, com as descrições de esquema.DESCRICOES_CATEGORIA
 
 
 # Podemos fazer o mesmo para as siglas das Unidades de Conservação, utilizando como referência a mesma página do livro vermelho. Contudo, aqui teremos um pouco mais de trabalho, pois temos de **extrair a sigla das strings armazenadas na coluna "nome"** da tabela UC. Primeiro, vamos criar uma nova tabela primária em nossa base de dados para armazenar os tipos de Unidades de Conservação e populá-la. Aproveitaremos para adicionar o campo tipo_id na tabela UC
@@ -399,41 +286,7 @@ print("Coluna adicionada na tabela UC com valores atualizados")
 # In[17]:
 
 
-cur.executescript("""
-ALTER TABLE UC ADD tipo_id INTEGER;
-DROP TABLE IF EXISTS tipo_UC;
-
-CREATE TABLE tipo_UC (
-    id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
-    sigla TEXT UNIQUE,
-    nome    TEXT 
-);
-
-INSERT INTO tipo_UC (sigla, nome) VALUES ("APA", "Área de Proteção Ambiental");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("ARIE", "Área de Relevante Interesse Ecológico");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("FLONA", "Floresta Nacional");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("FLOE", "Floresta Estadual");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("FLOM", "Floresta Municipal");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("RESEX", "Reserva Extrativista");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("REFA", "Reserva da Fauna");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("REDES", "Reserva de Desenvolvimento Sustentável");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("RPPN", "Reserva Particular do Patrimônio Natural");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("FLOEX", "Floresta Extrativista");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("ASPE", "Área de Proteção Integral");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("PE", "Parque Estadual");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("PM", "Parque Municipal");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("PARNA", "Parque Nacional");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("FLOREST", "Floresta Estadual");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("MN", "Monumento Natural");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("REVIS", "Refúgio da Vida Silvestre");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("ESEC", "Estação Ecológica");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("Parque", "Parque");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("RDS", "Reserva de Desenvolvimento Sustentável");
-INSERT INTO tipo_UC (sigla, nome) VALUES ("REBIO", "Reserva Biológica");
-
-
-""")
-conn.commit()
+unidades.criar_tipos_uc(conn) #tabela tipo_UC com as siglas e nomes de unidades.TIPOS_UC e coluna UC.tipo_id
 print("Feito")
 
 
@@ -442,25 +295,22 @@ print("Feito")
 # In[18]:
 
 
-import re
-cur.execute("""SELECT count(*) FROM UC """) #retorna o número total de linhas na tabela
-rows = cur.fetchone()[0]
-count = 0
-for i in range(rows):
-    cur.execute("""SELECT nome FROM UC """)
-    nome = cur.fetchall()[i][0]
-    sigla = re.findall("([^ ]+?) .+", nome) #procure, sem ser ganancioso (?), uma sequencia de um ou mais caracteres (+) que não sejam espaços em branco ([^ ]) seguidos por um ou mais caracteres quaisquer (.+). Selecione apenas o que estiver entre parênteses
-    cur.execute("""SELECT id FROM tipo_UC WHERE sigla = ?""", (sigla[0], ))
-    tipo_id = cur.fetchone()
-    if tipo_id is None:
-        print("Sigla não encontrada na linha", i)
-        continue
-    tipo = int (tipo_id[0])
-    i = int(i)
-    cur.execute("""UPDATE UC SET tipo_id = ? WHERE id = ?""", (tipo, i))
-    count += 1 
-conn.commit()
-print (count, "de", rows, "registros foram atualizados")
+sem_tipo = unidades.classificar_tipos_uc(conn) #extrai as siglas de todas as UCs de uma vez e aplica os tipo_id num único UPDATE
+for uc in sem_tipo:
+    print("Sigla não encontrada para a UC", uc["id"], "(" + str(uc["nome"]) + ")")
+
+
+# Com todas as tabelas e colunas criadas, adicionamos os índices usados pelas junções das próximas seções, atualizamos as estatísticas do SQLite (ANALYZE), montamos o índice de busca textual dos nomes (sem diferenciar acentos, pelo começo das palavras) e conferimos, com EXPLAIN QUERY PLAN, que nenhuma das consultas do projeto lê as tabelas grandes inteiras:
+
+# In[ ]:
+
+
+import busca
+import consultas
+esquema.criar_indices(conn)
+print(busca.indexar(conn), "nome(s) no índice de busca textual") #espécies, táxons, UCs e estados (busca.py)
+print(len(esquema.verificar_chaves(conn)), "chave(s) estrangeira(s) sem correspondência")
+print(esquema.verificar_planos(conn, consultas.consultas_da_analise(), consultas.VARREDURAS), "consultas verificadas")
 
 
 # <a name="e3.3"></a>
@@ -488,10 +338,11 @@ print (count, "de", rows, "registros foram atualizados")
 
 sqlstr = ("""
 SELECT especie.id AS "ID", categoria.nome AS "Status", categoria.descricao AS "Descrição", UF.nome AS "UF", UF.nome_ext AS "Estado"  
-FROM risco JOIN especie JOIN categoria JOIN UC JOIN UF
-WHERE risco.especie_id = especie.id AND risco.categoria_id = categoria.id AND risco.UC_id = UC.id AND  UC.UF_id = UF.id
-""")
-dados = pd.read_sql_query(sqlstr, conn)
+FROM risco JOIN especie JOIN categoria JOIN UC_UF JOIN UF
+WHERE risco.especie_id = especie.id AND risco.categoria_id = categoria.id AND risco.UC_id = UC_UF.UC_id AND  UC_UF.UF_id = UF.id
+""") #via UC_UF, cada ocorrência aparece uma vez para cada estado da UC
+import agregacao
+dados = next(agregacao.consultar_em_blocos(conn, sqlstr, tamanho_bloco=1000)) #só o primeiro bloco de linhas, para visualização
 display(dados)
 
 
@@ -522,48 +373,15 @@ display(dados)
 # O passo seguinte é fazer a contagem para cada uma das categorias. Iniciamos um sub-loop que itera por toda **_categoria_** da variável **_categorias_**, uma lista que contém todas as strings únicas usadas na coluna Descrição do _DataFrame_. Criamos um subset do dataframe que satisfaz duas condições: a sigla armazenada em **_split\[i\]_** corresponde à sigla armazenada na coluna "UF" do _DataFrame_, e a string armazenada na variável **_categoria_** corresponde à string armazenada na coluna "Descrição" do _DataFrame_. Realizamos uma contagem das linhas que satisfazem essas condições e a adicionamos à chave correspondente no dicionário secundário.         
 # <br>
 # As etapas seguintes são exatamente as mesmas do que as descritas até agora, porém ajustadas para o caso de não haver múltiplas siglas armazenadas na variável **_uf_**
+# <br>
+# Esse laço, porém, cria uma máscara sobre o _DataFrame_ inteiro para cada par UF/categoria, o que fica lento para bases grandes. A função **_agregacao.contar_por_categoria_** chega ao mesmo resultado numa única passada: cada linha recebe um código para a sua UF e outro para a sua categoria, e todas as contagens saem de uma só chamada a _np.bincount_. Valores como "MG/RJ" são divididos e contados em cada estado, e categorias vazias são contadas como "Não Informado".
+# <br>
+# Para bases grandes, nem vale a pena trazer todas as linhas para o pandas: **_agregacao.contar_por_categoria_sql_** faz a mesma contagem com um _GROUP BY_ dentro do SQLite e devolve apenas a tabela agregada. É o que usamos abaixo; do _DataFrame_ dados exibido acima lemos apenas o primeiro bloco de linhas
 
 # In[20]:
 
 
-ufs = dados["UF"].unique() #recupera as strings únicas presentes na coluna UF do dataframe dados (i.e, as siglas das UFs)
-categorias = dados["Descrição"].unique()
-counts_uf = dict()
-
-for uf in ufs:
-    
-    if uf is None: continue #ignore as linhas sem UF    
-    subset_uf = dados["UF"] == uf
-    count_uf = dados[subset_uf]["UF"].count()       
-    if uf.find("/") != -1: #para os casos em que há várias siglas separadas por "/",  
-        split = re.split("/", uf) # dividimos a string 
-        for i in range(len(split)): 
-            
-            if split[i] in counts_uf: #checamos se cada uma das siglas já possui um dicionário equivalente em count_uf
-                pass
-            else: #adicionamos o dicionário, se não existir
-                counts_uf[split[i]] = dict()
-                
-            counts_uf[split[i]]["Total"] = counts_uf[split[i]].get("Total", 0) + count_uf # adicionamos count_uf à chave "Total" para o dicionário de cada uma das siglas extraídas da string          
-            
-            for categoria in categorias:
-                subset_cat = dados[(dados["Descrição"] == categoria) & (dados["UF"] == uf)] 
-                count_cat = subset_cat["Descrição"].count()
-                counts_uf[split[i]][categoria] = counts_uf[split[i]].get(categoria, 0) + count_cat
-    else:
-        
-        if uf in counts_uf: #análogo aos últimos comentários
-            pass
-        else:
-            counts_uf[uf] = dict()
-            
-        counts_uf[uf]["Total"] = counts_uf.get("Total", 0) + count_uf
-        
-        for categoria in categorias:               
-                subset_cat = dados[(dados["Descrição"] == categoria) & (dados["UF"] == uf)]
-                count_cat = subset_cat["Descrição"].count()
-                if categoria is None: categoria = "Não Informado"
-                counts_uf[uf][categoria] = counts_uf[uf].get(categoria, 0) + count_cat
+counts_uf = agregacao.contar_por_categoria_sql(conn, "UF") #Total e uma coluna por categoria para cada UF, com o GROUP BY feito dentro do SQLite
 
 
 # Vamos usar o método _pandas.DataFrame.from_dict_ para transformar este dicionário em um _DataFrame_ pandas e visualizá-lo com o método _display_ que importamos no começo deste caderno:
@@ -571,8 +389,7 @@ for uf in ufs:
 # In[21]:
 
 
-colunas = counts_uf["MG"].keys()
-totais_uf = pd.DataFrame.from_dict(counts_uf, orient="index", columns = colunas)
+totais_uf = counts_uf #a função já devolve o DataFrame no formato que from_dict produzia a partir do dicionário
 display(totais_uf.sort_values(by = ["Total"], ascending=False))
 
 
@@ -602,61 +419,30 @@ display(idh_uf.sort_values(by = ["Alfabetização"], ascending=False))
 # In[23]:
 
 
-sqlstr = ("""
-SELECT especie.nome AS "Nome", categoria.nome AS "Status", categoria.descricao AS "Descrição", classe.nome AS "Classe", divisao.nome AS "Divisão"  
-FROM risco JOIN especie JOIN categoria JOIN UC JOIN classe JOIN divisao
-WHERE risco.especie_id = especie.id AND risco.categoria_id = categoria.id AND risco.UC_id = UC.id AND  especie.classe_id = classe.id AND especie.divisao_id = divisao.id
-""")
-dados = pd.read_sql_query(sqlstr, conn)
-classes = dados["Classe"].unique()
-categorias = dados["Descrição"].unique()
-counts_classe = dict()
-
-for classe in classes:
-    
-    if classe is None: continue #ignore as linhas sem classe    
-    subset_classe = dados["Classe"] == classe
-    count_classe = dados[subset_classe]["Classe"].count()
-    if classe in counts_classe: pass
-    else:counts_classe[classe] = dict()    
-    counts_classe[classe]["Total"] = counts_classe.get("Total", 0) + count_classe
-    for categoria in categorias:               
-        subset_cat = dados[(dados["Descrição"] == categoria) & (dados["Classe"] == classe)]
-        count_cat = subset_cat["Descrição"].count()
-        if categoria is None: categoria = "Não Informado"
-        counts_classe[classe][categoria] = counts_classe[classe].get(categoria, 0) + count_cat
-        
-colunas = counts_classe["Mammalia"].keys()
-totais_classe = pd.DataFrame.from_dict(counts_classe, orient="index", columns = colunas)
+totais_classe = agregacao.contar_por_categoria_sql(conn, "Classe")
 display(totais_classe)
 
 
 # #### Totais por Divisão
-# Nota: poderiamos ter abstraído este procedimento em uma função. Contudo, como irei utilizá-lo poucas vezes, optei por repetir o código:
+# Nota: o procedimento foi abstraído nas funções do módulo agregacao, usadas em todas as contagens desta seção:
 
 # In[24]:
 
 
-divisoes = dados["Divisão"].unique()
-counts_divisao = dict()
-for divisao in divisoes: 
-    if divisao is None: continue #ignore as linhas sem classe    
-    subset_divisao = dados["Divisão"] == divisao
-    count_divisao = dados[subset_divisao]["Divisão"].count()
-    if divisao in counts_divisao: pass
-    else:counts_divisao[divisao] = dict()    
-    counts_divisao[divisao]["Total"] = counts_divisao.get("Total", 0) + count_divisao
-    for categoria in categorias:               
-        subset_cat = dados[(dados["Descrição"] == categoria) & (dados["Divisão"] == divisao)]
-        count_cat = subset_cat["Descrição"].count()
-        if categoria is None: categoria = "Não Informado"
-        counts_divisao[divisao][categoria] = counts_divisao[divisao].get(categoria, 0) + count_cat
-        
-colunas = counts_divisao["Anfíbios"].keys()
-totais_divisao = pd.DataFrame.from_dict(counts_divisao, orient="index", columns = colunas)
+totais_divisao = agregacao.contar_por_categoria_sql(conn, "Divisão")
 display(totais_divisao)
 
 
+# #### Totais em qualquer nível taxonômico
+# As contagens por Classe e por Divisão passam pela tabela de fechamento da taxonomia (módulo **taxonomia**), que liga cada táxon a todos os seus ancestrais. Com ela, a mesma função conta em qualquer nível (Divisão, Classe, Ordem, Família ou Espécie) e filtra por qualquer ancestral com buscas por índice. Abaixo, as ordens de anfíbios, contando espécies distintas em vez de ocorrências:
+
+# In[ ]:
+
+
+totais_ordem_anfibios = agregacao.contar_por_categoria_sql(conn, "Ordem", especies=True, classe="Amphibia")
+display(totais_ordem_anfibios)
+
+
 # <a name="e4.4"></a>
 # ### 5.4 Número de espécies ameaçadas por tipo de Unidade de Conservação
 # Aqui, também seguimos um processo análogo ao dos demais itens:
@@ -664,32 +450,7 @@ display(totais_divisao)
 # In[25]:
 
 
-sqlstr = ("""
-SELECT especie.nome AS "Nome", categoria.nome AS "Status", categoria.descricao AS "Descrição", UC.nome as "UC", tipo_UC.nome as "Tipo de UC"  
-FROM risco JOIN especie JOIN categoria JOIN UC JOIN tipo_UC
-WHERE risco.especie_id = especie.id AND risco.categoria_id = categoria.id AND risco.UC_id = UC.id AND  UC.tipo_id = tipo_UC.id
-""")
-dados = pd.read_sql_query(sqlstr, conn)
-tipo_ucs = dados["Tipo de UC"].unique()
-categorias = dados["Descrição"].unique()
-counts_tipo_uc = dict()
-
-for tipo in tipo_ucs:
-    
-    if tipo is None: continue #ignore as linhas sem tipo uc    
-    subset_tipo = dados["Tipo de UC"] == tipo
-    count_tipo = dados[subset_tipo]["Tipo de UC"].count()
-    if tipo in counts_tipo_uc: pass
-    else:counts_tipo_uc[tipo] = dict()    
-    counts_tipo_uc[tipo]["Total"] = counts_tipo_uc.get("Total", 0) + count_tipo
-    for categoria in categorias:               
-        subset_cat = dados[(dados["Descrição"] == categoria) & (dados["Tipo de UC"] == tipo)]
-        count_cat = subset_cat["Descrição"].count()
-        if categoria is None: categoria = "Não Informado"
-        counts_tipo_uc[tipo][categoria] = counts_tipo_uc[tipo].get(categoria, 0) + count_cat
-        
-colunas = counts_tipo_uc["Parque Estadual"].keys()
-totais_tipo_uc = pd.DataFrame.from_dict(counts_tipo_uc, orient="index", columns = colunas)
+totais_tipo_uc = agregacao.contar_por_categoria_sql(conn, "Tipo de UC")
 display(totais_tipo_uc)
 
 
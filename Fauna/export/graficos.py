@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Gráficos da seção 6 do caderno, a partir das tabelas de totais da seção 5.
+# Cada função recebe o dicionário de tabelas (totais_uf, idh_uf, totais_divisao, totais_tipo_uc) e devolve a figura,
+# sem exibi-la: quem chama decide se mostra (caderno) ou grava em arquivo (pipeline.py).
+# matplotlib só é importado dentro das funções, para que quem só precisa de GRAFICOS (nomes e tabelas de cada
+# gráfico) não pague o custo da importação nem fixe o backend antes da hora.
+
+
+def uf_total(tabelas):
+    ax = tabelas["totais_uf"]["Total"].plot(kind="bar", title="Total de Espécies Ameaçadas por UF", figsize=(16, 10))
+    return ax.figure
+
+
+def uf_risco(tabelas):
+    totais_stack = tabelas["totais_uf"].drop(["Total"], axis=1)
+    ax = totais_stack.plot.bar(title="Espécies Ameaçadas por UF e Risco", stacked=True, figsize=(16, 10))
+    return ax.figure
+
+
+def dispersao_idh(tabelas):
+    import matplotlib.pyplot as plt
+    idh_uf = tabelas["idh_uf"]
+    fig, axes = plt.subplots(nrows=1, ncols=2, figsize=(16, 6)) #grade 1x2 para organizar os gráficos
+    idh_uf.plot.scatter(ax=axes[0], x="idh", y="Total", title="Dispersão entre IDH e número de casos de risco")
+    idh_uf.plot.scatter(ax=axes[1], x="Alfabetização", y="Total", title="Dispersão entre alfabetização e número de casos de risco")
+    return fig
+
+
+def regressao_idh(tabelas):
+    import matplotlib.pyplot as plt
+    import seaborn as sb
+    fig, axes = plt.subplots(nrows=1, ncols=1, figsize=(7.2, 6))
+    sb.regplot(ax=axes, x="idh", y="Total", ci=None, data=tabelas["idh_uf"])
+    return fig
+
+
+def divisao_distribuicao(tabelas):
+    ax = tabelas["totais_divisao"].plot.pie(y="Total", figsize=(14, 14), legend=False, autopct="%1.1f%%", title="Distribuição de Espécies Ameaçadas por Divisão")
+    ax.axis("off")
+    return ax.figure
+
+
+def divisao_risco(tabelas):
+    divisao_stack = tabelas["totais_divisao"].drop(["Total"], axis=1)
+    ax = divisao_stack.plot.bar(title="Número de Espécies Ameaçadas por Divisão e Risco", stacked=True, figsize=(16, 8))
+    return ax.figure
+
+
+def tipo_uc_distribuicao(tabelas):
+    ax = tabelas["totais_tipo_uc"].plot.pie(y="Total", figsize=(14, 14), legend=False, autopct="%1.1f%%", title="Distribuição de Espécies Ameaçadas por tipo de UC")
+    ax.axis("off")
+    return ax.figure
+
+
+def tipo_uc_risco(tabelas):
+    uc_stack = tabelas["totais_tipo_uc"].drop(["Total"], axis=1)
+    ax = uc_stack.plot.bar(title="Espécies Ameaçadas por tipo de UC e Risco", stacked=True, figsize=(16, 10))
+    return ax.figure
+
+
+GRAFICOS = { #nome do arquivo -> (função que desenha o gráfico, tabelas que ela usa), na ordem da seção 6
+    "uf_total": (uf_total, ("totais_uf",)),
+    "uf_risco": (uf_risco, ("totais_uf",)),
+    "dispersao_idh": (dispersao_idh, ("idh_uf",)),
+    "regressao_idh": (regressao_idh, ("idh_uf",)),
+    "divisao_distribuicao": (divisao_distribuicao, ("totais_divisao",)),
+    "divisao_risco": (divisao_risco, ("totais_divisao",)),
+    "tipo_uc_distribuicao": (tipo_uc_distribuicao, ("totais_tipo_uc",)),
+    "tipo_uc_risco": (tipo_uc_risco, ("totais_tipo_uc",)),
+}
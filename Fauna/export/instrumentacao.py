@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Instrumentação das etapas de pipeline.py: tempo, pico de memória e linhas processadas por etapa, e contagem e
+# tempo de cada comando SQL enviado pela conexão, agrupados pela forma do comando (literais trocados por "?").
+# Só é usada quando pedida (pipeline.py --perfil): sem ela, o pipeline abre uma conexão sqlite3 comum e nada
+# disto é executado.
+
+import os
+import re
+import json
+import time
+import platform
+from contextlib import contextmanager
+import sqlite3 as db
+
+LITERAIS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b") #textos entre aspas simples e números
+LISTAS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)") #(?, ?, ?) com qualquer número de itens
+ESPACOS = re.compile(r"\s+")
+
+
+def forma(sqlstr): #comando SQL sem literais nem espaços repetidos, para agrupar comandos iguais com valores diferentes
+    texto = ESPACOS.sub(" ", LITERAIS.sub("?", sqlstr)).strip()
+    return LISTAS.sub("(?, ...)", texto)
+
+
+class CursorInstrumentado(db.Cursor): #registra na conexão o tempo de cada execute e as linhas devolvidas pelos fetch
+    def execute(self, sqlstr, params=()):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sqlstr, params)
+        finally:
+            self._forma = self.connection.registrar(sqlstr, time.perf_counter() - inicio, 1)
+
+    def executemany(self, sqlstr, params):
+        contagem = [0]
+        def contar(params): #conta os conjuntos de parâmetros sem transformar o iterador numa lista
+            for item in params:
+                contagem[0] += 1
+                yield item
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sqlstr, contar(params))
+        finally:
+            self._forma = self.connection.registrar(sqlstr, time.perf_counter() - inicio, contagem[0])
+
+    def executescript(self, script):
+        inicio = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            self._forma = self.connection.registrar(script, time.perf_counter() - inicio, 1)
+
+    def buscar(self, metodo, *args):
+        inicio = time.perf_counter()
+        linhas = metodo(*args)
+        self.connection.registrar_leitura(getattr(self, "_forma", None), time.perf_counter() - inicio, len(linhas))
+        return linhas
+
+    def fetchall(self):
+        return self.buscar(super().fetchall)
+
+    def fetchmany(self, size=None):
+        return self.buscar(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        linha = super().fetchone()
+        self.connection.registrar_leitura(getattr(self, "_forma", None), time.perf_counter() - inicio, linha is not None)
+        return linha
+
+
+class ConexaoInstrumentada(db.Connection): #conexão cujos cursores (inclusive os de execute e de pandas.read_sql_query) são instrumentados
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.comandos = dict() #forma -> {"chamadas", "execucoes", "segundos", "linhas_lidas"}
+        self.linhas_lidas = 0
+
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    # Os atalhos da conexão chamam o execute do cursor em C, sem passar pelo CursorInstrumentado: são refeitos aqui.
+    def execute(self, sqlstr, params=()):
+        return self.cursor().execute(sqlstr, params)
+
+    def executemany(self, sqlstr, params):
+        return self.cursor().executemany(sqlstr, params)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def registrar(self, sqlstr, segundos, execucoes):
+        chave = forma(sqlstr)
+        comando = self.comandos.setdefault(chave, {"chamadas": 0, "execucoes": 0, "segundos": 0.0, "linhas_lidas": 0})
+        comando["chamadas"] += 1
+        comando["execucoes"] += execucoes
+        comando["segundos"] += segundos
+        return chave
+
+    def registrar_leitura(self, chave, segundos, linhas):
+        self.linhas_lidas += linhas
+        if chave in self.comandos:
+            self.comandos[chave]["segundos"] += segundos
+            self.comandos[chave]["linhas_lidas"] += linhas
+
+
+def conectar(caminho): #conexão sqlite3 instrumentada
+    return db.connect(caminho, factory=ConexaoInstrumentada)
+
+
+def zerar_pico(): #no Linux, zera o pico de memória residente do processo (VmHWM), para medir cada etapa separadamente
+    try:
+        with open("/proc/self/clear_refs", "w") as arquivo:
+            arquivo.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def pico_memoria(): #pico de memória residente do processo, em MB; None onde não há como medir (Windows)
+    try:
+        with open("/proc/self/status") as arquivo:
+            for linha in arquivo:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource #só existe em sistemas Unix
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss #kB no Linux, bytes no macOS
+    return pico / (1 << 20) if platform.system() == "Darwin" else pico / 1024
+
+
+class Perfil: #acumula as medições das etapas de uma execução do pipeline
+    def __init__(self, conn):
+        self.conn = conn
+        self.etapas = list()
+
+    @contextmanager
+    def etapa(self, nome): #mede o bloco como uma etapa; o dicionário devolvido recebe campos extras (ex.: "estado", "fases")
+        registro = {"etapa": nome}
+        zerado = zerar_pico()
+        comandos_antes = {chave: dict(valores) for chave, valores in self.conn.comandos.items()}
+        lidas, escritas = self.conn.linhas_lidas, self.conn.total_changes
+        inicio = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            registro["segundos"] = time.perf_counter() - inicio
+            pico = pico_memoria()
+            registro["pico_memoria_mb"] = None if pico is None else round(pico, 1)
+            registro["pico_desde_o_inicio"] = not zerado #sem /proc/self/clear_refs, o pico é o do processo inteiro
+            registro["linhas_lidas"] = self.conn.linhas_lidas - lidas
+            registro["linhas_escritas"] = self.conn.total_changes - escritas
+            registro["comandos_sql"] = sum(valores["chamadas"] for valores in self.conn.comandos.values()) - sum(valores["chamadas"] for valores in comandos_antes.values())
+            registro["segundos_sql"] = sum(valores["segundos"] for valores in self.conn.comandos.values()) - sum(valores["segundos"] for valores in comandos_antes.values())
+            self.etapas.append(registro)
+
+    def relatorio(self):
+        comandos = [dict(forma=chave, **valores) for chave, valores in self.conn.comandos.items()]
+        comandos.sort(key=lambda comando: comando["segundos"], reverse=True)
+        return {"ambiente": {"python": platform.python_version(), "sqlite": db.sqlite_version, "plataforma": platform.platform(),
+                             "data": time.strftime("%Y-%m-%dT%H:%M:%S")},
+                "etapas": self.etapas, "sql": comandos}
+
+    def gravar(self, caminho):
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            json.dump(self.relatorio(), arquivo, indent=1, ensure_ascii=False)
+
+    def resumo(self, comandos=10): #texto curto: uma linha por etapa e os comandos SQL mais demorados
+        linhas = ["%-12s %8s %10s %12s %12s %8s %8s" % ("etapa", "s", "pico MB", "lidas", "escritas", "SQL", "SQL s")]
+        for r in self.etapas:
+            pico = "-" if r["pico_memoria_mb"] is None else "%.1f" % r["pico_memoria_mb"]
+            linhas.append("%-12s %8.2f %10s %12d %12d %8d %8.2f" % (r["etapa"], r["segundos"], pico, r["linhas_lidas"],
+                                                                     r["linhas_escritas"], r["comandos_sql"], r["segundos_sql"]))
+        linhas.append("Comandos SQL mais demorados:")
+        for comando in self.relatorio()["sql"][:comandos]:
+            linhas.append("%8.3f s %6dx %s" % (comando["segundos"], comando["execucoes"], comando["forma"][:100]))
+        return "\n".join(linhas)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Conferência das hierarquias da fonte durante a carga. Cada espécie deveria ter uma única divisão, classe, ordem e
+# família; cada família, uma única ordem; cada ordem, uma única classe; e cada UC, um único valor de UF. A carga
+# (carga.povoar_em_massa, como o laço da célula 5 do caderno) grava o valor da última linha, sem avisar. Aqui, cada
+# lote já convertido em chaves vira um único vetor de pares (relação, filho, pai) para todas as relações, e um só
+# pd.factorize conta as linhas e acha a última ocorrência de cada par. Ao final da carga, os pares de todos os lotes são
+# somados e os filhos com mais de um pai formam o relatório, gravado na tabela "conflito".
+# Na carga incremental, só as linhas novas são conferidas, entre si e contra os valores já gravados na base; estes
+# aparecem no relatório com 0 linhas (uma espécie que mudou de família aparece com a família antiga e a nova).
+#   python integridade.py --db fauna_db.sqlite --saida conflitos.csv
+
+import sys
+import argparse
+import sqlite3 as db
+import numpy as np
+import pandas as pd
+
+import esquema
+
+RELACOES = [ #(filho, pai): o id do pai fica numa coluna do filho e é sobrescrito pela última linha da fonte
+    ("especie", "divisao"),
+    ("especie", "classe"),
+    ("especie", "ordem"),
+    ("especie", "familia"),
+    ("familia", "ordem"),
+    ("ordem", "classe"),
+    ("UC", "UF"),
+]
+BITS = 28 #bits de cada chave no código do par; (relação, filho, pai) cabe num int64 com até 2**28 valores por tabela
+
+DDL = """
+DROP TABLE IF EXISTS conflito;
+CREATE TABLE conflito (
+    relacao TEXT NOT NULL,
+    filho_id    INTEGER NOT NULL,
+    pai_id  INTEGER NOT NULL,
+    linhas  INTEGER NOT NULL,
+    gravado INTEGER NOT NULL,
+    PRIMARY KEY (relacao, filho_id, pai_id)
+) WITHOUT ROWID;
+"""
+
+
+def pares_do_lote(codigos, inicio=0): #DataFrame (par, linhas, ultima) com os pares distintos de todas as relações num lote
+    # "codigos" são as colunas de carga.criar_chaves (na ordem de esquema.TITULOS) e "inicio" é a posição da primeira
+    # linha do lote na fonte, para que "ultima" (posição da última linha com o par) valha entre lotes.
+    colunas = codigos.to_numpy(dtype=np.int64)
+    n = len(colunas)
+    pares = np.concatenate([(np.int64(r) << (2 * BITS)) | (colunas[:, esquema.TITULOS.index(filho)] << BITS) | colunas[:, esquema.TITULOS.index(pai)]
+                            for r, (filho, pai) in enumerate(RELACOES)])
+    # De trás para a frente, a primeira ocorrência de cada par é a sua última linha. pd.factorize (por hash, sem
+    # ordenar) numera os pares na ordem em que aparecem, então a primeira ocorrência do par k é onde o maior número
+    # visto até ali passa a ser k.
+    codigos_pares, unicos = pd.factorize(pares[::-1])
+    linhas = np.bincount(codigos_pares, minlength=len(unicos))
+    maior = np.maximum.accumulate(codigos_pares)
+    primeiro = np.flatnonzero(np.r_[True, maior[1:] > maior[:-1]])
+    ultima = inicio + (len(pares) - 1 - primeiro) % max(n, 1)
+    return pd.DataFrame({"par": unicos, "linhas": linhas, "ultima": ultima})
+
+
+def pares_da_base(conn): #pares já gravados na base (carga incremental), com 0 linhas e antes de todas as linhas novas
+    partes = list()
+    for r, (filho, pai) in enumerate(RELACOES):
+        ids = np.array(conn.execute("SELECT id, " + pai + "_id FROM " + filho + " WHERE " + pai + "_id IS NOT NULL").fetchall(), dtype=np.int64).reshape(-1, 2)
+        partes.append(pd.DataFrame({"par": (np.int64(r) << (2 * BITS)) | (ids[:, 0] << BITS) | ids[:, 1], "linhas": 0, "ultima": -1}))
+    return pd.concat(partes, ignore_index=True)
+
+
+def conflitos(partes): #filhos com mais de um pai, somando os pares de todos os lotes; o pai da última linha é o gravado
+    partes = list(partes) or [pd.DataFrame({"par": np.empty(0, dtype=np.int64), "linhas": 0, "ultima": 0})]
+    pares = pd.concat(partes, ignore_index=True).groupby("par", sort=False).agg(linhas=("linhas", "sum"), ultima=("ultima", "max")).reset_index()
+    codigo = pares["par"].to_numpy()
+    mascara = (np.int64(1) << BITS) - 1
+    pares["relacao"] = codigo >> (2 * BITS)
+    pares["filho_id"] = (codigo >> BITS) & mascara
+    pares["pai_id"] = codigo & mascara
+    grupo = pares.groupby(["relacao", "filho_id"])["pai_id"]
+    pares = pares[grupo.transform("size") > 1].copy()
+    pares["gravado"] = (pares["ultima"] == pares.groupby(["relacao", "filho_id"])["ultima"].transform("max")).astype("int64")
+    pares["relacao"] = pares["relacao"].map({r: filho + "." + pai for r, (filho, pai) in enumerate(RELACOES)})
+    return pares[["relacao", "filho_id", "pai_id", "linhas", "gravado"]].sort_values(["relacao", "filho_id", "pai_id"]).reset_index(drop=True)
+
+
+def gravar(conn, tabela): #grava os conflitos (saída de "conflitos") na tabela "conflito" e mostra um resumo
+    with conn:
+        conn.executescript(DDL)
+        conn.executemany("INSERT INTO conflito VALUES (?, ?, ?, ?, ?)", tabela.itertuples(index=False, name=None))
+    filhos = tabela.drop_duplicates(["relacao", "filho_id"])["relacao"].value_counts()
+    if filhos.empty:
+        print("Nenhum conflito nas hierarquias da fonte")
+    else:
+        print("Conflitos nas hierarquias da fonte (vale a última linha; veja integridade.py):",
+              ", ".join("%s %d" % (relacao, n) for relacao, n in filhos.sort_index().items()))
+    return int(filhos.sum())
+
+
+def relatorio(conn): #conflitos gravados, com os nomes no lugar dos ids
+    partes = list()
+    for filho, pai in RELACOES:
+        partes.append(pd.read_sql_query("SELECT conflito.relacao AS \"Relação\", f.nome AS \"Filho\", p.nome AS \"Valor\", conflito.linhas AS \"Linhas\", "
+                                        "conflito.gravado AS \"Gravado\" FROM conflito JOIN " + filho + " AS f ON conflito.filho_id = f.id "
+                                        "JOIN " + pai + " AS p ON conflito.pai_id = p.id WHERE conflito.relacao = ? ORDER BY f.nome, conflito.linhas DESC",
+                                        conn, params=(filho + "." + pai,)))
+    return pd.concat(partes, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mostra os filhos com mais de um pai (espécie em duas famílias, UC em duas UFs...) encontrados na última carga")
+    parser.add_argument("--db", default="fauna_db.sqlite", help="arquivo da base SQLite")
+    parser.add_argument("--saida", help="grava o relatório neste arquivo CSV")
+    args = parser.parse_args()
+
+    try:
+        import consultar
+        conn = consultar.conectar(args.db)
+        tabela = relatorio(conn)
+    except db.Error as erro:
+        sys.exit("Erro ao ler " + args.db + ": " + str(erro))
+    print(tabela.to_string(index=False) if len(tabela) else "Nenhum conflito registrado")
+    if args.saida:
+        tabela.to_csv(args.saida, index=False)
+        print("Relatório gravado em", args.saida)
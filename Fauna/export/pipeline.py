@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Versão não interativa do caderno fauna.py, para rodar como tarefa agendada: sem input(), sem as extensões do
+# Jupyter (get_ipython) e sem display() de DataFrames inteiros. O trabalho é dividido em etapas, na ordem do caderno:
+#   ingerir      seção 2: lê a planilha e (re)cria a base (carga.py)
+#   normalizar   seção 4.2: descrições das categorias de risco e conferência das chaves estrangeiras
+#   enriquecer   seção 4.1: nome por extenso, IDH e alfabetização de cada UF (referencia.py)
+#   classificar  seção 4.2: tabela tipo_UC e UC.tipo_id (unidades.py), seguidos dos índices das consultas
+#   agregar      seção 5: tabelas de totais, gravadas como CSV na pasta de saída
+#   renderizar   seção 6: gráficos gerados a partir dos CSV, gravados como PNG em <saída>/gráficos
+#   exportar     dimensões e fato já com as junções, em Parquet ou Arrow, em <saída>/colunar (exportacao.py);
+#                só roda quando pedida pelo nome, pois depende do pyarrow
+# Cada etapa lê da base ou da pasta de saída o que as anteriores produziram, então pode ser rodada sozinha:
+#   python pipeline.py                           todas as etapas
+#   python pipeline.py agregar renderizar        só as etapas indicadas
+#   python pipeline.py --src fauna.csv --db base.sqlite --saida resultados
+#   python pipeline.py --fusoes fusoes.csv       ingerir troca as grafias variantes de UCs e espécies (deduplicacao.py)
+# Cada etapa tem uma impressão (sha256) das suas entradas: o código que ela usa, a versão do esquema, a planilha, o
+# mapa de fusões e o tipo de carga, completa ou incremental (ingerir), ou os indicadores (enriquecer) e a impressão
+# da etapa anterior. Se a base ou a pasta de saída já estão no estado dessa impressão, a etapa é pulada; se o
+# resultado está no cache (cache_etapas.py), ele é restaurado.
+# pandas, numpy, openpyxl e matplotlib só são importados pelas etapas que os usam: "--help" e execuções em que
+# todas as etapas são puladas não pagam por eles. Para consultas avulsas à base, veja consultar.py.
+
+import os
+import json
+import time
+import shutil
+import inspect
+import argparse
+import sqlite3 as db
+
+import esquema
+import cache_etapas
+
+PASTA_GRAFICOS = "gráficos"
+PASTA_COLUNAR = "colunar"
+
+
+def ingerir(conn, args):
+    import carga
+    lote = args.lote or carga.TAMANHO_LOTE
+    fusoes = ler_fusoes(args)
+    if args.incremental:
+        carga.carregar_incremental(conn, args.src, lote, fusoes)
+    else:
+        total = carga.carregar_em_lotes(conn, args.src, lote, tempos=getattr(args, "fases", None), fusoes=fusoes)
+        print("Tabelas populadas:", total, "linhas")
+
+
+def ler_fusoes(args): #mapa de fusões de --fusoes, ou None
+    if not getattr(args, "fusoes", None):
+        return None
+    import deduplicacao
+    return deduplicacao.ler_mapa(args.fusoes)
+
+
+def normalizar(conn, args):
+    esquema.descrever_categorias(conn)
+    print(len(esquema.verificar_chaves(conn)), "chave(s) estrangeira(s) sem correspondência")
+
+
+def enriquecer(conn, args):
+    import referencia
+    referencia.mesclar_em_uf(conn, referencia.carregar_indicadores(args.fonte))
+
+
+def classificar(conn, args):
+    import unidades
+    unidades.criar_tipos_uc(conn)
+    sem_tipo = unidades.classificar_tipos_uc(conn)
+    print(len(sem_tipo), "UC(s) sem sigla reconhecida")
+    esquema.criar_indices(conn) #o índice de UC.tipo_id só pode ser criado depois desta etapa
+
+
+def totais(conn): #tabelas da seção 5, na ordem em que aparecem no caderno
+    import pandas as pd
+    import agregacao
+    totais_uf = agregacao.contar_por_categoria_sql(conn, "UF")
+    dados = pd.read_sql_query("""SELECT UF.nome AS "UF", UF.idh, UF.alfabetizacao AS "Alfabetização" FROM UF
+                                 WHERE UF.idh IS NOT NULL AND UF.alfabetizacao IS NOT NULL""", conn).set_index("UF")
+    return {
+        "totais_uf": totais_uf,
+        "idh_uf": pd.concat([totais_uf["Total"], dados], axis=1),
+        "totais_classe": agregacao.contar_por_categoria_sql(conn, "Classe"),
+        "totais_divisao": agregacao.contar_por_categoria_sql(conn, "Divisão"),
+        "totais_tipo_uc": agregacao.contar_por_categoria_sql(conn, "Tipo de UC"),
+    }
+
+
+def agregar(conn, args): #retorna os arquivos gravados, como renderizar
+    os.makedirs(args.saida, exist_ok=True)
+    arquivos = list()
+    for nome, tabela in totais(conn).items():
+        arquivos.append(os.path.join(args.saida, nome + ".csv"))
+        tabela.to_csv(arquivos[-1])
+        print("Tabela", nome, "gravada:", len(tabela), "linhas")
+    return arquivos
+
+
+TOTAIS = ("totais_uf", "idh_uf", "totais_classe", "totais_divisao", "totais_tipo_uc") #tabelas gravadas pela etapa agregar
+MANIFESTO_GRAFICOS = "graficos.json" #impressão de cada gráfico gravado, em <saída>/gráficos
+
+
+def ler_totais(saida, nomes=TOTAIS): #tabelas gravadas pela etapa agregar
+    import pandas as pd
+    return {nome: pd.read_csv(os.path.join(saida, nome + ".csv"), index_col=0) for nome in nomes}
+
+
+def desenhar(nome, saida, pasta): #desenha e grava um gráfico; roda nos processos de renderizar, com o backend sem janela
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import graficos
+
+    funcao, tabelas = graficos.GRAFICOS[nome]
+    figura = funcao(ler_totais(saida, tabelas))
+    caminho = os.path.join(pasta, nome + ".png")
+    figura.savefig(caminho + ".tmp.png", bbox_inches="tight")
+    plt.close(figura)
+    os.replace(caminho + ".tmp.png", caminho) #um gráfico interrompido no meio nunca substitui o anterior
+    return caminho
+
+
+def impressao_grafico(nome, saida): #código do gráfico e conteúdo das tabelas que ele usa
+    import graficos
+    funcao, tabelas = graficos.GRAFICOS[nome]
+    conteudos = [open(os.path.join(saida, tabela + ".csv"), "rb").read() for tabela in tabelas]
+    return cache_etapas.impressao(nome, inspect.getsource(funcao), inspect.getsource(desenhar), *conteudos)
+
+
+def renderizar(conn, args):
+    # Cada gráfico só é redesenhado se o seu código ou as tabelas que ele usa mudaram desde a última vez
+    # (MANIFESTO_GRAFICOS); os que faltam são desenhados em paralelo, um por processo (--processos).
+    from concurrent.futures import ProcessPoolExecutor
+    import graficos
+
+    pasta = os.path.join(args.saida, PASTA_GRAFICOS)
+    os.makedirs(pasta, exist_ok=True)
+    try:
+        with open(os.path.join(pasta, MANIFESTO_GRAFICOS), encoding="utf-8") as arquivo:
+            manifesto = json.load(arquivo)
+    except (OSError, ValueError):
+        manifesto = dict()
+    impressoes = {nome: impressao_grafico(nome, args.saida) for nome in graficos.GRAFICOS}
+    pendentes = [nome for nome, marca in impressoes.items()
+                 if manifesto.get(nome) != marca or not os.path.exists(os.path.join(pasta, nome + ".png"))]
+
+    processos = min(len(pendentes), getattr(args, "processos", None) or os.cpu_count() or 1)
+    if processos > 1:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            list(executor.map(desenhar, pendentes, [args.saida] * len(pendentes), [pasta] * len(pendentes)))
+    else:
+        for nome in pendentes:
+            desenhar(nome, args.saida, pasta)
+
+    with open(os.path.join(pasta, MANIFESTO_GRAFICOS), "w", encoding="utf-8") as arquivo:
+        json.dump(impressoes, arquivo, indent=1)
+    print(len(pendentes), "gráfico(s) desenhado(s) em", pasta, "com", processos, "processo(s);", len(impressoes) - len(pendentes), "inalterado(s)")
+    return [os.path.join(pasta, nome + ".png") for nome in graficos.GRAFICOS] + [os.path.join(pasta, MANIFESTO_GRAFICOS)]
+
+
+def exportar(conn, args):
+    import exportacao
+    return exportacao.exportar(conn, os.path.join(args.saida, PASTA_COLUNAR), getattr(args, "formato", None) or "parquet", args.lote or exportacao.TAMANHO_BLOCO)
+
+
+ETAPAS = {
+    "ingerir": ingerir,
+    "normalizar": normalizar,
+    "enriquecer": enriquecer,
+    "classificar": classificar,
+    "agregar": agregar,
+    "renderizar": renderizar,
+    "exportar": exportar,
+}
+ETAPAS_OPCIONAIS = ("exportar",) #fora da lista padrão: só rodam quando pedidas pelo nome
+
+
+ETAPAS_DA_BASE = ("ingerir", "normalizar", "enriquecer", "classificar") #as demais produzem arquivos na pasta de saída
+MODULOS = { #módulos cujo código entra na impressão de cada etapa
+    "ingerir": ("carga", "esquema", "unidades", "busca", "taxonomia", "edicoes", "integridade", "deduplicacao", "compacto"),
+    "normalizar": ("esquema",),
+    "enriquecer": ("referencia", "busca"),
+    "classificar": ("unidades", "esquema"),
+    "agregar": ("agregacao", "consultas", "taxonomia"),
+    "renderizar": ("graficos",),
+    "exportar": ("exportacao", "compacto", "agregacao"),
+}
+ANTERIORES = {"exportar": "classificar"} #etapa cuja impressão entra na desta, quando não é a imediatamente anterior em ETAPAS
+PASTAS_DE_SAIDA = {"agregar": "", "renderizar": PASTA_GRAFICOS, "exportar": PASTA_COLUNAR} #subpasta de --saida onde cada etapa grava seus arquivos
+SUBSTITUIR_PASTA = ("exportar",) #etapas cuja subpasta é apagada antes de restaurada do cache, para não sobrarem partições antigas
+ESTADO = "etapas.json" #impressões e arquivos das etapas que gravam na pasta de saída
+
+
+def ler_meta(conn):
+    try:
+        return dict(conn.execute("SELECT chave, valor FROM carga_meta"))
+    except db.OperationalError: #base vazia ou anterior à tabela carga_meta
+        return dict()
+
+
+def ler_estado(saida):
+    try:
+        with open(os.path.join(saida, ESTADO), encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return dict()
+
+
+def gravar_estado(saida, nome, marca, arquivos): #os arquivos são guardados relativos à subpasta da etapa (ex.: fato/UF=MG/parte-0.parquet)
+    estado = ler_estado(saida)
+    pasta = os.path.join(saida, PASTAS_DE_SAIDA[nome])
+    estado[nome] = {"impressao": marca, "arquivos": [os.path.relpath(arquivo, pasta) for arquivo in arquivos]}
+    with open(os.path.join(saida, ESTADO), "w", encoding="utf-8") as arquivo:
+        json.dump(estado, arquivo, indent=1)
+
+
+def marca_atual(conn, nome, args): #impressão do estado em que a base ou a pasta de saída está para a etapa (None se desconhecida)
+    if nome in ETAPAS_DA_BASE:
+        return ler_meta(conn).get("etapa_" + nome)
+    registro = ler_estado(args.saida).get(nome)
+    pasta = os.path.join(args.saida, PASTAS_DE_SAIDA[nome])
+    if registro and all(os.path.exists(os.path.join(pasta, arquivo)) for arquivo in registro["arquivos"]):
+        return registro["impressao"]
+    return None #etapa nunca rodada nesta pasta, ou algum arquivo foi apagado
+
+
+def impressao_etapa(conn, nome, args): #None quando a etapa anterior não tem impressão conhecida (base feita fora do pipeline)
+    nomes = list(ETAPAS)
+    anterior = marca_atual(conn, ANTERIORES.get(nome, nomes[nomes.index(nome) - 1]), args) if nome != nomes[0] else ""
+    if anterior is None:
+        return None
+    extras = list()
+    if nome == "ingerir":
+        import carga
+        extras.append(carga.impressao_fonte(args.src, ler_meta(conn))["fonte_sha256"])
+        extras.append(carga.impressao_fusoes(ler_fusoes(args)))
+        extras.append("incremental" if args.incremental else "completa") #as duas cargas deixam históricos diferentes em edicao e risco_delta
+    elif nome == "enriquecer":
+        import referencia
+        extras.append(referencia.carregar_indicadores(args.fonte).to_csv(index=False))
+    elif nome == "agregar":
+        extras.append(inspect.getsource(totais))
+    elif nome == "renderizar":
+        extras.append(inspect.getsource(desenhar))
+    elif nome == "exportar":
+        extras.append(getattr(args, "formato", None) or "parquet")
+    return cache_etapas.impressao(nome, esquema.VERSAO_ESQUEMA, cache_etapas.impressao_codigo(*MODULOS[nome]),
+                                  inspect.getsource(ETAPAS[nome]), *extras, anterior)
+
+
+def executar_etapa(conn, nome, args): #roda uma etapa ou reaproveita seu resultado; retorna "executada", "pulada" ou "restaurada"
+    marca = None if args.sem_cache else impressao_etapa(conn, nome, args)
+    if marca is None:
+        ETAPAS[nome](conn, args)
+        return "executada"
+    if marca_atual(conn, nome, args) == marca:
+        return "pulada"
+    maximo = int(args.cache_max_mb * 1e6)
+    entrada = cache_etapas.buscar(args.cache, marca)
+    if nome in ETAPAS_DA_BASE:
+        if entrada:
+            cache_etapas.restaurar_base(entrada, conn)
+            return "restaurada"
+        ETAPAS[nome](conn, args)
+        with conn: #faz parte da cópia guardada, que já sai com a impressão
+            conn.execute("INSERT OR REPLACE INTO carga_meta (chave, valor) VALUES (?, ?)", ("etapa_" + nome, marca))
+        cache_etapas.guardar_base(args.cache, marca, conn, maximo)
+        return "executada"
+    pasta = os.path.join(args.saida, PASTAS_DE_SAIDA[nome])
+    if entrada:
+        if nome in SUBSTITUIR_PASTA:
+            shutil.rmtree(pasta, ignore_errors=True)
+        arquivos = cache_etapas.restaurar_arquivos(entrada, pasta)
+        estado = "restaurada"
+    else:
+        arquivos = ETAPAS[nome](conn, args)
+        cache_etapas.guardar_arquivos(args.cache, marca, arquivos, maximo, pasta)
+        estado = "executada"
+    gravar_estado(args.saida, nome, marca, arquivos)
+    return estado
+
+
+def executar(etapas, args): #roda as etapas indicadas, sempre na ordem de ETAPAS, e retorna o tempo (s) de cada uma
+    # Com args.perfil, a conexão é instrumentada e o relatório JSON (etapas e comandos SQL) é gravado nesse caminho.
+    tempos = dict()
+    perfil = None
+    if getattr(args, "perfil", None):
+        import instrumentacao
+        conn = instrumentacao.conectar(args.db)
+        perfil = instrumentacao.Perfil(conn)
+    else:
+        conn = db.connect(args.db)
+    try:
+        for nome in [etapa for etapa in ETAPAS if etapa in etapas]:
+            print("== Etapa", nome)
+            inicio = time.perf_counter()
+            if perfil is None:
+                estado = executar_etapa(conn, nome, args)
+            else:
+                with perfil.etapa(nome) as registro:
+                    args.fases = dict() #fases da etapa ingerir (leitura, chaves, povoamento, indices)
+                    estado = registro["estado"] = executar_etapa(conn, nome, args)
+                    if args.fases:
+                        registro["fases"] = args.fases
+            tempos[nome] = time.perf_counter() - inicio
+            print("== Etapa %s %s em %.2f s" % (nome, estado, tempos[nome]))
+    finally:
+        if perfil is not None:
+            perfil.gravar(args.perfil)
+            print(perfil.resumo())
+            print("Relatório de perfil gravado em", args.perfil)
+        conn.close()
+    return tempos
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Roda as etapas do caderno de fauna ameaçada sem interação")
+    parser.add_argument("etapas", nargs="*", metavar="etapa", help="etapas a rodar, entre: " + ", ".join(ETAPAS) + " (padrão: todas menos " + ", ".join(ETAPAS_OPCIONAIS) + ")")
+    parser.add_argument("--src", default="fauna_fed.xlsx", help="planilha de origem (.xlsx, .csv, .tsv, ou .txt separado por tabulação ou vírgula)")
+    parser.add_argument("--db", default="fauna_db.sqlite", help="arquivo da base SQLite")
+    parser.add_argument("--saida", default="saida", help="pasta onde as tabelas de totais, os gráficos e a exportação colunar são gravados")
+    parser.add_argument("--lote", type=int, help="número de linhas lidas e gravadas por vez (padrão: carga.TAMANHO_LOTE)")
+    parser.add_argument("--incremental", action="store_true", help="na etapa ingerir, aplica apenas o que mudou desde a última carga")
+    parser.add_argument("--fusoes", metavar="CSV", help="na etapa ingerir, mapa de grafias de UCs e espécies gerado por deduplicacao.py")
+    parser.add_argument("--fonte", default="instantaneo", help="fonte dos indicadores das UFs, entre as de referencia.FONTES")
+    parser.add_argument("--cache", default=cache_etapas.CACHE_DIR, help="pasta do cache de resultados das etapas")
+    parser.add_argument("--cache-max-mb", type=float, default=cache_etapas.TAMANHO_MAXIMO / 1e6, help="tamanho máximo do cache, em MB")
+    parser.add_argument("--sem-cache", action="store_true", help="roda todas as etapas indicadas, sem consultar nem gravar o cache")
+    parser.add_argument("--formato", choices=["parquet", "arrow"], default="parquet", help="formato dos arquivos da etapa exportar (arrow pode ser mapeado em memória)")
+    parser.add_argument("--processos", type=int, help="processos usados para desenhar os gráficos (padrão: um por CPU)")
+    parser.add_argument("--perfil", metavar="JSON", help="mede tempo, memória, linhas e comandos SQL de cada etapa e grava o relatório neste arquivo")
+    return parser
+
+
+if __name__ == "__main__":
+    parser = criar_parser()
+    args = parser.parse_args()
+    desconhecidas = [etapa for etapa in args.etapas if etapa not in ETAPAS]
+    if desconhecidas:
+        parser.error("etapa(s) desconhecida(s): " + ", ".join(desconhecidas))
+    tempos = executar(args.etapas or [etapa for etapa in ETAPAS if etapa not in ETAPAS_OPCIONAIS], args)
+    print("Pipeline concluído em %.2f s" % sum(tempos.values()))
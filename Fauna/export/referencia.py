@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Indicadores socioeconômicos das Unidades Federativas (nome por extenso, IDH e alfabetização) para a tabela UF.
+# O caderno buscava a tabela da Wikipedia com pd.read_html a cada execução; aqui a fonte é escolhida pelo nome
+# (FONTES), as leituras da internet ficam guardadas num cache em disco e há uma cópia instantânea da tabela
+# junto com o código (dados_referencia/uf_indicadores.csv), que permite rodar tudo sem acesso à internet.
+
+import os
+import time
+import argparse
+import sqlite3 as db
+import pandas as pd
+
+import busca
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+INSTANTANEO = os.path.join(PASTA, "dados_referencia", "uf_indicadores.csv")
+CACHE_DIR = os.path.join(PASTA, "cache_referencia")
+VERSAO_CACHE = 1 #mude quando o formato gravado no cache mudar: arquivos de versões anteriores deixam de ser lidos
+VALIDADE_DIAS = 30
+URL_WIKIPEDIA = "https://pt.wikipedia.org/wiki/Unidades_federativas_do_Brasil"
+
+COLUNAS = ["sigla", "nome_ext", "idh", "alfabetizacao"] #formato comum a todas as fontes
+COLUNAS_UF = {"nome_ext": "TEXT", "idh": "FLOAT", "alfabetizacao": "FLOAT"}
+
+
+def ler_instantaneo(): #cópia da tabela distribuída com o código, já no formato de COLUNAS
+    return pd.read_csv(INSTANTANEO, keep_default_na=False, na_values=[""])
+
+
+def ler_wikipedia(): #mesma tabela lida pelo caderno (célula 12), convertida para o formato de COLUNAS
+    tabela = pd.read_html(URL_WIKIPEDIA, match="Abreviação")[0]
+    alfab = tabela["Alfabetização (2016)"].astype(str).str.replace(",", ".").str.rstrip("%")
+    idh = pd.to_numeric(tabela["IDH (2010)"].astype(str).str.replace(",", "."), errors="coerce")
+    return pd.DataFrame({"sigla": tabela["Abreviação"],
+                         "nome_ext": tabela["Unidade federativa"],
+                         "idh": idh.where(idh <= 1, idh / 1000), #a página mostra o IDH sem a vírgula (731 para 0,731)
+                         "alfabetizacao": pd.to_numeric(alfab, errors="coerce")})
+
+
+FONTES = {"instantaneo": ler_instantaneo, "wikipedia": ler_wikipedia}
+FONTES_LOCAIS = ("instantaneo",) #fontes lidas do disco, que não passam pelo cache
+
+
+def arquivo_cache(fonte, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, "uf_indicadores_" + fonte + "_v" + str(VERSAO_CACHE) + ".csv")
+
+
+def carregar_indicadores(fonte="instantaneo", cache_dir=CACHE_DIR, validade_dias=VALIDADE_DIAS): #DataFrame com COLUNAS, uma linha por UF
+    # Fontes remotas são lidas do cache enquanto ele tiver menos de validade_dias; vencido o prazo, a fonte é consultada
+    # de novo e o cache, regravado. Se a consulta falhar (sem internet, página alterada...), vale o cache vencido ou,
+    # na falta dele, a cópia instantânea.
+    if fonte not in FONTES:
+        raise ValueError("fonte desconhecida: " + str(fonte) + " (disponíveis: " + ", ".join(sorted(FONTES)) + ")")
+    if fonte in FONTES_LOCAIS:
+        return FONTES[fonte]()[COLUNAS]
+    arquivo = arquivo_cache(fonte, cache_dir)
+    existe = os.path.exists(arquivo)
+    if existe and time.time() - os.path.getmtime(arquivo) < validade_dias * 86400:
+        return pd.read_csv(arquivo, keep_default_na=False, na_values=[""])[COLUNAS]
+    try:
+        indicadores = FONTES[fonte]()[COLUNAS]
+    except (OSError, ValueError, KeyError, ImportError) as erro: #URLError é subclasse de OSError
+        print("Fonte \"" + fonte + "\" indisponível (" + str(erro) + "); usando", "o cache anterior" if existe else "a cópia instantânea")
+        if existe:
+            return pd.read_csv(arquivo, keep_default_na=False, na_values=[""])[COLUNAS]
+        return ler_instantaneo()[COLUNAS]
+    os.makedirs(cache_dir, exist_ok=True)
+    indicadores.to_csv(arquivo + ".tmp", index=False)
+    os.replace(arquivo + ".tmp", arquivo) #troca atômica: um cache lido ao mesmo tempo nunca fica pela metade
+    return indicadores
+
+
+def adicionar_colunas_uf(conn): #equivale aos ALTER TABLE da célula 13, mas só para as colunas que UF ainda não tem
+    existentes = [linha[1] for linha in conn.execute("PRAGMA table_info(UF)")]
+    faltantes = [coluna for coluna in COLUNAS_UF if coluna not in existentes]
+    for coluna in faltantes:
+        conn.execute("ALTER TABLE UF ADD " + coluna + " " + COLUNAS_UF[coluna])
+    conn.commit()
+    return faltantes
+
+
+def mesclar_em_uf(conn, indicadores): #grava os indicadores em UF com um único INSERT ... ON CONFLICT (upsert) pela sigla
+    # Siglas que ainda não estão em UF são inseridas (com o próximo id livre); as demais têm nome_ext, idh e
+    # alfabetizacao atualizados. Retorna (inseridas, atualizadas).
+    adicionar_colunas_uf(conn)
+    existentes = set(nome for (nome,) in conn.execute("SELECT nome FROM UF"))
+    indicadores = indicadores[COLUNAS].astype(object).where(indicadores[COLUNAS].notna(), None)
+    linhas = list(indicadores.itertuples(index=False, name=None))
+    with conn:
+        conn.executemany("INSERT INTO UF (nome, nome_ext, idh, alfabetizacao) VALUES (?, ?, ?, ?) "
+                         "ON CONFLICT (nome) DO UPDATE SET nome_ext = excluded.nome_ext, idh = excluded.idh, "
+                         "alfabetizacao = excluded.alfabetizacao", linhas)
+    busca.indexar(conn, ["UF"]) #o nome por extenso passa a ser encontrado pela busca textual
+    inseridas = [sigla for sigla, _, _, _ in linhas if sigla not in existentes]
+    for sigla in inseridas:
+        print("Sigla \"" + sigla + "\" não estava presente e foi adicionada à base junto com as demais informações")
+    print(len(linhas) - len(inseridas), "UF(s) atualizada(s) e", len(inseridas), "inserida(s)")
+    return len(inseridas), len(linhas) - len(inseridas)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grava na tabela UF o nome por extenso, o IDH e a alfabetização de cada estado")
+    parser.add_argument("--db", default="fauna_db.sqlite", help="arquivo da base SQLite")
+    parser.add_argument("--fonte", choices=sorted(FONTES), default="instantaneo", help="de onde ler os indicadores")
+    parser.add_argument("--validade", type=float, default=VALIDADE_DIAS, help="dias em que o cache de uma fonte remota continua valendo")
+    args = parser.parse_args()
+
+    conn = db.connect(args.db)
+    mesclar_em_uf(conn, carregar_indicadores(args.fonte, validade_dias=args.validade))
+    conn.close()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Serviço HTTP local com os filtros da seção 3 e as tabelas de totais da seção 5 em JSON, para o painel interno.
+# O servidor é assíncrono (asyncio, só biblioteca padrão): uma única thread atende todas as conexões, e as leituras
+# da base rodam numa pool de threads (api_consultas.ApiConsultas, com conexões somente leitura e cache de
+# resultados), sem travar o laço de eventos.
+#   GET /consulta?classe=Amphibia&categoria=CR&uf=MG&limite=10   {"colunas": [...], "linhas": [[...], ...]}
+#   GET /contar?uf=MG                                            {"n": 415}
+#   GET /consulta?busca=serra do mar&limite=10                   busca textual (busca.py), também com os demais filtros
+#   GET /sugestoes?busca=brachy&limite=10                        nomes que casam com o texto: {"colunas": [...], "linhas": [...]}
+#   GET /totais/totais_uf   (e as demais de pipeline.TOTAIS)     {"colunas": [...], "indice": [...], "linhas": [...]}
+#   GET /saude                                                   versão da base e estatísticas do cache
+# Toda resposta leva um ETag (sha256 do corpo); quem reenviar o mesmo valor em If-None-Match recebe 304, sem corpo.
+# Os corpos ficam guardados enquanto a versão da base não muda. Para medir o serviço, veja benchmark_http.py.
+#   python servidor.py --db fauna_db.sqlite --porta 8000
+
+import sys
+import json
+import asyncio
+import hashlib
+import argparse
+import threading
+import collections
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+import sqlite3 as db
+
+import consultas
+import api_consultas
+
+CORPOS_EM_CACHE = 1024 #respostas guardadas (já em JSON), além do cache de resultados de ApiConsultas
+MOTIVOS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class ErroHTTP(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def tabela_json(tabela): #DataFrame de totais no formato {"colunas", "indice", "linhas"}, com NaN como null
+    valores = tabela.astype(object).where(tabela.notna(), None)
+    return {"colunas": [str(coluna) for coluna in tabela.columns], "indice": tabela.index.tolist(), "linhas": valores.values.tolist()}
+
+
+class Servico:
+    def __init__(self, caminho, conexoes=api_consultas.CONEXOES):
+        self.api = api_consultas.ApiConsultas(caminho, conexoes)
+        self.executor = ThreadPoolExecutor(max_workers=conexoes, thread_name_prefix="leitura")
+        self.trava = threading.Lock()
+        self.corpos = collections.OrderedDict() #(rota, parâmetros) -> (versão da base, corpo, etag)
+        self.totais = (None, None) #(versão da base, {nome: DataFrame}) das tabelas da seção 5
+        self.trava_totais = threading.Lock()
+
+    def filtros(self, params): #filtros de consultas.FILTROS e limite, validados
+        desconhecidos = [nome for nome in params if nome not in consultas.FILTROS and nome != "limite"]
+        if desconhecidos:
+            raise ErroHTTP(400, "parâmetro(s) desconhecido(s): " + ", ".join(desconhecidos))
+        filtros = {nome: params[nome][-1] for nome in consultas.FILTROS if nome in params}
+        limite = params.get("limite", [None])[-1]
+        if limite is not None:
+            if not limite.isdigit():
+                raise ErroHTTP(400, "limite deve ser um inteiro não negativo")
+            limite = int(limite)
+        return filtros, limite
+
+    def tabelas_de_totais(self, versao): #pipeline.totais calculado uma vez por versão da base
+        with self.trava_totais:
+            if self.totais[0] != versao:
+                import pipeline
+                with self.api.conexao() as conn:
+                    self.totais = (versao, pipeline.totais(conn))
+            return self.totais[1]
+
+    def conteudo(self, rota, params, versao): #objeto JSON de uma rota; roda numa thread do executor
+        if rota == "/consulta":
+            filtros, limite = self.filtros(params)
+            colunas, linhas = self.api.listar(limite, **filtros)
+            return {"colunas": list(colunas), "linhas": [list(linha) for linha in linhas]}
+        if rota == "/contar":
+            filtros, limite = self.filtros(params)
+            return {"n": self.api.contar(**filtros)}
+        if rota == "/sugestoes":
+            filtros, limite = self.filtros(params)
+            if set(filtros) != {"busca"}:
+                raise ErroHTTP(400, "/sugestoes aceita só os parâmetros busca e limite")
+            colunas, linhas = self.api.sugerir(filtros["busca"], 20 if limite is None else limite)
+            return {"colunas": list(colunas), "linhas": [list(linha) for linha in linhas]}
+        if rota.startswith("/totais/"):
+            import pipeline
+            nome = rota[len("/totais/"):]
+            if nome not in pipeline.TOTAIS:
+                raise ErroHTTP(404, "tabela desconhecida: " + nome + " (disponíveis: " + ", ".join(pipeline.TOTAIS) + ")")
+            return tabela_json(self.tabelas_de_totais(versao)[nome])
+        raise ErroHTTP(404, "rota desconhecida: " + rota)
+
+    def gerar(self, rota, params): #(corpo, etag) de uma rota, do cache de corpos ou recém-gerado
+        versao = self.api.versao()
+        if rota == "/saude":
+            corpo = json.dumps({"versao": list(versao[0]) + [versao[1]], "cache": self.api.estatisticas(), "corpos": len(self.corpos)}).encode("utf-8")
+            return corpo, etag(corpo)
+        chave = (rota, tuple(sorted((nome, tuple(valores)) for nome, valores in params.items())))
+        with self.trava:
+            guardado = self.corpos.get(chave)
+            if guardado and guardado[0] == versao:
+                self.corpos.move_to_end(chave)
+                return guardado[1], guardado[2]
+        corpo = json.dumps(self.conteudo(rota, params, versao), ensure_ascii=False).encode("utf-8")
+        marca = etag(corpo)
+        with self.trava:
+            self.corpos[chave] = (versao, corpo, marca)
+            while len(self.corpos) > CORPOS_EM_CACHE:
+                self.corpos.popitem(last=False)
+        return corpo, marca
+
+    async def responder(self, metodo, alvo, cabecalhos): #(status, corpo, etag); o corpo vem também no HEAD, para o Content-Length
+        if metodo not in ("GET", "HEAD"):
+            return 405, erro_json("método não permitido: " + metodo), None
+        partes = urlsplit(alvo)
+        try:
+            corpo, marca = await asyncio.get_running_loop().run_in_executor(self.executor, self.gerar, partes.path, parse_qs(partes.query))
+        except ErroHTTP as erro:
+            return erro.status, erro_json(str(erro)), None
+        except Exception as erro: #qualquer falha de gerar (SQLite, pandas...) vira uma resposta 500, sem derrubar a conexão
+            return 500, erro_json(type(erro).__name__ + ": " + str(erro)), None
+        if marca in [valor.strip() for valor in cabecalhos.get("if-none-match", "").split(",")]:
+            return 304, b"", marca
+        return 200, corpo, marca
+
+    async def atender(self, leitor, escritor): #uma conexão HTTP/1.1, com várias requisições em sequência (keep-alive)
+        try:
+            while True:
+                linha = await leitor.readline()
+                if not linha:
+                    break
+                metodo, alvo, versao = linha.decode("latin-1").split()
+                cabecalhos = dict()
+                while True:
+                    linha = await leitor.readline()
+                    if linha in (b"\r\n", b"\n", b""):
+                        break
+                    nome, _, valor = linha.decode("latin-1").partition(":")
+                    cabecalhos[nome.strip().lower()] = valor.strip()
+                if int(cabecalhos.get("content-length", 0)):
+                    await leitor.readexactly(int(cabecalhos["content-length"]))
+                status, corpo, marca = await self.responder(metodo, alvo, cabecalhos)
+                manter = versao == "HTTP/1.1" and cabecalhos.get("connection", "").lower() != "close"
+                resposta = ["HTTP/1.1 %d %s" % (status, MOTIVOS[status]), "Content-Type: application/json; charset=utf-8",
+                            "Content-Length: %d" % len(corpo), "Cache-Control: no-cache", "Connection: " + ("keep-alive" if manter else "close")]
+                if marca:
+                    resposta.append("ETag: " + marca)
+                escritor.write(("\r\n".join(resposta) + "\r\n\r\n").encode("latin-1") + (b"" if metodo == "HEAD" else corpo)) #HEAD: os cabeçalhos do GET, sem o corpo
+                await escritor.drain()
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError): #cliente desconectou ou mandou uma requisição malformada
+            pass
+        finally:
+            escritor.close()
+
+    def fechar(self):
+        self.executor.shutdown()
+        self.api.fechar()
+
+
+def etag(corpo):
+    return '"' + hashlib.sha256(corpo).hexdigest()[:32] + '"'
+
+
+def erro_json(mensagem):
+    return json.dumps({"erro": mensagem}, ensure_ascii=False).encode("utf-8")
+
+
+async def servir(servico, host, porta):
+    servidor = await asyncio.start_server(servico.atender, host, porta)
+    host, porta = servidor.sockets[0].getsockname()[:2]
+    print("Servindo em http://%s:%d" % (host, porta), flush=True) #benchmark_http.py lê a porta desta linha
+    async with servidor:
+        await servidor.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviço HTTP local com os filtros da seção 3 e os totais da seção 5 em JSON")
+    parser.add_argument("--db", default="fauna_db.sqlite", help="arquivo da base SQLite")
+    parser.add_argument("--host", default="127.0.0.1", help="endereço em que o serviço escuta (padrão: só esta máquina)")
+    parser.add_argument("--porta", type=int, default=8000, help="porta TCP (0 escolhe uma livre)")
+    parser.add_argument("--conexoes", type=int, default=api_consultas.CONEXOES, help="threads e conexões de leitura da base")
+    args = parser.parse_args()
+
+    try:
+        servico = Servico(args.db, args.conexoes)
+    except (OSError, db.Error) as erro:
+        sys.exit("Erro ao abrir " + args.db + ": " + str(erro))
+    try:
+        asyncio.run(servir(servico, args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servico.fechar()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Hierarquia taxonômica (divisão -> classe -> ordem -> família -> espécie) como tabela de fechamento: "taxonomia" tem
+# uma linha para cada par (ancestral, descendente), inclusive o par de cada táxon com ele mesmo. Assim, "todas as
+# espécies da classe Amphibia" ou "a classe de cada espécie" são buscas por índice numa única tabela, em qualquer
+# nível, em vez de uma junção diferente para cada nível.
+# Os pares saem das colunas de "especie", e não de familia.ordem_id e ordem.classe_id (que guardam só a última linha
+# lida de cada família e ordem): uma família que aparece sob duas ordens na fonte fica ligada às duas.
+# Só usa a biblioteca padrão; as contagens por nível estão em consultas.py (SQL) e agregacao.py (tabelas).
+
+NIVEIS = ("divisao", "classe", "ordem", "familia", "especie") #do mais alto ao mais baixo; o número do nível é a posição
+ESPECIE = NIVEIS.index("especie")
+COLUNAS = {"divisao": "divisao_id", "classe": "classe_id", "ordem": "ordem_id", "familia": "familia_id", "especie": "id"} #coluna de "especie" com o id de cada nível
+
+DDL = """
+DROP TABLE IF EXISTS taxonomia;
+CREATE TABLE taxonomia (
+    ancestral_nivel INTEGER NOT NULL,
+    ancestral_id    INTEGER NOT NULL,
+    nivel           INTEGER NOT NULL,
+    id              INTEGER NOT NULL,
+    PRIMARY KEY (ancestral_nivel, ancestral_id, nivel, id)
+) WITHOUT ROWID;
+"""
+
+
+def criar_taxonomia(conn): #(re)cria a tabela de fechamento a partir de "especie" e das tabelas de cada nível; retorna o número de pares
+    # O índice inverso (descendente -> ancestrais) está em esquema.INDICES e é criado por esquema.criar_indices.
+    with conn:
+        conn.executescript(DDL)
+        for nivel, tabela in enumerate(NIVEIS): #cada táxon é o seu próprio ancestral (distância zero)
+            conn.execute("INSERT INTO taxonomia SELECT ?, id, ?, id FROM " + tabela, (nivel, nivel))
+        for alto, ancestral in enumerate(NIVEIS):
+            for baixo in range(alto + 1, len(NIVEIS)):
+                coluna_alta, coluna_baixa = COLUNAS[ancestral], COLUNAS[NIVEIS[baixo]]
+                conn.execute("INSERT OR IGNORE INTO taxonomia SELECT DISTINCT ?, " + coluna_alta + ", ?, " + coluna_baixa +
+                             " FROM especie WHERE " + coluna_alta + " IS NOT NULL AND " + coluna_baixa + " IS NOT NULL", (alto, baixo))
+    pares = conn.execute("SELECT count(*) FROM taxonomia").fetchone()[0]
+    print(pares, "pares ancestral-descendente na tabela taxonomia")
+    return pares
+
+
+def juncao(nivel, risco="risco"): #junções de "risco" até o táxon do nível indicado (com o nome da tabela do nível), pela tabela de fechamento
+    alias = "t_" + nivel
+    return ("JOIN taxonomia AS " + alias + " ON " + alias + ".nivel = " + str(ESPECIE) + " AND " + alias + ".id = " + risco + ".especie_id"
+            " AND " + alias + ".ancestral_nivel = " + str(NIVEIS.index(nivel)) + " JOIN " + nivel + " ON " + alias + ".ancestral_id = " + nivel + ".id")
+
+
+def descendentes(nivel, nivel_descendente="especie"): #subconsulta com os ids dos descendentes do táxon cujo nome é o único parâmetro
+    # Ex.: "risco.especie_id IN (" + descendentes("ordem") + ")" filtra as linhas de uma ordem.
+    return ("SELECT taxonomia.id FROM " + nivel + " AS ancestral JOIN taxonomia ON taxonomia.ancestral_nivel = " + str(NIVEIS.index(nivel)) +
+            " AND taxonomia.ancestral_id = ancestral.id AND taxonomia.nivel = " + str(NIVEIS.index(nivel_descendente)) + " WHERE ancestral.nome = ?")
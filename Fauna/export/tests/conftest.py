@@ -0,0 +1,5 @@
+# Os módulos de export/ se importam pelo nome (import carga, import esquema...), como quando rodados desta pasta.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,42 @@
+# Pool de conexões de ApiConsultas quando o arquivo da base é substituído com conexões emprestadas.
+import os
+import threading
+import sqlite3 as db
+
+import api_consultas
+
+
+def criar_base(caminho, valor):
+    conn = db.connect(caminho)
+    with conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.execute("INSERT INTO t VALUES (?)", (valor,))
+    conn.close()
+
+
+def test_espera_pelo_pool_depois_de_trocar_o_arquivo(tmp_path):
+    base, nova = str(tmp_path / "base.sqlite"), str(tmp_path / "nova.sqlite")
+    criar_base(base, 1)
+    criar_base(nova, 2)
+    api = api_consultas.ApiConsultas(base, conexoes=1, wal=False)
+    emprestada, lida = threading.Event(), list()
+
+    def esperar(): #pede a única conexão enquanto ela está emprestada
+        emprestada.wait()
+        with api.conexao() as conn:
+            lida.append(conn.execute("SELECT x FROM t").fetchone()[0])
+
+    b = threading.Thread(target=esperar, daemon=True)
+    b.start()
+    with api.conexao():
+        emprestada.set()
+        b.join(0.2) #b fica esperando em livres.get()
+        os.replace(nova, base)
+        api.versao()
+    b.join(5)
+    try:
+        assert not b.is_alive(), "a thread que esperava pelo pool não foi acordada"
+        assert lida == [2]
+        assert api.estatisticas()["conexoes"] == 1
+    finally:
+        api.fechar()
@@ -0,0 +1,47 @@
+# Carga incremental: a mesma linha deve ter o mesmo hash em qualquer lote, senão ela parece alterada.
+import sqlite3 as db
+import pandas as pd
+
+import benchmark
+import carga
+
+
+def planilha_com_celula_vazia(pasta, linhas=200): #planilha sintética com uma célula vazia numa coluna de inteiros
+    src = str(pasta / "fonte.csv")
+    benchmark.gerar_planilha(linhas, src)
+    fonte = pd.read_csv(src)
+    fonte[fonte.columns[0]] = fonte[fonte.columns[0]].astype("Int64") #gravada como "1", e não "1.0", nas outras linhas
+    fonte.iloc[10, 0] = None #o lote da linha 10 lê a coluna como float; os demais, como int
+    fonte.to_csv(src, index=False)
+    return src, fonte
+
+
+def test_hash_nao_depende_dos_limites_dos_lotes(tmp_path):
+    src, _ = planilha_com_celula_vazia(tmp_path)
+    inteiro = carga.hash_linhas(next(carga.ler_em_lotes(src, 1000)))
+    em_lotes = [h for lote in carga.ler_em_lotes(src, 50) for h in carga.hash_linhas(lote)]
+    assert em_lotes == inteiro
+
+
+def test_incremental_com_uma_linha_nova(tmp_path):
+    src, fonte = planilha_com_celula_vazia(tmp_path)
+    conn = db.connect(str(tmp_path / "base.sqlite"))
+    try:
+        assert carga.carregar_em_lotes(conn, src, 50) == len(fonte)
+        assert carga.carregar_incremental(conn, src, 50) == (0, 0, 0) #fonte inalterada
+        nova = fonte.iloc[[0]].assign(**{fonte.columns[0]: 10 ** 6})
+        pd.concat([nova, fonte]).to_csv(src, index=False) #a linha nova no início desloca os limites dos lotes
+        assert carga.carregar_incremental(conn, src, 50) == (1, 0, 0)
+        assert conn.execute("SELECT count(*) FROM risco_delta WHERE sinal = -1").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+def test_txt_separado_por_tabulacao(tmp_path): #o cabeçalho tem vírgulas nos títulos ("Anfíbios, Aves..."), mas o separador é a tabulação
+    src, fonte = planilha_com_celula_vazia(tmp_path)
+    for sep, nome in (("\t", "tabulacao.txt"), (",", "virgula.txt")):
+        txt = str(tmp_path / nome)
+        fonte.to_csv(txt, sep=sep, index=False)
+        lote = next(carga.ler_em_lotes(txt, 1000))
+        assert list(lote.columns) == list(fonte.columns)
+        assert carga.hash_linhas(lote) == carga.hash_linhas(next(carga.ler_em_lotes(src, 1000)))
@@ -0,0 +1,37 @@
+# Serviço HTTP: um HEAD responde com os mesmos cabeçalhos do GET, inclusive o Content-Length, e sem corpo.
+import sqlite3 as db
+import http.client
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+import benchmark
+import benchmark_http
+import carga
+import pipeline
+
+
+def test_head_tem_os_cabecalhos_do_get(tmp_path):
+    src, base = str(tmp_path / "fonte.csv"), str(tmp_path / "base.sqlite")
+    benchmark.gerar_planilha(200, src)
+    conn = db.connect(base)
+    carga.carregar_em_lotes(conn, src)
+    args = SimpleNamespace(fonte="instantaneo")
+    for etapa in ("normalizar", "enriquecer", "classificar"): #os totais por UF usam o IDH e a alfabetização da seção 4.1
+        pipeline.ETAPAS[etapa](conn, args)
+    conn.close()
+    processo, url = benchmark_http.subir_servidor(base)
+    try:
+        partes = urlsplit(url)
+        respostas = dict()
+        for metodo in ("GET", "HEAD"):
+            cliente = http.client.HTTPConnection(partes.hostname, partes.port, timeout=30)
+            cliente.request(metodo, "/totais/totais_uf")
+            resposta = cliente.getresponse()
+            respostas[metodo] = (resposta.status, resposta.getheader("Content-Length"), resposta.getheader("ETag"), resposta.read())
+            cliente.close()
+    finally:
+        processo.terminate()
+        processo.wait()
+    status, tamanho, marca, corpo = respostas["GET"]
+    assert status == 200 and int(tamanho) == len(corpo) > 0
+    assert respostas["HEAD"] == (status, tamanho, marca, b"")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Tratamento das Unidades de Conservação (tabela UC) da base fauna_db.sqlite
+
+import pandas as pd
+
+PADRAO_SIGLA = r"([^ ]+?) .+" #a primeira sequência de caracteres que não sejam espaços, seguida de um espaço e de mais texto
+
+# Tipos de Unidade de Conservação, identificados pela sigla no início do nome de cada UC (seção 4.2 do caderno)
+TIPOS_UC = [
+    ("APA", "Área de Proteção Ambiental"),
+    ("ARIE", "Área de Relevante Interesse Ecológico"),
+    ("FLONA", "Floresta Nacional"),
+    ("FLOE", "Floresta Estadual"),
+    ("FLOM", "Floresta Municipal"),
+    ("RESEX", "Reserva Extrativista"),
+    ("REFA", "Reserva da Fauna"),
+    ("REDES", "Reserva de Desenvolvimento Sustentável"),
+    ("RPPN", "Reserva Particular do Patrimônio Natural"),
+    ("FLOEX", "Floresta Extrativista"),
+    ("ASPE", "Área de Proteção Integral"),
+    ("PE", "Parque Estadual"),
+    ("PM", "Parque Municipal"),
+    ("PARNA", "Parque Nacional"),
+    ("FLOREST", "Floresta Estadual"),
+    ("MN", "Monumento Natural"),
+    ("REVIS", "Refúgio da Vida Silvestre"),
+    ("ESEC", "Estação Ecológica"),
+    ("Parque", "Parque"),
+    ("RDS", "Reserva de Desenvolvimento Sustentável"),
+    ("REBIO", "Reserva Biológica"),
+]
+
+
+def criar_tipos_uc(conn): #(re)cria a tabela tipo_UC com TIPOS_UC e adiciona UC.tipo_id, se ainda não existir
+    if "tipo_id" not in [linha[1] for linha in conn.execute("PRAGMA table_info(UC)")]:
+        conn.execute("ALTER TABLE UC ADD tipo_id INTEGER REFERENCES tipo_UC (id)")
+    conn.executescript("""
+    DROP TABLE IF EXISTS tipo_UC;
+    CREATE TABLE tipo_UC (
+        id  INTEGER NOT NULL PRIMARY KEY UNIQUE,
+        sigla TEXT UNIQUE,
+        nome    TEXT 
+    );
+    """)
+    with conn:
+        conn.executemany("INSERT INTO tipo_UC (sigla, nome) VALUES (?, ?)", TIPOS_UC)
+
+
+
+def classificar_tipos_uc(conn): #preenche UC.tipo_id a partir da sigla no início do nome de cada UC
+    # Todas as siglas são extraídas de uma vez com str.extract e resolvidas num dicionário montado a partir de tipo_UC;
+    # os tipo_id encontrados são aplicados num único UPDATE ... FROM. Retorna a lista das UCs sem tipo reconhecido,
+    # como dicionários com "id", "nome" e "sigla" (None quando o nome não tem sigla).
+    ucs = pd.read_sql_query("SELECT id, nome FROM UC", conn)
+    siglas = ucs["nome"].str.extract(PADRAO_SIGLA, expand=False)
+    tipos = dict(conn.execute("SELECT sigla, id FROM tipo_UC"))
+    ucs["sigla"] = siglas
+    ucs["tipo_id"] = siglas.map(tipos)
+    encontrados = ucs[ucs["tipo_id"].notna()]
+
+    cur = conn.cursor()
+    cur.execute("CREATE TEMP TABLE IF NOT EXISTS tipo_uc_tmp (UC_id INTEGER PRIMARY KEY, tipo_id INTEGER)")
+    with conn:
+        cur.execute("DELETE FROM tipo_uc_tmp")
+        cur.executemany("INSERT INTO tipo_uc_tmp VALUES (?, ?)", zip(encontrados["id"].tolist(), encontrados["tipo_id"].astype("int64").tolist()))
+        cur.execute("UPDATE UC SET tipo_id = t.tipo_id FROM tipo_uc_tmp AS t WHERE UC.id = t.UC_id")
+        cur.execute("DELETE FROM tipo_uc_tmp")
+    print(len(encontrados), "de", len(ucs), "registros foram atualizados")
+
+    sem_tipo = ucs[ucs["tipo_id"].isna()]
+    return [{"id": id, "nome": nome, "sigla": None if pd.isna(sigla) else sigla}
+            for id, nome, sigla in zip(sem_tipo["id"].tolist(), sem_tipo["nome"].tolist(), sem_tipo["sigla"].tolist())]
+
+
+def criar_ponte_uc_uf(conn): #(re)cria a tabela UC_UF, que liga cada UC a cada um dos estados em que ela está
+    # UCs como as de "MG/RJ" ficam ligadas tanto a "MG" quanto a "RJ"; siglas que só aparecem dentro de nomes compostos
+    # ganham sua própria linha em UF. Assim, filtros e contagens por estado viram junções por igualdade com UC_UF.
+    ucs = pd.read_sql_query("SELECT UC.id AS UC_id, UF.nome AS sigla FROM UC JOIN UF ON UC.UF_id = UF.id", conn)
+    ucs["sigla"] = ucs["sigla"].str.split("/")
+    ucs = ucs.explode("sigla")
+    ucs["sigla"] = ucs["sigla"].str.strip()
+    ucs = ucs[ucs["sigla"].notna() & (ucs["sigla"] != "")]
+
+    ufs = dict(conn.execute("SELECT nome, id FROM UF"))
+    proximo = max(ufs.values(), default=-1) + 1
+    faltantes = [sigla for sigla in ucs["sigla"].unique().tolist() if sigla not in ufs]
+    for sigla in faltantes:
+        ufs[sigla] = proximo
+        proximo += 1
+    ucs["UF_id"] = ucs["sigla"].map(ufs)
+    ucs = ucs.drop_duplicates(["UC_id", "UF_id"])
+
+    cur = conn.cursor()
+    with conn:
+        cur.executemany("INSERT INTO UF (id, nome) VALUES (?, ?)", [(ufs[sigla], sigla) for sigla in faltantes])
+        cur.execute("DELETE FROM UC_UF")
+        cur.executemany("INSERT INTO UC_UF (UC_id, UF_id) VALUES (?, ?)", zip(ucs["UC_id"].tolist(), ucs["UF_id"].astype("int64").tolist()))
+    print(len(ucs), "ligações UC-UF criadas;", len(faltantes), "sigla(s) adicionada(s) à tabela UF")